@@ -0,0 +1,179 @@
+"""
+Copyright (c) 2020-present XXX XXX
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+
+import argparse
+import time
+
+import torch
+import torch.nn as nn
+
+from config import get_architecture_type
+from config import str2bool
+from device import get_device
+from device import get_memory_format
+from device import prepare_model
+from device import to_device
+from execution import time_train_step
+from inference import compute_tta_cams
+from quantize import quantize_backbone
+import wsol
+
+_ARCHITECTURE_NAMES = ('vgg16', 'resnet50', 'inception_v3')
+_NUM_CLASSES = 200
+# Method hyperparameters at their config.py defaults.
+_METHOD_KWARGS = dict(acol_drop_threshold=0.7, adl_drop_rate=0.75,
+                      adl_drop_threshold=0.9)
+
+
+def _time_forward(model, images, labels, return_cam, num_iterations,
+                  device, tta_flip=False, tta_scales=(1.0,)):
+    def forward():
+        if return_cam:
+            return compute_tta_cams(model, images, labels, tta_flip,
+                                    tta_scales)
+        return model(images)
+
+    with torch.no_grad():
+        forward()
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+        start = time.time()
+        for _ in range(num_iterations):
+            forward()
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+    return time.time() - start
+
+
+def benchmark(architecture, wsol_method, device, batch_size, crop_size,
+              channels_last, large_feature_map, num_iterations,
+              quantize_int8=False, fold_batchnorm=False, tta_flip=False,
+              tta_scales=(1.0,), compile_model=False):
+    """
+    With quantize_int8, the backbone is quantized (quantize_backbone) with
+    the random batch as calibration data; CPU only. With fold_batchnorm, the
+    BatchNorms are folded into the convolutions (wsol.fold_batchnorm).
+    With tta_flip or tta_scales, the CAMs are fused over the test-time
+    augmented views (inference.compute_tta_cams). With compile_model, the
+    forward is compiled (wsol.compile_model).
+
+    Returns:
+        throughputs: dict from mode ('logits', 'cams') to images per second
+            of the forward pass on random inputs, after one warm-up batch,
+            and 'train_step' to the median seconds of a training forward and
+            backward pass (cross-entropy on the logits; not timed for int8).
+    """
+    architecture_type = get_architecture_type(wsol_method)
+    model = getattr(wsol, architecture)(
+        dataset_name='CUB',
+        architecture_type=architecture_type,
+        pretrained=False,
+        num_classes=_NUM_CLASSES,
+        large_feature_map=large_feature_map,
+        **_METHOD_KWARGS)
+    model = prepare_model(model, device, channels_last).eval()
+    images = to_device(torch.randn(batch_size, 3, crop_size, crop_size),
+                       device).contiguous(
+        memory_format=get_memory_format(channels_last))
+    labels = to_device(torch.randint(_NUM_CLASSES, (batch_size,)), device)
+    if fold_batchnorm:
+        model = wsol.fold_batchnorm(model)
+    if quantize_int8:
+        model = quantize_backbone(model, architecture, [images])
+    if compile_model:
+        wsol.compile_model(model, architecture, architecture_type)
+
+    throughputs = {}
+    for mode in ('logits', 'cams'):
+        elapsed = _time_forward(model, images, labels,
+                                return_cam=mode == 'cams',
+                                num_iterations=num_iterations, device=device,
+                                tta_flip=tta_flip, tta_scales=tta_scales)
+        throughputs[mode] = batch_size * num_iterations / elapsed
+    throughputs['train_step'] = float('nan')
+    if not quantize_int8:
+        throughputs['train_step'] = time_train_step(
+            model, images, labels,
+            lambda output_dict, labels: nn.functional.cross_entropy(
+                output_dict['logits'], labels),
+            num_iterations)
+    return throughputs
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Forward throughput (images/sec) per architecture.")
+    parser.add_argument('--architectures', type=str, nargs='+',
+                        default=list(_ARCHITECTURE_NAMES),
+                        choices=_ARCHITECTURE_NAMES)
+    parser.add_argument('--wsol_method', type=str, default='cam')
+    parser.add_argument('--device', type=str, default='cuda')
+    parser.add_argument('--num_threads', type=int, default=0)
+    parser.add_argument('--channels_last', type=str2bool, nargs='?',
+                        const=True, default=False)
+    parser.add_argument('--large_feature_map', type=str2bool, nargs='?',
+                        const=True, default=False)
+    parser.add_argument('--quantize_int8', type=str2bool, nargs='?',
+                        const=True, default=False)
+    parser.add_argument('--fold_batchnorm', type=str2bool, nargs='?',
+                        const=True, default=False)
+    parser.add_argument('--compile_model', type=str2bool, nargs='?',
+                        const=True, default=False)
+    parser.add_argument('--tta_flip', type=str2bool, nargs='?',
+                        const=True, default=False)
+    parser.add_argument('--tta_scales', type=float, nargs='+', default=[1.0])
+    parser.add_argument('--batch_size', type=int, default=32)
+    parser.add_argument('--crop_size', type=int, default=224)
+    parser.add_argument('--num_iterations', type=int, default=10)
+    args = parser.parse_args()
+
+    device = get_device(args.device, args.num_threads)
+    num_views = len(args.tta_scales) * (2 if args.tta_flip else 1)
+    print("Device {}, {} threads, method {}, channels_last {}, compiled {}, "
+          "int8 {}, BN folded {}, {} TTA views, batch size {}".format(
+              device, torch.get_num_threads(), args.wsol_method,
+              args.channels_last, args.compile_model, args.quantize_int8,
+              args.fold_batchnorm, num_views, args.batch_size))
+    print("{:<14} {:>14} {:>14} {:>14}".format(
+        'architecture', 'logits img/s', 'cams img/s', 'train step ms'))
+    for architecture in args.architectures:
+        throughputs = benchmark(
+            architecture=architecture,
+            wsol_method=args.wsol_method,
+            device=device,
+            batch_size=args.batch_size,
+            crop_size=args.crop_size,
+            channels_last=args.channels_last,
+            large_feature_map=args.large_feature_map,
+            num_iterations=args.num_iterations,
+            quantize_int8=args.quantize_int8,
+            fold_batchnorm=args.fold_batchnorm,
+            tta_flip=args.tta_flip,
+            tta_scales=args.tta_scales,
+            compile_model=args.compile_model)
+        print("{:<14} {:>14.1f} {:>14.1f} {:>14.1f}".format(
+            architecture, throughputs['logits'], throughputs['cams'],
+            throughputs['train_step'] * 1000))
+
+
+if __name__ == '__main__':
+    main()
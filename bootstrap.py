@@ -0,0 +1,240 @@
+"""
+Copyright (c) 2020-present XXX XXX
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+
+import argparse
+import numpy as np
+import os
+
+from metadata_index import mch
+
+_BOOTSTRAP_CHUNK_SIZE = 4096
+
+
+class CorrectnessBitset(object):
+    """
+    Per-image box correctness at every (IoU threshold, cam threshold) pair,
+    stored as bits packed along the cam thresholds.
+
+    bits: numpy.ndarray(dtype=np.uint8,
+        shape=(num_images, num_iou_thresholds, ceil(num_thresholds / 8)))
+    """
+
+    def __init__(self, image_ids, threshold_list, iou_threshold_list, bits):
+        self.image_ids = list(image_ids)
+        self.threshold_list = np.asarray(threshold_list, dtype=np.float)
+        self.iou_threshold_list = np.asarray(iou_threshold_list,
+                                             dtype=np.float)
+        self.bits = bits
+
+    @property
+    def num_images(self):
+        return len(self.image_ids)
+
+    @classmethod
+    def from_correctness(cls, image_ids, threshold_list, iou_threshold_list,
+                         correctness):
+        """
+        Args:
+            correctness: numpy.ndarray(dtype=np.bool,
+                shape=(num_images, num_iou_thresholds, num_thresholds))
+        """
+        return cls(image_ids, threshold_list, iou_threshold_list,
+                   np.packbits(correctness, axis=-1))
+
+    def unpack(self, start=0, stop=None):
+        """
+        Returns:
+            correctness: numpy.ndarray(dtype=np.uint8, shape=(stop - start,
+                num_iou_thresholds, num_thresholds)) of zeros and ones.
+        """
+        return np.unpackbits(self.bits[start:stop], axis=-1,
+                             count=len(self.threshold_list))
+
+    def max_box_acc(self):
+        """
+        Returns:
+            max_box_acc: numpy.ndarray(shape=(num_iou_thresholds,)).
+        """
+        num_correct = np.zeros((len(self.iou_threshold_list),
+                                len(self.threshold_list)))
+        for start in range(0, self.num_images, _BOOTSTRAP_CHUNK_SIZE):
+            num_correct += self.unpack(start, start + _BOOTSTRAP_CHUNK_SIZE
+                                       ).sum(0)
+        return (num_correct * 100. / self.num_images).max(1)
+
+    def check_comparable(self, other):
+        if (self.image_ids != other.image_ids or
+                not np.array_equal(self.threshold_list,
+                                   other.threshold_list) or
+                not np.array_equal(self.iou_threshold_list,
+                                   other.iou_threshold_list)):
+            raise ValueError("Correctness bitsets were recorded on different "
+                             "images or thresholds.")
+
+    def save(self, file_path):
+        temp_path = file_path + '.tmp{}'.format(os.getpid())
+        with open(temp_path, 'wb') as f:
+            np.savez(f, image_ids=np.array(self.image_ids),
+                     threshold_list=self.threshold_list,
+                     iou_threshold_list=self.iou_threshold_list,
+                     bits=self.bits)
+        os.replace(temp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path):
+        with np.load(file_path, allow_pickle=False) as stored:
+            return cls(stored['image_ids'].tolist(), stored['threshold_list'],
+                       stored['iou_threshold_list'], stored['bits'])
+
+
+def _get_bootstrap_weights(num_images, num_resamples, seed):
+    """
+    Resample i counts how often each image is drawn in a bootstrap sample of
+    num_images images (with replacement).
+
+    Returns:
+        weights: numpy.ndarray(dtype=np.float32,
+            shape=(num_resamples, num_images))
+    """
+    rng = np.random.RandomState(seed)
+    weights = np.empty((num_resamples, num_images), dtype=np.float32)
+    for resample_index in range(num_resamples):
+        weights[resample_index] = np.bincount(
+            rng.randint(num_images, size=num_images), minlength=num_images)
+    return weights
+
+
+def _resampled_max_box_acc(bitset, weights):
+    """
+    The correct counts of all resamples at all thresholds are a single
+    (num_resamples, num_images) x (num_images, num_iou * num_thresholds)
+    product, accumulated over chunks of unpacked images.
+
+    Returns:
+        max_box_acc: numpy.ndarray(shape=(num_resamples, num_iou_thresholds))
+    """
+    num_iou_thresholds = len(bitset.iou_threshold_list)
+    num_thresholds = len(bitset.threshold_list)
+    num_correct = np.zeros((len(weights),
+                            num_iou_thresholds * num_thresholds),
+                           dtype=np.float32)
+    for start in range(0, bitset.num_images, _BOOTSTRAP_CHUNK_SIZE):
+        stop = start + _BOOTSTRAP_CHUNK_SIZE
+        correctness = bitset.unpack(start, stop).reshape(
+            -1, num_iou_thresholds * num_thresholds).astype(np.float32)
+        num_correct += weights[:, start:stop].dot(correctness)
+    num_correct = num_correct.reshape(-1, num_iou_thresholds, num_thresholds)
+    return num_correct.max(2) * 100. / bitset.num_images
+
+
+def _confidence_interval(samples, confidence):
+    tail = (1 - confidence) / 2 * 100
+    return np.percentile(samples, [tail, 100 - tail], axis=0)
+
+
+def bootstrap_max_box_acc(bitset, num_resamples=1000, confidence=.95, seed=0):
+    """
+    Bootstrap distribution of the MaxBoxAcc (best cam threshold re-selected
+    in every resample) over the images of a correctness bitset.
+
+    Returns:
+        results: munch with
+            performance: float. Mean MaxBoxAcc over IoU thresholds.
+            max_box_acc: numpy.ndarray(shape=(num_iou_thresholds,)).
+            standard_error, confidence_interval: of performance
+                (confidence_interval is [lower, upper]).
+            resampled_max_box_acc: numpy.ndarray(
+                shape=(num_resamples, num_iou_thresholds)).
+    """
+    weights = _get_bootstrap_weights(bitset.num_images, num_resamples, seed)
+    resampled_max_box_acc = _resampled_max_box_acc(bitset, weights)
+    resampled_performance = resampled_max_box_acc.mean(1)
+    max_box_acc = bitset.max_box_acc()
+    return mch(performance=float(max_box_acc.mean()),
+               max_box_acc=max_box_acc,
+               standard_error=float(resampled_performance.std()),
+               confidence_interval=_confidence_interval(
+                   resampled_performance, confidence),
+               resampled_max_box_acc=resampled_max_box_acc)
+
+
+def paired_bootstrap_test(bitset_a, bitset_b, num_resamples=1000,
+                          confidence=.95, seed=0):
+    """
+    Paired comparison of two runs over the same images: both runs are
+    evaluated on identical bootstrap resamples.
+
+    Returns:
+        results: munch with
+            difference: float. performance(a) - performance(b).
+            standard_error, confidence_interval: of the difference.
+            p_value: float. Two-sided, for the null of no difference.
+    """
+    bitset_a.check_comparable(bitset_b)
+    weights = _get_bootstrap_weights(bitset_a.num_images, num_resamples, seed)
+    resampled_difference = (
+        _resampled_max_box_acc(bitset_a, weights).mean(1) -
+        _resampled_max_box_acc(bitset_b, weights).mean(1))
+    difference = (bitset_a.max_box_acc().mean() -
+                  bitset_b.max_box_acc().mean())
+    # Shifting the resampled differences to mean zero approximates the null.
+    num_extreme = (np.abs(resampled_difference - difference) >=
+                   np.abs(difference)).sum()
+    return mch(difference=float(difference),
+               standard_error=float(resampled_difference.std()),
+               confidence_interval=_confidence_interval(resampled_difference,
+                                                        confidence),
+               p_value=(num_extreme + 1.) / (num_resamples + 1.))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--correctness_path', type=str, required=True,
+                        help="Correctness bitset saved by evaluation.py.")
+    parser.add_argument('--baseline_correctness_path', type=str,
+                        help="Bitset of a second run on the same images, for "
+                             "a paired comparison.")
+    parser.add_argument('--num_resamples', type=int, default=1000)
+    parser.add_argument('--confidence', type=float, default=.95)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    bitset = CorrectnessBitset.load(args.correctness_path)
+    results = bootstrap_max_box_acc(bitset, args.num_resamples,
+                                    args.confidence, args.seed)
+    print("MaxBoxAcc {:.2f} +- {:.2f} ({:.0%} CI [{:.2f}, {:.2f}])"
+          .format(results.performance, results.standard_error,
+                  args.confidence, *results.confidence_interval))
+
+    if args.baseline_correctness_path:
+        baseline = CorrectnessBitset.load(args.baseline_correctness_path)
+        results = paired_bootstrap_test(bitset, baseline, args.num_resamples,
+                                        args.confidence, args.seed)
+        print("Difference to baseline {:.2f} +- {:.2f} "
+              "({:.0%} CI [{:.2f}, {:.2f}]), p={:.4f}"
+              .format(results.difference, results.standard_error,
+                      args.confidence, results.confidence_interval[0],
+                      results.confidence_interval[1], results.p_value))
+
+
+if __name__ == "__main__":
+    main()
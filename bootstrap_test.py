@@ -0,0 +1,89 @@
+"""
+Copyright (c) 2020-present XXX XXX
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+from bootstrap import bootstrap_max_box_acc
+from bootstrap import CorrectnessBitset
+from bootstrap import paired_bootstrap_test
+
+
+def _random_bitset(num_images, seed, image_ids=None):
+    rng = np.random.RandomState(seed)
+    correctness = rng.rand(num_images, 2, 13) < np.linspace(0, .6, 13)
+    if image_ids is None:
+        image_ids = ['{}.jpg'.format(index) for index in range(num_images)]
+    return CorrectnessBitset.from_correctness(
+        image_ids=image_ids,
+        threshold_list=np.arange(0, 1, 1. / 13),
+        iou_threshold_list=(0.3, 0.5),
+        correctness=correctness), correctness
+
+
+class CorrectnessBitsetTest(unittest.TestCase):
+    def test_pack_save_load(self):
+        bitset, correctness = _random_bitset(num_images=50, seed=0)
+        np.testing.assert_array_equal(bitset.unpack(), correctness)
+        np.testing.assert_allclose(bitset.max_box_acc(),
+                                   correctness.mean(0).max(1) * 100)
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            file_path = os.path.join(temp_dir, 'correctness.npz')
+            bitset.save(file_path)
+            loaded = CorrectnessBitset.load(file_path)
+        finally:
+            shutil.rmtree(temp_dir)
+        self.assertEqual(loaded.image_ids, bitset.image_ids)
+        np.testing.assert_array_equal(loaded.bits, bitset.bits)
+        loaded.check_comparable(bitset)
+
+    def test_bootstrap(self):
+        bitset, _ = _random_bitset(num_images=200, seed=0)
+        results = bootstrap_max_box_acc(bitset, num_resamples=200)
+        self.assertEqual(results.resampled_max_box_acc.shape, (200, 2))
+        self.assertGreater(results.standard_error, 0)
+        # Reported as json by main.py.
+        self.assertIsInstance(results.performance, float)
+        self.assertIsInstance(results.standard_error, float)
+        lower, upper = results.confidence_interval
+        self.assertLess(lower, results.performance)
+        self.assertGreater(upper, lower)
+
+    def test_paired_bootstrap_test(self):
+        bitset, _ = _random_bitset(num_images=200, seed=0)
+        results = paired_bootstrap_test(bitset, bitset, num_resamples=200)
+        self.assertEqual(results.difference, 0)
+        self.assertEqual(results.standard_error, 0)
+        self.assertEqual(results.p_value, 1)
+
+        other, _ = _random_bitset(num_images=200, seed=1,
+                                  image_ids=bitset.image_ids[::-1])
+        self.assertRaises(ValueError, paired_bootstrap_test, bitset, other)
+
+
+if __name__ == '__main__':
+    unittest.main()
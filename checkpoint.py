@@ -0,0 +1,58 @@
+"""
+Copyright (c) 2020-present XXX XXX
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+
+import torch
+
+import wsol
+
+
+def load_state_dict(checkpoint_path):
+    """
+    Returns:
+        state_dict: of a checkpoint saved by main.py. The tensors are memory
+            mapped from the file on CPU; their pages are read when first
+            used (copied into a model, or moved to another device).
+    """
+    checkpoint = torch.load(checkpoint_path, map_location='cpu', mmap=True,
+                            weights_only=True)
+    return checkpoint['state_dict']
+
+
+def build_model(architecture, state_dict=None, **kwargs):
+    """
+    Args:
+        architecture: string. Name of the wsol constructor.
+        state_dict: the complete weights of the model, or None.
+        kwargs: arguments of the wsol constructor.
+    Returns:
+        model: wsol model. With state_dict, the model is built on the meta
+            device (no allocation, none of the weight initializations of the
+            constructors) and the state_dict tensors are then assigned as its
+            parameters and buffers, without copies.
+    """
+    if state_dict is None:
+        return getattr(wsol, architecture)(**kwargs)
+    kwargs['pretrained'] = False
+    with torch.device('meta'):
+        model = getattr(wsol, architecture)(**kwargs)
+    model.load_state_dict(state_dict, strict=True, assign=True)
+    return model
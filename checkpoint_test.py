@@ -0,0 +1,70 @@
+"""
+Copyright (c) 2020-present XXX XXX
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import torch
+
+from checkpoint import build_model
+from checkpoint import load_state_dict
+import wsol
+
+
+class CheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.checkpoint_root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.checkpoint_root)
+
+    def test_build_model_from_checkpoint(self):
+        torch.manual_seed(0)
+        kwargs = dict(architecture_type='acol', dataset_name='CUB',
+                      pretrained=False, num_classes=10,
+                      large_feature_map=False, acol_drop_threshold=0.7)
+        model = wsol.resnet50(**kwargs).eval()
+        checkpoint_path = os.path.join(self.checkpoint_root,
+                                       'last_checkpoint.pth.tar')
+        torch.save({'architecture': 'resnet50', 'epoch': 1,
+                    'state_dict': model.state_dict()}, checkpoint_path)
+
+        loaded = build_model('resnet50',
+                             state_dict=load_state_dict(checkpoint_path),
+                             **kwargs).eval()
+        tensors = list(loaded.parameters()) + list(loaded.buffers())
+        self.assertFalse(any(tensor.is_meta for tensor in tensors))
+        for key, value in model.state_dict().items():
+            self.assertTrue(torch.equal(loaded.state_dict()[key], value))
+
+        images = torch.randn(2, 3, 64, 64)
+        labels = torch.tensor([1, 7])
+        with torch.no_grad():
+            self.assertTrue(torch.equal(
+                loaded(images, labels, return_cam=True),
+                model(images, labels, return_cam=True)))
+
+
+if __name__ == '__main__':
+    unittest.main()
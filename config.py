@@ -109,6 +109,19 @@ def check_dependency(args):
     if args.dataset_name == 'OpenImages':
         if args.num_val_sample_per_class >= 26:
             raise ValueError("num-val-sample must be <= 25 for OpenImages.")
+        if args.fast_val_sample_per_class:
+            raise ValueError("fast validation needs the per-image box "
+                             "correctness of MaxBoxAcc; it is not available "
+                             "for OpenImages.")
+        if args.top1_localization:
+            raise ValueError("top-1 localization is only defined for boxes.")
+    if args.top1_localization and args.adaptive_threshold_search:
+        raise ValueError("top-1 localization needs the exhaustive threshold "
+                         "search.")
+    if args.quantize_int8 and args.device != 'cpu':
+        raise ValueError("int8 quantization runs on CPU; use --device cpu.")
+    if min(args.tta_scales) <= 0:
+        raise ValueError("TTA scales must be positive.")
 
 
 def get_configs():
@@ -121,6 +134,31 @@ def get_configs():
                         const=True, default=False)
     parser.add_argument('--workers', default=4, type=int,
                         help='number of data loading workers (default: 4)')
+    parser.add_argument('--device', type=str, default='cuda',
+                        help='Device to train and evaluate on, e.g. cuda, '
+                             'cuda:1 or cpu.')
+    parser.add_argument('--num_threads', type=int, default=0,
+                        help='Intra-op threads on CPU; 0 keeps the PyTorch '
+                             'default.')
+    parser.add_argument('--channels_last', type=str2bool, nargs='?',
+                        const=True, default=False,
+                        help='Run convolutions on NHWC tensors, unless '
+                             'timing on the first train batch shows no '
+                             'speedup.')
+    parser.add_argument('--compile_model', type=str2bool, nargs='?',
+                        const=True, default=False,
+                        help='Compile the model forward (torch.compile; the '
+                             'backbone only for ACoL and SPG), unless timing '
+                             'on the first train batch shows no speedup.')
+    parser.add_argument('--quantize_int8', type=str2bool, nargs='?',
+                        const=True, default=False,
+                        help='After the test evaluation, quantize the '
+                             'backbone to int8 and report its accuracy, '
+                             'localization and speed against fp32 (CPU '
+                             'only).')
+    parser.add_argument('--num_calibration_batches', type=int, default=16,
+                        help='Train batches to calibrate the int8 '
+                             'activation ranges on.')
 
     # Data
     parser.add_argument('--dataset_name', type=str, default='CUB',
@@ -139,6 +177,27 @@ def get_configs():
     parser.add_argument('--num_val_sample_per_class', type=int, default=0,
                         help='Number of full_supervision validation sample per '
                              'class. 0 means "use all available samples".')
+    parser.add_argument('--fast_val_sample_per_class', type=int, default=0,
+                        help='Validate on a fixed stratified subset of this '
+                             'many val images per class, escalating to the '
+                             'whole val split when the best-checkpoint '
+                             'decision is too close to call. 0 disables.')
+    parser.add_argument('--fast_val_escalation_z', type=float, default=2.,
+                        help='Half-width, in standard errors, of the '
+                             'confidence interval on the subset difference '
+                             'to the best epoch.')
+    parser.add_argument('--fast_val_tolerance', type=float, default=2.,
+                        help='Localization difference (in points) between '
+                             'two epochs that fast validation may get wrong '
+                             'without escalating. In a simulated 30-epoch '
+                             'ILSVRC run (fast_val_sample_per_class=1), the '
+                             'default costs 0.17x the val passes of full '
+                             'validation (0.69x at 0.5).')
+    parser.add_argument('--batch_train_transform', type=str2bool, nargs='?',
+                        const=True, default=False,
+                        help='Apply random crop, flip and normalization to '
+                             'whole uint8 train batches on the device instead '
+                             'of to each image in the loader workers.')
 
     # Setting
     parser.add_argument('--architecture', default='resnet18',
@@ -151,8 +210,44 @@ def get_configs():
     parser.add_argument('--pretrained', type=str2bool, nargs='?',
                         const=True, default=True,
                         help='Use pre_trained model.')
+    parser.add_argument('--pretrained_path', type=str, default=None,
+                        help='Directory with vgg16.pth, resnet50.pth and '
+                             'inception_v3.pth; downloaded if not given.')
+    parser.add_argument('--weight_store_root', type=str, default=None,
+                        help='Directory caching the ImageNet weights once '
+                             'converted for each architecture, method and '
+                             'feature map size.')
+    parser.add_argument('--checkpoint_path', type=str, default=None,
+                        help='Evaluate this checkpoint (saved by main.py) on '
+                             'the test split instead of training.')
     parser.add_argument('--cam_curve_interval', type=int, default=.001,
                         help='CAM curve interval')
+    parser.add_argument('--iou_threshold_list', type=float, nargs='+',
+                        default=[0.5],
+                        help='IoU thresholds for MaxBoxAcc; the localization '
+                             'performance is their mean.')
+    parser.add_argument('--multi_contour_eval', type=str2bool, nargs='?',
+                        const=True, default=False,
+                        help='Score the boxes of all connected components at '
+                             'each CAM threshold, not only the largest one.')
+    parser.add_argument('--adaptive_threshold_search', type=str2bool,
+                        nargs='?', const=True, default=False,
+                        help='Validate MaxBoxAcc with a coarse-to-fine '
+                             'threshold search during training; final test '
+                             'numbers stay exhaustive.')
+    parser.add_argument('--top1_localization', type=str2bool, nargs='?',
+                        const=True, default=False,
+                        help='Also report top-1 and GT-unknown localization '
+                             'from the CAM pass, which then gives the '
+                             'classification accuracy as well.')
+    parser.add_argument('--tta_flip', type=str2bool, nargs='?',
+                        const=True, default=False,
+                        help='Average the CAMs of each image and of its '
+                             'horizontal flip.')
+    parser.add_argument('--tta_scales', type=float, nargs='+',
+                        default=[1.0],
+                        help='Average the CAMs of the images resized by '
+                             'each factor.')
     parser.add_argument('--resize_size', type=int, default=256,
                         help='input resize size')
     parser.add_argument('--crop_size', type=int, default=224,
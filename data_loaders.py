@@ -19,140 +19,80 @@ IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
-import munch
+import copy
 import numpy as np
 import os
 from PIL import Image
+import torch
 from torch.utils.data import DataLoader
 from torch.utils.data import Dataset
 from torchvision import transforms
+import zlib
+
+from metadata_index import configure_metadata
+from metadata_index import get_class_labels
+from metadata_index import get_image_ids
 
 _IMAGE_MEAN_VALUE = [0.485, 0.456, 0.406]
 _IMAGE_STD_VALUE = [0.229, 0.224, 0.225]
 _SPLITS = ('train', 'val', 'test')
 
 
-def mch(**kwargs):
-    return munch.Munch(dict(**kwargs))
-
-
-def configure_metadata(metadata_root):
-    metadata = mch()
-    metadata.image_ids = os.path.join(metadata_root, 'image_ids.txt')
-    metadata.image_ids_proxy = os.path.join(metadata_root,
-                                            'image_ids_proxy.txt')
-    metadata.class_labels = os.path.join(metadata_root, 'class_labels.txt')
-    metadata.image_sizes = os.path.join(metadata_root, 'image_sizes.txt')
-    metadata.localization = os.path.join(metadata_root, 'localization.txt')
-    return metadata
-
-
-def get_image_ids(metadata, proxy=False):
-    """
-    image_ids.txt has the structure
-
-    <path>
-    path/to/image1.jpg
-    path/to/image2.jpg
-    path/to/image3.jpg
-    ...
-    """
-    image_ids = []
-    suffix = '_proxy' if proxy else ''
-    with open(metadata['image_ids' + suffix]) as f:
-        for line in f.readlines():
-            image_ids.append(line.strip('\n'))
-    return image_ids
-
-
-def get_class_labels(metadata):
-    """
-    image_ids.txt has the structure
-
-    <path>,<integer_class_label>
-    path/to/image1.jpg,0
-    path/to/image2.jpg,1
-    path/to/image3.jpg,1
-    ...
+def pil_to_uint8_tensor(image):
     """
-    class_labels = {}
-    with open(metadata.class_labels) as f:
-        for line in f.readlines():
-            image_id, class_label_string = line.strip('\n').split(',')
-            class_labels[image_id] = int(class_label_string)
-    return class_labels
-
-
-def get_bounding_boxes(metadata):
+    Args:
+        image: PIL.Image in RGB mode.
+    Returns:
+        image: torch.Tensor, C x H x W, uint8.
     """
-    localization.txt (for bounding box) has the structure
+    return torch.from_numpy(np.array(image, dtype=np.uint8)).permute(2, 0, 1)
 
-    <path>,<x0>,<y0>,<x1>,<y1>
-    path/to/image1.jpg,156,163,318,230
-    path/to/image1.jpg,23,12,101,259
-    path/to/image2.jpg,143,142,394,248
-    path/to/image3.jpg,28,94,485,303
-    ...
 
-    One image may contain multiple boxes (multiple boxes for the same path).
+class BatchTrainTransform(object):
     """
-    boxes = {}
-    with open(metadata.localization) as f:
-        for line in f.readlines():
-            image_id, x0s, x1s, y0s, y1s = line.strip('\n').split(',')
-            x0, x1, y0, y1 = int(x0s), int(x1s), int(y0s), int(y1s)
-            if image_id in boxes:
-                boxes[image_id].append((x0, x1, y0, y1))
-            else:
-                boxes[image_id] = [(x0, x1, y0, y1)]
-    return boxes
-
-
-def get_mask_paths(metadata):
+    Batch-wise counterpart of the per-sample train transforms RandomCrop,
+    RandomHorizontalFlip, ToTensor and Normalize.
+
+    The loader only resizes each image and returns it as a uint8 tensor.
+    After collation (and after moving the batch to the target device), the
+    crop offsets and flips are drawn independently for each sample with the
+    same distributions as the per-sample transforms, and the crop, flip,
+    float conversion and normalization run as a few batched tensor ops.
     """
-    localization.txt (for masks) has the structure
 
-    <path>,<link_to_mask_file>,<link_to_ignore_mask_file>
-    path/to/image1.jpg,path/to/mask1a.png,path/to/ignore1.png
-    path/to/image1.jpg,path/to/mask1b.png,
-    path/to/image2.jpg,path/to/mask2a.png,path/to/ignore2.png
-    path/to/image3.jpg,path/to/mask3a.png,path/to/ignore3.png
-    ...
-
-    One image may contain multiple masks (multiple mask paths for same image).
-    One image contains only one ignore mask.
-    """
-    mask_paths = {}
-    ignore_paths = {}
-    with open(metadata.localization) as f:
-        for line in f.readlines():
-            image_id, mask_path, ignore_path = line.strip('\n').split(',')
-            if image_id in mask_paths:
-                mask_paths[image_id].append(mask_path)
-                assert (len(ignore_path) == 0)
-            else:
-                mask_paths[image_id] = [mask_path]
-                ignore_paths[image_id] = ignore_path
-    return mask_paths, ignore_paths
-
-
-def get_image_sizes(metadata):
-    """
-    image_sizes.txt has the structure
-
-    <path>,<w>,<h>
-    path/to/image1.jpg,500,300
-    path/to/image2.jpg,1000,600
-    path/to/image3.jpg,500,300
-    ...
-    """
-    image_sizes = {}
-    with open(metadata.image_sizes) as f:
-        for line in f.readlines():
-            image_id, ws, hs = line.strip('\n').split(',')
-            w, h = int(ws), int(hs)
-            image_sizes[image_id] = (w, h)
-    return image_sizes
+    def __init__(self, crop_size, mean=_IMAGE_MEAN_VALUE, std=_IMAGE_STD_VALUE):
+        self.crop_size = crop_size
+        self.mean = torch.tensor(mean).view(1, -1, 1, 1)
+        self.std = torch.tensor(std).view(1, -1, 1, 1)
+
+    def __call__(self, images):
+        """
+        Args:
+            images: torch.Tensor, N x C x H x W, uint8.
+        Returns:
+            images: torch.Tensor, N x C x crop_size x crop_size, float32.
+        """
+        batch_size, _, height, width = images.size()
+        device = images.device
+
+        offsets = torch.arange(self.crop_size, device=device)
+        tops = torch.randint(0, height - self.crop_size + 1, (batch_size, 1),
+                             device=device)
+        lefts = torch.randint(0, width - self.crop_size + 1, (batch_size, 1),
+                              device=device)
+        flips = torch.rand(batch_size, 1, device=device) < 0.5
+
+        rows = tops + offsets
+        cols = lefts + torch.where(flips, offsets.flip(0), offsets)
+        batch_indices = torch.arange(batch_size, device=device).view(-1, 1, 1)
+
+        # N x crop_size x crop_size x C -> N x C x crop_size x crop_size
+        images = images[batch_indices, :, rows.unsqueeze(2), cols.unsqueeze(1)]
+        images = images.permute(0, 3, 1, 2).contiguous()
+
+        images = images.float().div_(255)
+        images.sub_(self.mean.to(device)).div_(self.std.to(device))
+        return images
 
 
 class WSOLImageLabelDataset(Dataset):
@@ -202,17 +142,64 @@ class WSOLImageLabelDataset(Dataset):
         return len(self.image_ids)
 
 
+def get_fixed_subset(dataset, num_sample_per_class):
+    """
+    Returns a copy of a WSOLImageLabelDataset keeping, for every class, the
+    num_sample_per_class images with the smallest CRC32 of their image_id.
+
+    Unlike num_sample_per_class of the dataset itself, the choice does not
+    depend on the random state: the subset is the same in every run and
+    every epoch, and a larger num_sample_per_class gives a superset. The
+    dataset it is drawn from should therefore hold the whole split, not a
+    random subsample; its size is kept as subset.population_size.
+    """
+    image_ids_per_class = {}
+    for image_id in dataset.image_ids:
+        image_ids_per_class.setdefault(
+            dataset.image_labels[image_id], []).append(image_id)
+    selected_image_ids = set()
+    for image_ids in image_ids_per_class.values():
+        selected_image_ids.update(sorted(
+            image_ids, key=lambda image_id: zlib.crc32(image_id.encode()))
+            [:num_sample_per_class])
+
+    subset = copy.copy(dataset)
+    subset.image_ids = [image_id for image_id in dataset.image_ids
+                        if image_id in selected_image_ids]
+    subset.population_size = len(dataset.image_ids)
+    return subset
+
+
 def get_data_loader(data_roots, metadata_root, batch_size, workers,
                     resize_size, crop_size, proxy_training_set,
-                    num_val_sample_per_class=0):
-    dataset_transforms = dict(
-        train=transforms.Compose([
+                    num_val_sample_per_class=0, batch_train_transform=False,
+                    fast_val_sample_per_class=0, pin_memory=False):
+    """
+    If batch_train_transform is set, the train loader yields uint8 batches of
+    size resize_size; they must be passed through BatchTrainTransform before
+    being fed to the model.
+
+    If fast_val_sample_per_class is set, an extra 'val_fast' loader covers a
+    fixed stratified subset of all val images (see get_fixed_subset), drawn
+    independently of the num_val_sample_per_class random subsample.
+    pin_memory should be set when batches are copied to a GPU.
+    """
+    if batch_train_transform:
+        train_transform = transforms.Compose([
+            transforms.Resize((resize_size, resize_size)),
+            transforms.Lambda(pil_to_uint8_tensor),
+        ])
+    else:
+        train_transform = transforms.Compose([
             transforms.Resize((resize_size, resize_size)),
             transforms.RandomCrop(crop_size),
             transforms.RandomHorizontalFlip(),
             transforms.ToTensor(),
             transforms.Normalize(_IMAGE_MEAN_VALUE, _IMAGE_STD_VALUE)
-        ]),
+        ])
+
+    dataset_transforms = dict(
+        train=train_transform,
         val=transforms.Compose([
             transforms.Resize((crop_size, crop_size)),
             transforms.ToTensor(),
@@ -236,7 +223,20 @@ def get_data_loader(data_roots, metadata_root, batch_size, workers,
             ),
             batch_size=batch_size,
             shuffle=split == 'train',
-            num_workers=workers)
+            num_workers=workers,
+            pin_memory=pin_memory)
         for split in _SPLITS
     }
+    if fast_val_sample_per_class:
+        full_val_dataset = WSOLImageLabelDataset(
+            data_root=data_roots['val'],
+            metadata_root=os.path.join(metadata_root, 'val'),
+            transform=dataset_transforms['val'],
+            proxy=False)
+        loaders['val_fast'] = DataLoader(
+            get_fixed_subset(full_val_dataset, fast_val_sample_per_class),
+            batch_size=batch_size,
+            shuffle=False,
+            num_workers=workers,
+            pin_memory=pin_memory)
     return loaders
@@ -0,0 +1,116 @@
+"""
+Copyright (c) 2020-present XXX XXX
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+
+from PIL import Image
+import torch
+from torchvision.transforms import functional
+import unittest
+
+from data_loaders import BatchTrainTransform
+from data_loaders import _IMAGE_MEAN_VALUE
+from data_loaders import _IMAGE_STD_VALUE
+
+
+def _ramp_images(batch_size, height, width):
+    """
+    Pixel values increase by one along each row and are unique within each
+    channel, so that the crop offsets and the flip of a transformed image can
+    be read back from its pixels.
+    """
+    ramp = torch.arange(height * width).view(1, 1, height, width)
+    shifts = (torch.arange(batch_size).view(-1, 1, 1, 1) +
+              torch.tensor([0, 50, 100]).view(1, -1, 1, 1))
+    return (ramp + shifts).to(torch.uint8)
+
+
+def _read_crop_params(image, output, crop_size):
+    """
+    Returns the top, left and flip of the crop of image (C x H x W, uint8)
+    found in output (normalized crop).
+    """
+    mean = torch.tensor(_IMAGE_MEAN_VALUE).view(-1, 1, 1)
+    std = torch.tensor(_IMAGE_STD_VALUE).view(-1, 1, 1)
+    pixels = (output * std + mean).mul(255).round().to(torch.uint8)
+    flip = bool(pixels[0, 0, 1] < pixels[0, 0, 0])
+    top, col = [int(index) for index in
+                (image[0] == pixels[0, 0, 0]).nonzero()[0]]
+    left = col - crop_size + 1 if flip else col
+    return top, left, flip
+
+
+def _per_sample_transform(image, top, left, flip, crop_size):
+    """
+    RandomCrop, RandomHorizontalFlip, ToTensor and Normalize of the train
+    pipeline, given the parameters drawn by the random transforms.
+    """
+    image = Image.fromarray(image.permute(1, 2, 0).numpy())
+    image = functional.crop(image, top, left, crop_size, crop_size)
+    if flip:
+        image = functional.hflip(image)
+    image = functional.to_tensor(image)
+    return functional.normalize(image, _IMAGE_MEAN_VALUE, _IMAGE_STD_VALUE)
+
+
+class BatchTrainTransformTest(unittest.TestCase):
+    def _check_per_sample(self, batch_size, height, width, crop_size):
+        images = _ramp_images(batch_size, height, width)
+        torch.manual_seed(0)
+        outputs = BatchTrainTransform(crop_size)(images)
+        self.assertEqual(outputs.shape, (batch_size, 3, crop_size, crop_size))
+        self.assertEqual(outputs.dtype, torch.float32)
+
+        params = []
+        for image, output in zip(images, outputs):
+            top, left, flip = _read_crop_params(image, output, crop_size)
+            self.assertTrue(0 <= top <= height - crop_size)
+            self.assertTrue(0 <= left <= width - crop_size)
+            torch.testing.assert_close(
+                output,
+                _per_sample_transform(image, top, left, flip, crop_size),
+                rtol=0, atol=1e-6)
+            params.append((top, left, flip))
+        return params
+
+    def test_matches_per_sample_transforms(self):
+        tops, lefts, flips = zip(*self._check_per_sample(
+            batch_size=64, height=6, width=7, crop_size=4))
+        # Every offset of RandomCrop, and both flips, are drawn.
+        self.assertEqual(set(tops), {0, 1, 2})
+        self.assertEqual(set(lefts), {0, 1, 2, 3})
+        self.assertEqual(set(flips), {False, True})
+
+    def test_crop_size_equals_image_size(self):
+        tops, lefts, flips = zip(*self._check_per_sample(
+            batch_size=16, height=5, width=5, crop_size=5))
+        self.assertEqual(set(tops), {0})
+        self.assertEqual(set(lefts), {0})
+        self.assertEqual(set(flips), {False, True})
+
+    def test_crop_size_equals_image_height(self):
+        tops, lefts, _ = zip(*self._check_per_sample(
+            batch_size=16, height=4, width=6, crop_size=4))
+        self.assertEqual(set(tops), {0})
+        self.assertEqual(set(lefts), {0, 1, 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+"""
+Copyright (c) 2020-present XXX XXX
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+
+import torch
+
+
+def get_device(device_name, num_threads=0):
+    """
+    Args:
+        device_name: string. 'cuda', 'cuda:1', 'cpu', ...
+        num_threads: int. Intra-op threads for CPU execution; 0 keeps the
+            PyTorch default (one per physical core).
+    Returns:
+        device: torch.device.
+    """
+    device = torch.device(device_name)
+    if device.type == 'cuda' and not torch.cuda.is_available():
+        raise RuntimeError("CUDA is not available; use --device cpu.")
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+    return device
+
+
+def get_memory_format(channels_last):
+    return torch.channels_last if channels_last else torch.contiguous_format
+
+
+def prepare_model(model, device, channels_last=False):
+    """
+    Moves the model to device, with NHWC weights if channels_last (which
+    the oneDNN convolutions on CPU and the tensor cores on GPU prefer).
+    """
+    return model.to(device, memory_format=get_memory_format(channels_last))
+
+
+def to_device(tensor, device):
+    """
+    Moves a batch to device. Copies to a GPU are asynchronous (they overlap
+    with compute when the loader pins memory; see use_pinned_memory); on CPU
+    the tensor is returned as is.
+    """
+    return tensor.to(device, non_blocking=device.type == 'cuda')
+
+
+def use_pinned_memory(device):
+    return device.type == 'cuda'
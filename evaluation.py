@@ -20,23 +20,30 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
 import argparse
+import collections
 import cv2
 import numpy as np
 import os
-import torch.utils.data as torchdata
-
-from data_loaders import configure_metadata
-from data_loaders import get_image_ids
-from data_loaders import get_bounding_boxes
-from data_loaders import get_image_sizes
-from data_loaders import get_mask_paths
+import zlib
+from concurrent import futures
+
+from bootstrap import CorrectnessBitset
+from exact_pxap import compute_exact_pxap
+from exact_pxap import SortedScoreRuns
+from metadata_index import configure_metadata
+from metadata_index import get_image_ids
+from metadata_index import get_bounding_boxes
+from metadata_index import get_image_sizes
+from metadata_index import get_mask_paths
+from metadata_index import get_metadata_index
+from metadata_index import mch
 from util import check_scoremap_validity
 from util import check_box_convention
-from util import t2n
 
 _IMAGENET_MEAN = [0.485, .456, .406]
 _IMAGENET_STDDEV = [.229, .224, .225]
 _RESIZE_LENGTH = 224
+_CONTOUR_INDEX = 1 if cv2.__version__.split('.')[0] == '3' else 0
 
 
 def calculate_multiple_iou(box_a, box_b):
@@ -111,29 +118,51 @@ def resize_bbox(box, image_size, resize_size):
     return int(newbox_x0), int(newbox_y0), int(newbox_x1), int(newbox_y1)
 
 
-def compute_bboxes_from_scoremaps(scoremap, scoremap_threshold_list):
+def compute_bboxes_from_scoremaps(scoremap, scoremap_threshold_list,
+                                  multi_contour_eval=False):
     """
     Args:
         scoremap: numpy.ndarray(dtype=np.float32, size=(H, W)) between 0 and 1
         scoremap_threshold_list: iterable
+        multi_contour_eval: bool. Return the boxes of all connected components
+            at each threshold instead of the box of the largest contour.
 
     Returns:
          boxes: list of estimated boxes (list of ints) at each cam threshold
+         With multi_contour_eval, a tuple of
+            boxes: numpy.ndarray(dtype=np.int, shape=(num_boxes, 4)). Boxes at
+                all thresholds, concatenated.
+            box_offsets: numpy.ndarray(dtype=np.int,
+                shape=(num_thresholds + 1,)). The boxes at threshold i are
+                boxes[box_offsets[i]:box_offsets[i + 1]]; there is at least
+                one ([0, 0, 0, 0] if nothing is above the threshold).
     """
     check_scoremap_validity(scoremap)
-    height, width = scoremap.shape
-    scoremap_image = np.expand_dims((scoremap * 255).astype(np.uint8), 2)
+    return _compute_bboxes_from_scoremap_image(
+        (scoremap * 255).astype(np.uint8), scoremap_threshold_list,
+        multi_contour_eval)
+
+
+def _compute_bboxes_from_scoremap_image(scoremap_image,
+                                        scoremap_threshold_list,
+                                        multi_contour_eval):
+    """
+    compute_bboxes_from_scoremaps() on the uint8 image of a score map,
+    numpy.ndarray(dtype=np.uint8, size=(H, W)).
+    """
+    height, width = scoremap_image.shape
+    scoremap_image = np.expand_dims(scoremap_image, 2)
 
     def scoremap2bbox(threshold):
         _, thr_gray_heatmap = cv2.threshold(
             src=scoremap_image,
-            thresh=int(threshold * np.max(scoremap_image)),
+            thresh=threshold,
             maxval=255,
             type=cv2.THRESH_BINARY)
         contours = cv2.findContours(
             image=thr_gray_heatmap,
             mode=cv2.RETR_TREE,
-            method=cv2.CHAIN_APPROX_SIMPLE)[1]
+            method=cv2.CHAIN_APPROX_SIMPLE)[_CONTOUR_INDEX]
 
         if len(contours) == 0:
             return [0, 0, 0, 0]
@@ -145,20 +174,48 @@ def compute_bboxes_from_scoremaps(scoremap, scoremap_threshold_list):
         y1 = min(y1, height - 1)
         return [x0, y0, x1, y1]
 
-    estimated_bbox = [scoremap2bbox(threshold)
-                      for threshold in scoremap_threshold_list]
-
-    return estimated_bbox
-
-
-class CamDataset(torchdata.Dataset):
+    def scoremap2bboxes(threshold):
+        num_components, _, stats, _ = cv2.connectedComponentsWithStats(
+            (scoremap_image[:, :, 0] > threshold).astype(np.uint8),
+            connectivity=8)
+        if num_components == 1:
+            return np.zeros((1, 4), dtype=np.int)
+        # Component 0 is the background; stats rows are (x, y, w, h, area).
+        x, y, w, h = stats[1:, :4].T
+        return np.stack([x, y,
+                         np.minimum(x + w, width - 1),
+                         np.minimum(y + h, height - 1)], axis=1).astype(np.int)
+
+    # Thresholds are applied to the uint8 image, so at most 256 distinct
+    # integer thresholds need to be evaluated, however fine the list.
+    max_value = np.max(scoremap_image)
+    thresholds = [int(threshold * max_value)
+                  for threshold in scoremap_threshold_list]
+    unique_thresholds, threshold_inverse = np.unique(thresholds,
+                                                     return_inverse=True)
+
+    if not multi_contour_eval:
+        unique_boxes = [scoremap2bbox(threshold)
+                        for threshold in unique_thresholds.tolist()]
+        return [list(unique_boxes[index])
+                for index in threshold_inverse.tolist()]
+
+    unique_boxes = [scoremap2bboxes(threshold)
+                    for threshold in unique_thresholds.tolist()]
+    estimated_boxes = [unique_boxes[index]
+                       for index in threshold_inverse.tolist()]
+    box_offsets = np.cumsum([0] + [len(boxes) for boxes in estimated_boxes])
+    return np.concatenate(estimated_boxes, axis=0), box_offsets
+
+
+class CamDataset(object):
     def __init__(self, scoremap_path, image_ids):
         self.scoremap_path = scoremap_path
         self.image_ids = image_ids
 
     def _load_cam(self, image_id):
         scoremap_file = os.path.join(self.scoremap_path, image_id + '.npy')
-        return np.load(scoremap_file)
+        return np.load(scoremap_file).astype(np.float, copy=False)
 
     def __getitem__(self, index):
         image_id = self.image_ids[index]
@@ -177,82 +234,514 @@ class LocalizationEvaluator(object):
     annotations and data containers for evaluation. At each iteration,
     each score map is passed to the accumulate() method along with its image_id.
     After the for loop is finalized, compute() is called to compute the final
-    localization performance.
+    localization performance; it returns a munch whose `performance` field is
+    the headline number, along with evaluator-specific details. reset()
+    clears the accumulated statistics (but not the annotations), so one
+    evaluator can be reused for many passes.
+
+    Statistics are accumulated at every threshold of threshold_list, so
+    compute() can also report any coarser cam_curve_interval whose grid
+    np.arange(0, 1, cam_curve_interval) is a sub-grid of threshold_list.
     """
 
     def __init__(self, metadata, dataset_name, split, threshold_list,
-                 mask_root):
+                 mask_root, iou_threshold_list=(0.5,),
+                 multi_contour_eval=False, record_correctness=False,
+                 exact_pxap=False, top1_localization=False):
         self.metadata = metadata
         self.threshold_list = threshold_list
+        self.iou_threshold_list = iou_threshold_list
+        self.multi_contour_eval = multi_contour_eval
+        self.record_correctness = record_correctness
+        self.exact_pxap = exact_pxap
+        self.top1_localization = top1_localization
         self.dataset_name = dataset_name
         self.split = split
         self.mask_root = mask_root
 
+    def reset(self, image_ids=None):
+        """
+        Args:
+            image_ids: list of strings or None. The image_ids in the order
+                accumulate() will be called with, when known (the loader may
+                visit a subset or a reordering of the split).
+        """
+        raise NotImplementedError
+
     def accumulate(self, scoremap, image_id):
         raise NotImplementedError
 
-    def compute(self):
+    def compute(self, cam_curve_interval=None):
         raise NotImplementedError
 
+    def _get_threshold_indices(self, cam_curve_interval):
+        """
+        Args:
+            cam_curve_interval: float or None (all of threshold_list).
+
+        Returns:
+            threshold_indices: numpy.ndarray(dtype=np.int). Positions in
+                threshold_list of the grid np.arange(0, 1, cam_curve_interval).
+        """
+        num_thresholds = len(self.threshold_list)
+        if cam_curve_interval is None:
+            return np.arange(num_thresholds)
+
+        thresholds = np.asarray(self.threshold_list)
+        stride = int(round(cam_curve_interval /
+                           (thresholds[1] - thresholds[0])))
+        threshold_indices = np.arange(0, num_thresholds, max(stride, 1))
+        target_thresholds = np.arange(0, 1, cam_curve_interval)
+        if (stride < 1 or len(threshold_indices) != len(target_thresholds) or
+                not np.allclose(thresholds[threshold_indices],
+                                target_thresholds)):
+            raise ValueError("cam_curve_interval {} is not a multiple of the "
+                             "evaluated threshold interval {}."
+                             .format(cam_curve_interval,
+                                     thresholds[1] - thresholds[0]))
+        return threshold_indices
 
-class BoxEvaluator(LocalizationEvaluator):
-    _IOU_THRESHOLD = 0.5
 
+class BoxEvaluator(LocalizationEvaluator):
     def __init__(self, **kwargs):
         super(BoxEvaluator, self).__init__(**kwargs)
 
         self.image_ids = get_image_ids(metadata=self.metadata)
         self.resize_length = _RESIZE_LENGTH
-        self.cnt = 0
-        self.num_correct = np.zeros(len(self.threshold_list))
         self.original_bboxes = get_bounding_boxes(self.metadata)
         self.image_sizes = get_image_sizes(self.metadata)
-        self.gt_bboxes = self._load_resized_boxes(self.original_bboxes)
-
-    def _load_resized_boxes(self, original_bboxes):
-        resized_bbox = {image_id: [
-            resize_bbox(bbox, self.image_sizes[image_id],
-                        (self.resize_length, self.resize_length))
-            for bbox in original_bboxes[image_id]]
-            for image_id in self.image_ids}
+        self.gt_bboxes = self._load_resized_boxes()
+        self.image_positions = {image_id: position for position, image_id
+                                in enumerate(self.image_ids)}
+        self.reset()
+
+    def reset(self, image_ids=None):
+        self.cnt = 0
+        self.num_correct = np.zeros((len(self.iou_threshold_list),
+                                     len(self.threshold_list)))
+        if self.record_correctness:
+            # Per-image correctness, packed along the cam thresholds.
+            self.correctness_bits = np.zeros(
+                (len(self.image_ids), len(self.iou_threshold_list),
+                 (len(self.threshold_list) + 7) // 8), dtype=np.uint8)
+            self.recorded = np.zeros(len(self.image_ids), dtype=np.bool)
+        if self.top1_localization:
+            self.num_correct_top1 = np.zeros_like(self.num_correct)
+            self.num_correct_gt_unknown = np.zeros_like(self.num_correct)
+            self.num_correct_class = 0
+
+    def _load_resized_boxes(self):
+        """
+        Vectorized resize_bbox over all boxes of the split.
+
+        Returns:
+            resized_bbox: dict from image_id to
+                numpy.ndarray(dtype=np.int, shape=(num_boxes, 4)).
+        """
+        index = get_metadata_index(self.metadata)
+        check_box_convention(index.boxes, 'x0y0x1y1')
+        num_boxes_per_image = np.diff(index.box_offsets)
+        image_sizes = np.repeat(index.image_sizes, num_boxes_per_image,
+                                axis=0).astype(np.float)
+        image_widths, image_heights = image_sizes[:, :1], image_sizes[:, 1:]
+        boxes = index.boxes.astype(np.float)
+        boxes[:, 0::2] = boxes[:, 0::2] * self.resize_length / image_widths
+        boxes[:, 1::2] = boxes[:, 1::2] * self.resize_length / image_heights
+        boxes = boxes.astype(np.int)
+
+        resized_bbox = {}
+        for image_index in index.indices_of(self.image_ids).tolist():
+            resized_bbox[index.image_ids[image_index]] = boxes[
+                index.box_offsets[image_index]:
+                index.box_offsets[image_index + 1]]
         return resized_bbox
 
-    def accumulate(self, scoremap, image_id):
+    def accumulate(self, scoremap, image_id, top1_scoremap=None,
+                   top1_correct=None):
         """
         From a score map, a box is inferred (compute_bboxes_from_scoremaps).
         The box is compared against GT boxes. Count a scoremap as a correct
         prediction if the IOU against at least one box is greater than a certain
-        threshold (_IOU_THRESHOLD).
+        threshold; all of iou_threshold_list are checked against the same
+        boxes. With multi_contour_eval, a box is inferred for every connected
+        component, and a threshold is correct if any of its boxes is.
+
+        With top1_localization, the score map of the predicted class is
+        scored as well (GT-unknown localization), and top-1 localization
+        counts the images whose class is also predicted correctly. When the
+        predicted class is the GT class, both score maps are the same and the
+        GT boxes are reused.
 
         Args:
-            scoremap: numpy.ndarray(size=(H, W), dtype=np.float)
+            scoremap: numpy.ndarray(size=(H, W), dtype=np.float). Score map
+                of the GT class.
             image_id: string.
+            top1_scoremap: numpy.ndarray(size=(H, W), dtype=np.float). Score
+                map of the predicted class; only needed if not top1_correct.
+            top1_correct: bool. Whether the predicted class is the GT class;
+                required with top1_localization.
         """
-        boxes_at_thresholds = compute_bboxes_from_scoremaps(
-            scoremap=scoremap,
-            scoremap_threshold_list=self.threshold_list)
+        check_scoremap_validity(scoremap)
+        correctness = self._compute_correctness(
+            (scoremap * 255).astype(np.uint8), image_id, self.threshold_list)
+        self.num_correct += correctness
+        self.cnt += 1
+        if self.record_correctness:
+            position = self.image_positions[image_id]
+            self.correctness_bits[position] = np.packbits(correctness,
+                                                          axis=-1)
+            self.recorded[position] = True
+        if self.top1_localization:
+            self._accumulate_top1(correctness, image_id, top1_scoremap,
+                                  top1_correct)
+
+    def _accumulate_top1(self, correctness, image_id, top1_scoremap,
+                         top1_correct):
+        if top1_correct is None:
+            raise ValueError("top1_correct is required with "
+                             "top1_localization.")
+        if top1_correct:
+            self.num_correct_class += 1
+            self.num_correct_top1 += correctness
+            self.num_correct_gt_unknown += correctness
+            return
+        check_scoremap_validity(top1_scoremap)
+        self.num_correct_gt_unknown += self._compute_correctness(
+            (top1_scoremap * 255).astype(np.uint8), image_id,
+            self.threshold_list)
+
+    def _compute_correctness(self, scoremap_image, image_id, threshold_list):
+        """
+        Args:
+            scoremap_image: numpy.ndarray(size=(H, W), dtype=np.uint8). The
+                score map scaled to [0, 255].
+            image_id: string.
+            threshold_list: iterable of floats.
 
-        multiple_iou = calculate_multiple_iou(
-            np.array(boxes_at_thresholds),
-            np.array(self.gt_bboxes[image_id]))
+        Returns:
+            correctness: numpy.ndarray(dtype=np.bool,
+                shape=(num_iou_thresholds, len(threshold_list))).
+        """
+        if self.multi_contour_eval:
+            boxes, box_offsets = _compute_bboxes_from_scoremap_image(
+                scoremap_image, threshold_list, multi_contour_eval=True)
+            multiple_iou = calculate_multiple_iou(boxes,
+                                                  self.gt_bboxes[image_id])
+            max_iou = np.maximum.reduceat(multiple_iou.max(1),
+                                          box_offsets[:-1])
+        else:
+            boxes_at_thresholds = _compute_bboxes_from_scoremap_image(
+                scoremap_image, threshold_list, multi_contour_eval=False)
+            multiple_iou = calculate_multiple_iou(
+                np.array(boxes_at_thresholds),
+                self.gt_bboxes[image_id])
+            max_iou = multiple_iou.max(1)
+
+        iou_thresholds = np.array(self.iou_threshold_list)[:, None]
+        return max_iou[None, :] >= iou_thresholds
+
+    def get_correctness_bitset(self):
+        """
+        Returns:
+            bitset: bootstrap.CorrectnessBitset over the accumulated images,
+                in metadata order. See bootstrap.py for confidence intervals
+                and paired comparisons.
+        """
+        if not self.record_correctness:
+            raise RuntimeError("Evaluator was built with "
+                               "record_correctness=False.")
+        positions = np.flatnonzero(self.recorded)
+        return CorrectnessBitset(
+            image_ids=[self.image_ids[position] for position in positions],
+            threshold_list=self.threshold_list,
+            iou_threshold_list=self.iou_threshold_list,
+            bits=self.correctness_bits[positions])
+
+    def compute(self, cam_curve_interval=None):
+        """
+        Args:
+            cam_curve_interval: float or None. Threshold interval to report;
+                defaults to all of threshold_list.
+
+        Returns:
+            results: munch with
+                max_box_acc: list of floats. For each IoU threshold, the ratio
+                    of images where the box prediction is correct. The best
+                    scoremap threshold is taken for the final performance.
+                iou_threshold_list: list of floats.
+                performance: float. Mean of max_box_acc.
+                top1_loc, gt_unknown_loc: lists of floats. With
+                    top1_localization; as max_box_acc, but counting an image
+                    only if its class is also predicted correctly (top1_loc),
+                    or scoring the score map of the predicted class
+                    (gt_unknown_loc). Each takes its own best threshold.
+                classification: float. With top1_localization; top-1
+                    classification accuracy.
+        """
+        threshold_indices = self._get_threshold_indices(cam_curve_interval)
+        max_box_acc = self._get_max_accuracy(self.num_correct,
+                                             threshold_indices)
+        for iou_threshold, accuracy in zip(self.iou_threshold_list,
+                                           max_box_acc):
+            print("MaxBoxAcc (IoU {}) on split {}{}: {}"
+                  .format(iou_threshold, self.split,
+                          _interval_note(cam_curve_interval), accuracy))
+        if len(self.iou_threshold_list) > 1:
+            print("Mean MaxBoxAcc on split {}{}: {}"
+                  .format(self.split, _interval_note(cam_curve_interval),
+                          max_box_acc.mean()))
+        results = mch(performance=max_box_acc.mean(),
+                      max_box_acc=max_box_acc.tolist(),
+                      iou_threshold_list=list(self.iou_threshold_list))
+        if not self.top1_localization:
+            return results
+
+        results.top1_loc = self._get_max_accuracy(
+            self.num_correct_top1, threshold_indices).tolist()
+        results.gt_unknown_loc = self._get_max_accuracy(
+            self.num_correct_gt_unknown, threshold_indices).tolist()
+        results.classification = self.num_correct_class * 100. / self.cnt
+        for iou_threshold, top1_loc, gt_unknown_loc in zip(
+                self.iou_threshold_list, results.top1_loc,
+                results.gt_unknown_loc):
+            print("Top-1 Loc / GT-unknown Loc (IoU {}) on split {}{}: {} / {}"
+                  .format(iou_threshold, self.split,
+                          _interval_note(cam_curve_interval), top1_loc,
+                          gt_unknown_loc))
+        print("Top-1 Cls on split {}: {}".format(self.split,
+                                                  results.classification))
+        return results
+
+    def _get_max_accuracy(self, num_correct, threshold_indices):
+        return (num_correct[:, threshold_indices] * 100. /
+                float(self.cnt)).max(1)
+
+
+class AdaptiveBoxEvaluator(BoxEvaluator):
+    """
+    MaxBoxAcc by a coarse-to-fine search over threshold_list, instead of
+    evaluating every threshold on every image. Meant for fast validation
+    during training; use BoxEvaluator for final numbers.
+
+    The search is pruned by a cheap upper bound on the IoU at each threshold:
+    every box predicted at threshold t lies inside the bounding box B of all
+    foreground at t, so its IoU with a GT box G is at most
+    |B intersect G| / |G| (or the IoU of the [0, 0, 0, 0] box returned when
+    nothing is above t). B follows from the row and column maxima of the
+    score map, so accumulate() records, for every threshold, whether each
+    image can possibly be correct, and stores the uint8 score map
+    zlib-compressed.
+
+    compute() evaluates a coarse grid of thresholds, then for a few rounds
+    refines the gaps between evaluated thresholds that are next to the
+    current optimum or hold the thresholds most likely to beat it. The bound
+    is loose wherever B covers G (typically at low thresholds), so the search
+    then evaluates every remaining threshold whose possible count still
+    exceeds the optimum: thresholds never evaluated cannot beat it, and
+    max_box_acc is the exhaustive MaxBoxAcc over threshold_list. Only the
+    images that can still be correct at a threshold are decoded and evaluated
+    there.
+    """
+    _NUM_COARSE_THRESHOLDS = 11
+    _NUM_REFINEMENT_ROUNDS = 6
+    _NUM_GAPS_PER_ROUND = 3
+    _NUM_SPLITS_PER_GAP = 4
 
-        correct_threshold_indices = np.where(multiple_iou.max(1)
-                                             >= self._IOU_THRESHOLD)[0]
-        self.num_correct[correct_threshold_indices] += 1
+    def __init__(self, **kwargs):
+        super(AdaptiveBoxEvaluator, self).__init__(**kwargs)
+        if self.record_correctness or self.top1_localization:
+            raise ValueError("Per-image correctness and top-1 localization "
+                             "are not supported by the adaptive search; use "
+                             "BoxEvaluator.")
+
+    def reset(self, image_ids=None):
+        super(AdaptiveBoxEvaluator, self).reset(image_ids)
+        self.encoded_scoremaps = []
+        self.scoremap_maxima = set()
+        self.possible_bits = []
+        self.num_possible = np.zeros((len(self.iou_threshold_list),
+                                      len(self.threshold_list)))
+
+    def accumulate(self, scoremap, image_id):
+        """
+        Args:
+            scoremap: numpy.ndarray(size=(H, W), dtype=np.float)
+            image_id: string.
+        """
+        check_scoremap_validity(scoremap)
+        scoremap_image = (scoremap * 255).astype(np.uint8)
+        possible = (self._compute_iou_upper_bounds(scoremap_image, image_id)
+                    >= np.array(self.iou_threshold_list)[:, None])
+        self.encoded_scoremaps.append((image_id, scoremap_image.shape,
+                                       zlib.compress(scoremap_image, 1)))
+        self.scoremap_maxima.add(int(scoremap_image.max()))
+        self.possible_bits.append(np.packbits(possible, axis=-1))
+        self.num_possible += possible
         self.cnt += 1
 
-    def compute(self):
+    def _compute_iou_upper_bounds(self, scoremap_image, image_id):
         """
         Returns:
-            max_localization_accuracy: float. The ratio of images where the
-               box prediction is correct. The best scoremap threshold is taken
-               for the final performance.
+            upper_bounds: numpy.ndarray(shape=(len(threshold_list),)). Upper
+                bounds on the IoU of any box predicted at each threshold.
+        """
+        height, width = scoremap_image.shape
+        gt_boxes = self.gt_bboxes[image_id]
+        gt_areas = ((gt_boxes[:, 2] - gt_boxes[:, 0] + 1) *
+                    (gt_boxes[:, 3] - gt_boxes[:, 1] + 1))
+        empty_box_iou = calculate_multiple_iou(np.zeros((1, 4), dtype=np.int),
+                                               gt_boxes).max()
+
+        # Same integer thresholds as compute_bboxes_from_scoremaps().
+        max_value = np.max(scoremap_image)
+        thresholds = [int(threshold * max_value)
+                      for threshold in self.threshold_list]
+        unique_thresholds, threshold_inverse = np.unique(thresholds,
+                                                         return_inverse=True)
+        rows = scoremap_image.max(1)[None, :] > unique_thresholds[:, None]
+        columns = scoremap_image.max(0)[None, :] > unique_thresholds[:, None]
+        # Foreground bounding boxes, with the x + w convention of
+        # scoremap2bbox().
+        x0 = columns.argmax(1)
+        y0 = rows.argmax(1)
+        x1 = np.minimum(width - columns[:, ::-1].argmax(1), width - 1)
+        y1 = np.minimum(height - rows[:, ::-1].argmax(1), height - 1)
+        area_intersect = (
+            np.maximum(0, np.minimum(x1[:, None], gt_boxes[None, :, 2]) -
+                       np.maximum(x0[:, None], gt_boxes[None, :, 0]) + 1) *
+            np.maximum(0, np.minimum(y1[:, None], gt_boxes[None, :, 3]) -
+                       np.maximum(y0[:, None], gt_boxes[None, :, 1]) + 1))
+        upper_bounds = (area_intersect / gt_areas[None, :]).max(1)
+        upper_bounds[~rows.any(1)] = 0
+        upper_bounds = np.maximum(upper_bounds, empty_box_iou)
+        return upper_bounds[threshold_inverse]
+
+    def _evaluate_thresholds(self, threshold_indices):
+        """
+        Returns:
+            num_correct: numpy.ndarray(
+                shape=(num_iou_thresholds, len(threshold_indices))).
+        """
+        num_correct = np.zeros((len(self.iou_threshold_list),
+                                len(threshold_indices)))
+        for (image_id, shape, encoded_scoremap), possible_bits in zip(
+                self.encoded_scoremaps, self.possible_bits):
+            possible = np.unpackbits(possible_bits, axis=-1,
+                                     count=len(self.threshold_list))
+            candidates = np.flatnonzero(
+                possible[:, threshold_indices].any(0))
+            if len(candidates) == 0:
+                continue
+            scoremap_image = np.frombuffer(zlib.decompress(encoded_scoremap),
+                                           dtype=np.uint8).reshape(shape)
+            num_correct[:, candidates] += self._compute_correctness(
+                scoremap_image, image_id,
+                [self.threshold_list[index]
+                 for index in threshold_indices[candidates]])
+        return num_correct
+
+    def _get_distinct_threshold_indices(self, threshold_indices):
+        """
+        Drops thresholds that give the same integer threshold as the previous
+        one on every accumulated score map (and hence the same boxes).
+        """
+        maxima = np.array(sorted(self.scoremap_maxima))
+        integer_thresholds = (np.asarray(self.threshold_list)[
+            threshold_indices][:, None] * maxima[None, :]).astype(np.int)
+        is_new = np.append(True, (np.diff(integer_thresholds, axis=0)
+                                  != 0).any(1))
+        return threshold_indices[is_new]
+
+    def _select_refinements(self, gap_positions):
+        """
+        Picks up to _NUM_SPLITS_PER_GAP - 1 evenly spread positions.
         """
-        localization_accuracies = self.num_correct * 100. / float(self.cnt)
-        max_localization_accuracy = localization_accuracies.max()
-        print("MaxBoxAcc on split {}: {}"
-              .format(self.split, max_localization_accuracy))
-        return max_localization_accuracy
+        picks = np.linspace(0, len(gap_positions) - 1,
+                            self._NUM_SPLITS_PER_GAP + 1)[1:-1]
+        return np.unique(gap_positions[np.round(picks).astype(np.int)])
+
+    def compute(self, cam_curve_interval=None):
+        """
+        Args:
+            cam_curve_interval: float or None. Threshold interval to search;
+                defaults to all of threshold_list.
+
+        Returns:
+            results: munch with the fields of BoxEvaluator.compute() and
+                max_box_acc_upper_bound: list of floats. Largest possible
+                    MaxBoxAcc over all thresholds, evaluated or not; equal
+                    to max_box_acc.
+                best_threshold_list: list of floats. Best threshold found for
+                    each IoU threshold.
+                num_evaluated_thresholds: int.
+        """
+        threshold_indices = self._get_distinct_threshold_indices(
+            self._get_threshold_indices(cam_curve_interval))
+        num_positions = len(threshold_indices)
+        num_possible = self.num_possible[:, threshold_indices]
+        num_correct = np.full(num_possible.shape, -1.)
+
+        new_positions = np.unique(np.round(np.linspace(
+            0, num_positions - 1, self._NUM_COARSE_THRESHOLDS)).astype(np.int))
+        round_index = 0
+        while True:
+            num_correct[:, new_positions] = self._evaluate_thresholds(
+                threshold_indices[new_positions])
+            best_correct = num_correct.max(1)
+            best_positions = num_correct.argmax(1)
+            # Thresholds not evaluated yet that may still beat the optimum.
+            slack = (num_possible - best_correct[:, None]).max(0)
+            open_positions = (num_correct[0] < 0) & (slack > 0)
+            if not open_positions.any():
+                break
+            round_index += 1
+            if round_index > self._NUM_REFINEMENT_ROUNDS:
+                new_positions = np.flatnonzero(open_positions)
+                continue
+
+            evaluated = np.append(np.flatnonzero(num_correct[0] >= 0),
+                                  num_positions)
+            gaps = []
+            for start, stop in zip(evaluated[:-1], evaluated[1:]):
+                gap_positions = np.flatnonzero(open_positions[start:stop])
+                if len(gap_positions) == 0:
+                    continue
+                next_to_best = (np.isin(best_positions, [start, stop]).any())
+                gaps.append((not next_to_best,
+                             -slack[start:stop].max(),
+                             start + gap_positions))
+            gaps.sort(key=lambda gap: gap[:2])
+            new_positions = np.unique(np.concatenate([
+                self._select_refinements(gap_positions)
+                for _, _, gap_positions in gaps[:self._NUM_GAPS_PER_ROUND]]))
+
+        upper_bound_correct = best_correct.copy()
+        not_evaluated = num_correct[0] < 0
+        if not_evaluated.any():
+            upper_bound_correct = np.maximum(
+                upper_bound_correct, num_possible[:, not_evaluated].max(1))
+
+        max_box_acc = best_correct * 100. / float(self.cnt)
+        max_box_acc_upper_bound = upper_bound_correct * 100. / float(self.cnt)
+        num_evaluated_thresholds = int((num_correct[0] >= 0).sum())
+        best_threshold_list = [
+            float(self.threshold_list[threshold_indices[position]])
+            for position in best_positions]
+        for iou_threshold, accuracy, upper_bound in zip(
+                self.iou_threshold_list, max_box_acc,
+                max_box_acc_upper_bound):
+            print("MaxBoxAcc (IoU {}) on split {}{}: {} (at most {}, {} of {} "
+                  "distinct thresholds evaluated)"
+                  .format(iou_threshold, self.split,
+                          _interval_note(cam_curve_interval), accuracy,
+                          upper_bound, num_evaluated_thresholds,
+                          num_positions))
+        return mch(performance=max_box_acc.mean(),
+                   max_box_acc=max_box_acc.tolist(),
+                   max_box_acc_upper_bound=max_box_acc_upper_bound.tolist(),
+                   iou_threshold_list=list(self.iou_threshold_list),
+                   best_threshold_list=best_threshold_list,
+                   num_evaluated_thresholds=num_evaluated_thresholds)
 
 
 def load_mask_image(file_path, resize_size):
@@ -303,22 +792,144 @@ def get_mask(mask_root, mask_paths, ignore_path):
             255 * ignore_mask.astype(np.uint8))
 
 
+def encode_mask_runs(mask):
+    """
+    Run-length encodes a mask in row-major order.
+
+    Args:
+        mask: numpy.ndarray(dtype=np.uint8), e.g. the output of get_mask().
+
+    Returns:
+        run_values: numpy.ndarray(dtype=np.uint8, shape=(num_runs,))
+        run_lengths: numpy.ndarray(dtype=np.uint16 or np.uint32,
+            shape=(num_runs,)). np.repeat(run_values, run_lengths) recovers
+            mask.ravel().
+    """
+    mask = mask.ravel()
+    run_starts = np.append(0, np.flatnonzero(mask[1:] != mask[:-1]) + 1)
+    run_lengths = np.diff(np.append(run_starts, mask.size))
+    length_type = (np.uint16 if mask.size <= np.iinfo(np.uint16).max
+                   else np.uint32)
+    return mask[run_starts].astype(np.uint8), run_lengths.astype(length_type)
+
+
 class MaskEvaluator(LocalizationEvaluator):
+    # GT masks of upcoming image_ids are decoded on a thread pool (cv2.imread
+    # and cv2.resize release the GIL) while the current one is accumulated.
+    _MASK_PREFETCH_WORKERS = 8
+    _MASK_PREFETCH_WINDOW = 64
+
     def __init__(self, **kwargs):
         super(MaskEvaluator, self).__init__(**kwargs)
 
         if self.dataset_name != "OpenImages":
             raise ValueError("Mask evaluation must be performed on OpenImages.")
+        if self.top1_localization:
+            raise ValueError("Top-1 localization is only defined for boxes.")
 
+        self.image_ids = get_image_ids(metadata=self.metadata)
         self.mask_paths, self.ignore_paths = get_mask_paths(self.metadata)
+        self.mask_executor = None
+        # Run-length encoded GT masks, kept across reset() calls.
+        self.mask_runs = {}
+        self.sorted_score_runs = None
 
         # threshold_list is given as [0, bw, 2bw, ..., 1-bw]
         # Set bins as [0, bw), [bw, 2bw), ..., [1-bw, 1), [1, 2), [2, 3)
         self.num_bins = len(self.threshold_list) + 2
         self.threshold_list_right_edge = np.append(self.threshold_list,
                                                    [1.0, 2.0, 3.0])
+        # Uniform threshold_list (the default) lets scores be binned
+        # arithmetically instead of by binary search; see _bin_scores().
+        threshold_steps = np.diff(self.threshold_list)
+        if (len(self.threshold_list) > 1 and self.threshold_list[0] == 0 and
+                np.allclose(threshold_steps, threshold_steps[0])):
+            self.score_bin_width = threshold_steps[0]
+        else:
+            self.score_bin_width = None
+        self.reset()
+
+    def reset(self, image_ids=None):
         self.gt_true_score_hist = np.zeros(self.num_bins, dtype=np.float)
         self.gt_false_score_hist = np.zeros(self.num_bins, dtype=np.float)
+        if self.mask_executor is not None:
+            for pending_future in self.pending_masks.values():
+                pending_future.cancel()
+        self.pending_masks = collections.OrderedDict()
+        self.visit_order = (self.image_ids if image_ids is None
+                            else list(image_ids))
+        self.visit_positions = {image_id: position for position, image_id
+                                in enumerate(self.visit_order)}
+        self.next_prefetch_position = 0
+        if self.exact_pxap:
+            if self.sorted_score_runs is not None:
+                self.sorted_score_runs.cleanup()
+            self.sorted_score_runs = SortedScoreRuns()
+            self.exact_pxap_value = None
+
+    def _bin_scores(self, scores):
+        """
+        Same bins as np.histogram(scores, self.threshold_list_right_edge) for
+        scores in [0, 1]: index i such that edge[i] <= score < edge[i + 1].
+        """
+        if self.score_bin_width is None:
+            return np.searchsorted(self.threshold_list_right_edge, scores,
+                                   side='right') - 1
+        score_bins = (scores / self.score_bin_width).astype(np.intp)
+        score_bins = np.minimum(score_bins, len(self.threshold_list))
+        # The division may land one bin off near an edge; compare exactly.
+        score_bins -= scores < self.threshold_list_right_edge[score_bins]
+        score_bins += scores >= self.threshold_list_right_edge[score_bins + 1]
+        return score_bins
+
+    def _load_mask_runs(self, image_id):
+        return encode_mask_runs(get_mask(self.mask_root,
+                                         self.mask_paths[image_id],
+                                         self.ignore_paths[image_id]))
+
+    def _get_mask_runs(self, image_id):
+        """
+        Returns the run-length encoded GT mask of image_id. Masks not yet
+        cached are decoded on a thread pool, keeping up to
+        _MASK_PREFETCH_WINDOW of the following uncached image_ids of the
+        visit order given to reset() (metadata order by default) in flight.
+        Score maps arriving out of that order restart the window right after
+        image_id, or drop it for image_ids outside the visit order.
+        """
+        if image_id in self.mask_runs:
+            return self.mask_runs[image_id]
+
+        if image_id in self.pending_masks:
+            while True:
+                pending_id, future = self.pending_masks.popitem(last=False)
+                if pending_id == image_id:
+                    break
+                future.cancel()
+        else:
+            for pending_future in self.pending_masks.values():
+                pending_future.cancel()
+            self.pending_masks.clear()
+            self.next_prefetch_position = self.visit_positions.get(
+                image_id, len(self.visit_order) - 1) + 1
+            future = None
+
+        if self.mask_executor is None:
+            self.mask_executor = futures.ThreadPoolExecutor(
+                max_workers=self._MASK_PREFETCH_WORKERS)
+        while (len(self.pending_masks) < self._MASK_PREFETCH_WINDOW and
+               self.next_prefetch_position < len(self.visit_order)):
+            next_id = self.visit_order[self.next_prefetch_position]
+            self.next_prefetch_position += 1
+            if next_id not in self.mask_runs:
+                self.pending_masks[next_id] = self.mask_executor.submit(
+                    self._load_mask_runs, next_id)
+
+        if future is None:
+            mask_runs = self._load_mask_runs(image_id)
+        else:
+            mask_runs = future.result()
+        self.mask_runs[image_id] = mask_runs
+        return mask_runs
 
     def accumulate(self, scoremap, image_id):
         """
@@ -330,40 +941,96 @@ class MaskEvaluator(LocalizationEvaluator):
             image_id: string.
         """
         check_scoremap_validity(scoremap)
-        gt_mask = get_mask(self.mask_root,
-                           self.mask_paths[image_id],
-                           self.ignore_paths[image_id])
-
-        gt_true_scores = scoremap[gt_mask == 1]
-        gt_false_scores = scoremap[gt_mask == 0]
-
-        # histograms in ascending order
-        gt_true_hist, _ = np.histogram(gt_true_scores,
-                                       bins=self.threshold_list_right_edge)
-        self.gt_true_score_hist += gt_true_hist.astype(np.float)
-
-        gt_false_hist, _ = np.histogram(gt_false_scores,
-                                        bins=self.threshold_list_right_edge)
-        self.gt_false_score_hist += gt_false_hist.astype(np.float)
-
-    def compute(self):
+        run_values, run_lengths = self._get_mask_runs(image_id)
+        if run_lengths.sum() != scoremap.size:
+            raise ValueError("Scoremap size {} does not match the GT mask."
+                             .format(scoremap.shape))
+
+        # GT mask values: 0 -> negative, 1 -> positive, 255 (ignore) ->
+        # discarded. The bins of the positive and discarded pixels are
+        # counted over the contiguous score slices of their runs, and the
+        # negative ones are the rest, without expanding the runs per pixel.
+        score_bins = self._bin_scores(scoremap.ravel())
+        run_ends = np.cumsum(run_lengths, dtype=np.intp)
+        run_starts = run_ends - run_lengths
+        positive_runs = run_values == 1
+        negative_runs = run_values == 0
+        discarded_runs = ~positive_runs & ~negative_runs
+        positive_hist = self._count_run_bins(
+            score_bins, run_starts[positive_runs], run_ends[positive_runs])
+        discarded_hist = self._count_run_bins(
+            score_bins, run_starts[discarded_runs], run_ends[discarded_runs])
+        negative_hist = (np.bincount(score_bins, minlength=self.num_bins) -
+                         positive_hist - discarded_hist)
+        self.gt_false_score_hist += negative_hist
+        self.gt_true_score_hist += positive_hist
+
+        if self.exact_pxap:
+            scores = scoremap.ravel()
+            positive_scores = self._gather_runs(
+                scores, run_starts[positive_runs], run_ends[positive_runs])
+            negative_scores = self._gather_runs(
+                scores, run_starts[negative_runs], run_ends[negative_runs])
+            self.sorted_score_runs.add(positive_scores=positive_scores,
+                                       negative_scores=negative_scores)
+            self.exact_pxap_value = None
+
+    def _count_run_bins(self, score_bins, run_starts, run_ends):
+        hist = np.zeros(self.num_bins, dtype=np.intp)
+        for start, end in zip(run_starts.tolist(), run_ends.tolist()):
+            run_hist = np.bincount(score_bins[start:end])
+            hist[:len(run_hist)] += run_hist
+        return hist
+
+    @staticmethod
+    def _gather_runs(scores, run_starts, run_ends):
+        if not len(run_starts):
+            return scores[:0]
+        return np.concatenate([scores[start:end] for start, end
+                               in zip(run_starts.tolist(), run_ends.tolist())])
+
+    def compute(self, cam_curve_interval=None):
         """
+        Histograms at a coarser cam_curve_interval are sums of consecutive
+        bins of the accumulated ones.
         Arrays are arranged in the following convention (bin edges):
 
         gt_true_score_hist: [0.0, eps), ..., [1.0, 2.0), [2.0, 3.0)
         gt_false_score_hist: [0.0, eps), ..., [1.0, 2.0), [2.0, 3.0)
         tp, fn, tn, fp: >=2.0, >=1.0, ..., >=0.0
 
+        Args:
+            cam_curve_interval: float or None. Threshold interval to report;
+                defaults to all of threshold_list.
+
         Returns:
-            auc: float. The area-under-curve of the precision-recall curve.
-               Also known as average precision (AP).
+            results: munch with
+                pxap: float. The area-under-curve of the precision-recall
+                    curve. Also known as average precision (AP).
+                performance: float. Same as pxap.
+                pxiou: float. Best pixel IoU, tp / (tp + fp + fn), over the
+                    thresholds.
+                pxiou_threshold: float. Threshold attaining pxiou.
+                thresholds, precision, recall, iou:
+                    numpy.ndarray(dtype=np.float). The curves, in the
+                    tp, fn, tn, fp order above (precision is nan where
+                    nothing is predicted positive).
+                binned_pxap: float. With exact_pxap only; pxap is then
+                    computed over every distinct score (see exact_pxap.py)
+                    and does not depend on cam_curve_interval.
         """
-        num_gt_true = self.gt_true_score_hist.sum()
-        tp = self.gt_true_score_hist[::-1].cumsum()
+        threshold_indices = self._get_threshold_indices(cam_curve_interval)
+        gt_true_score_hist = self._merge_bins(self.gt_true_score_hist,
+                                              threshold_indices)
+        gt_false_score_hist = self._merge_bins(self.gt_false_score_hist,
+                                               threshold_indices)
+
+        num_gt_true = gt_true_score_hist.sum()
+        tp = gt_true_score_hist[::-1].cumsum()
         fn = num_gt_true - tp
 
-        num_gt_false = self.gt_false_score_hist.sum()
-        fp = self.gt_false_score_hist[::-1].cumsum()
+        num_gt_false = gt_false_score_hist.sum()
+        fp = gt_false_score_hist[::-1].cumsum()
         tn = num_gt_false - fp
 
         if ((tp + fn) <= 0).all():
@@ -375,25 +1042,91 @@ class MaskEvaluator(LocalizationEvaluator):
 
         precision = tp / (tp + fp)
         recall = tp / (tp + fn)
+        iou = tp / (tp + fp + fn)
 
         auc = (precision[1:] * np.diff(recall))[non_zero_indices[1:]].sum()
         auc *= 100
 
-        print("Mask AUC on split {}: {}".format(self.split, auc))
-        return auc
+        thresholds = np.append(
+            np.asarray(self.threshold_list)[threshold_indices],
+            [1.0, 2.0])[::-1]
+        best_index = np.argmax(iou)
+        results = mch(performance=auc, pxap=auc,
+                      pxiou=iou[best_index] * 100,
+                      pxiou_threshold=thresholds[best_index],
+                      thresholds=thresholds, precision=precision,
+                      recall=recall, iou=iou)
+
+        print("Mask AUC on split {}{}: {}"
+              .format(self.split, _interval_note(cam_curve_interval), auc))
+        print("Mask PxIoU on split {}{}: {} (threshold {})"
+              .format(self.split, _interval_note(cam_curve_interval),
+                      results.pxiou, results.pxiou_threshold))
+        if not self.exact_pxap:
+            return results
+
+        if self.exact_pxap_value is None:
+            self.exact_pxap_value = compute_exact_pxap(self.sorted_score_runs)
+        print("Exact mask AUC on split {}: {}"
+              .format(self.split, self.exact_pxap_value))
+        results.binned_pxap = auc
+        results.performance = results.pxap = self.exact_pxap_value
+        return results
+
+    def _merge_bins(self, score_hist, threshold_indices):
+        """
+        Merges [t_i, t_i+1) bins into [t_j, t_k) for consecutive
+        threshold_indices j, k; the [1, 2) and [2, 3) bins are kept.
+        """
+        num_thresholds = len(self.threshold_list)
+        return np.append(np.add.reduceat(score_hist[:num_thresholds],
+                                         threshold_indices),
+                         score_hist[num_thresholds:])
+
+
+def save_pr_curves(file_path, results):
+    """
+    Writes the pixel-level curves of MaskEvaluator.compute() results to an
+    .npz file (thresholds, precision, recall, iou, pxap, pxiou,
+    pxiou_threshold), for plotting without re-running the evaluation.
+    """
+    temp_path = file_path + '.tmp{}'.format(os.getpid())
+    with open(temp_path, 'wb') as f:
+        np.savez_compressed(
+            f, **{key: results[key]
+                  for key in ('thresholds', 'precision', 'recall', 'iou',
+                              'pxap', 'pxiou', 'pxiou_threshold')})
+    os.replace(temp_path, file_path)
+
+
+def _interval_note(cam_curve_interval):
+    if cam_curve_interval is None:
+        return ''
+    return ' (cam_curve_interval {})'.format(cam_curve_interval)
 
 
-def _get_cam_loader(image_ids, scoremap_path):
-    return torchdata.DataLoader(
-        CamDataset(scoremap_path, image_ids),
-        batch_size=128,
-        shuffle=False,
-        num_workers=4,
-        pin_memory=True)
+def _get_cam_loader(image_ids, scoremap_path, num_workers=4,
+                    prefetch_size=128):
+    """
+    Yields (cam, image_id) in image_ids order. Score maps are read by a thread
+    pool (np.load releases the GIL during file reads) and at most
+    prefetch_size of them are held in memory at once.
+    """
+    cam_dataset = CamDataset(scoremap_path, image_ids)
+    with futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+        pending = collections.deque()
+        for index in range(len(cam_dataset)):
+            pending.append(executor.submit(cam_dataset.__getitem__, index))
+            if len(pending) >= prefetch_size:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
 
 
 def evaluate_wsol(scoremap_root, metadata_root, mask_root, dataset_name, split,
-                  cam_curve_interval=.001):
+                  cam_curve_interval=.001, iou_threshold_list=(0.5,),
+                  multi_contour_eval=False, correctness_path=None,
+                  exact_pxap=False, curve_path=None):
     """
     Compute WSOL performances of predicted heatmaps against ground truth
     boxes (CUB, ILSVRC) or masks (OpenImages). For boxes, we compute the
@@ -415,17 +1148,42 @@ def evaluate_wsol(scoremap_root, metadata_root, mask_root, dataset_name, split,
         mask_root: string.
         dataset_name: string. Supports [CUB, ILSVRC, and OpenImages].
         split: string. Supports [train, val, test].
-        cam_curve_interval: float. Default 0.001. At which threshold intervals
-            will the heatmaps be evaluated?
+        cam_curve_interval: float or list of floats. Default 0.001. At which
+            threshold intervals will the heatmaps be evaluated? Score maps are
+            read once; coarser intervals must be multiples of the finest one.
+        iou_threshold_list: iterable of floats. Default (0.5,). IoU thresholds
+            for the box accuracy (CUB, ILSVRC), all checked in the same pass.
+        multi_contour_eval: bool. Default False. Score the boxes of all
+            connected components of the thresholded heatmap (CUB, ILSVRC),
+            instead of only the box of the largest contour.
+        correctness_path: string. If given, per-image correctness (CUB,
+            ILSVRC) is saved there as a bootstrap.CorrectnessBitset, for
+            confidence intervals and paired comparisons with bootstrap.py.
+        exact_pxap: bool. Default False. Also compute the PxAP over every
+            distinct score (OpenImages) by an external merge of sorted score
+            runs, independent of cam_curve_interval.
+        curve_path: string. If given, the pixel-level precision, recall and
+            IoU curves (OpenImages) at the finest cam_curve_interval are
+            saved there; see save_pr_curves().
     Returns:
-        performance: float. For CUB and ILSVRC, maxboxacc is returned.
+        results: munch. For CUB and ILSVRC, maxboxacc at each IoU threshold
+            (max_box_acc) and their mean (performance) are returned.
             For OpenImages, area-under-curve of the precision-recall curve
-            is returned.
+            (pxap, performance), the best pixel IoU (pxiou) and the curves
+            are returned. Given a list of intervals, a dict
+            from interval to results is returned.
     """
+    if curve_path and dataset_name != "OpenImages":
+        raise ValueError("Pixel-level curves are only available for "
+                         "OpenImages.")
     print("Loading and evaluating cams.")
     metadata = configure_metadata(metadata_root)
     image_ids = get_image_ids(metadata)
-    threshold_list = list(np.arange(0, 1, cam_curve_interval))
+    if isinstance(cam_curve_interval, (list, tuple)):
+        cam_curve_intervals = cam_curve_interval
+    else:
+        cam_curve_intervals = [cam_curve_interval]
+    threshold_list = list(np.arange(0, 1, min(cam_curve_intervals)))
 
     evaluator = {"OpenImages": MaskEvaluator,
                  "CUB": BoxEvaluator,
@@ -434,14 +1192,26 @@ def evaluate_wsol(scoremap_root, metadata_root, mask_root, dataset_name, split,
                                  dataset_name=dataset_name,
                                  split=split,
                                  threshold_list=threshold_list,
-                                 mask_root=mask_root)
-
-    cam_loader = _get_cam_loader(image_ids, scoremap_root)
-    for cams, image_ids in cam_loader:
-        for cam, image_id in zip(cams, image_ids):
-            evaluator.accumulate(t2n(cam), image_id)
-    performance = evaluator.compute()
-    return performance
+                                 mask_root=mask_root,
+                                 iou_threshold_list=iou_threshold_list,
+                                 multi_contour_eval=multi_contour_eval,
+                                 record_correctness=bool(correctness_path),
+                                 exact_pxap=exact_pxap)
+
+    for cam, image_id in _get_cam_loader(image_ids, scoremap_root):
+        evaluator.accumulate(cam, image_id)
+    if correctness_path:
+        evaluator.get_correctness_bitset().save(correctness_path)
+    if not isinstance(cam_curve_interval, (list, tuple)):
+        results = evaluator.compute()
+    else:
+        results = {interval: evaluator.compute(cam_curve_interval=interval)
+                   for interval in cam_curve_intervals}
+    if curve_path:
+        save_pr_curves(curve_path,
+                       results[min(cam_curve_intervals)]
+                       if isinstance(results, dict) else results)
+    return results
 
 
 def main():
@@ -458,9 +1228,27 @@ def main():
     parser.add_argument('--split', type=str,
                         help="One of [val, test]. They correspond to "
                              "train-fullsup and test, respectively.")
-    parser.add_argument('--cam_curve_interval', type=float, default=0.01,
+    parser.add_argument('--cam_curve_interval', type=float, nargs='+',
+                        default=[0.01],
                         help="At which threshold intervals will the score maps "
-                             "be evaluated?.")
+                             "be evaluated?. Several intervals are reported "
+                             "from a single pass over the score maps.")
+    parser.add_argument('--iou_threshold_list', type=float, nargs='+',
+                        default=[0.5],
+                        help="IoU thresholds for the box accuracy (CUB, "
+                             "ILSVRC), all evaluated in a single pass.")
+    parser.add_argument('--multi_contour_eval', action='store_true',
+                        help="Score the boxes of all connected components at "
+                             "each heatmap threshold (CUB, ILSVRC).")
+    parser.add_argument('--correctness_path', type=str,
+                        help="Save per-image box correctness here (.npz) for "
+                             "bootstrap.py (CUB, ILSVRC).")
+    parser.add_argument('--exact_pxap', action='store_true',
+                        help="Compute the PxAP over every distinct score "
+                             "(OpenImages), spilling sorted runs to disk.")
+    parser.add_argument('--curve_path', type=str,
+                        help="Save the pixel-level precision, recall and IoU "
+                             "curves here (.npz, OpenImages).")
 
     args = parser.parse_args()
     evaluate_wsol(scoremap_root=args.scoremap_root,
@@ -468,7 +1256,12 @@ def main():
                   mask_root=args.mask_root,
                   dataset_name=args.dataset_name,
                   split=args.split,
-                  cam_curve_interval=args.cam_curve_interval)
+                  cam_curve_interval=args.cam_curve_interval,
+                  iou_threshold_list=args.iou_threshold_list,
+                  multi_contour_eval=args.multi_contour_eval,
+                  correctness_path=args.correctness_path,
+                  exact_pxap=args.exact_pxap,
+                  curve_path=args.curve_path)
 
 
 if __name__ == "__main__":
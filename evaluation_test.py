@@ -19,18 +19,23 @@ IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
+import cv2
 import numpy as np
 import os
+import shutil
+import tempfile
 import unittest
 
 from data_loaders import configure_metadata
 from data_loaders import get_image_ids
+from evaluation import AdaptiveBoxEvaluator
 from evaluation import BoxEvaluator
 from evaluation import calculate_multiple_iou
 from evaluation import compute_bboxes_from_scoremaps
 from evaluation import get_mask
 from evaluation import MaskEvaluator
 from evaluation import resize_bbox
+from evaluation import save_pr_curves
 
 
 class EvalUtilTest(unittest.TestCase):
@@ -127,6 +132,25 @@ class EvalUtilTest(unittest.TestCase):
                                      [2, 3, 3, 3],
                                      [0, 3, 1, 3]])
 
+    def test_compute_bboxes_from_scoremaps_multimodal_all_contours(self):
+        # array has shape array[y][x]
+        scoremap = np.array([[0.4, 0.0, 0.2, 0.2, 0.2],
+                             [0.4, 0.4, 0.0, 0.4, 0.0],
+                             [0.0, 0.0, 0.0, 0.4, 0.0],
+                             [1.0, 0.6, 0.8, 0.2, 0.2]],
+                            dtype=np.float)
+        scoremap_threshold_list = np.arange(0, 1, 0.2)
+        boxes, box_offsets = compute_bboxes_from_scoremaps(
+            scoremap, scoremap_threshold_list, multi_contour_eval=True)
+        self.assertListEqual(boxes.tolist(), [[0, 0, 4, 3],
+                                              [0, 0, 2, 2],
+                                              [0, 1, 4, 3],
+                                              [0, 3, 3, 3],
+                                              [0, 3, 1, 3],
+                                              [2, 3, 3, 3],
+                                              [0, 3, 1, 3]])
+        self.assertListEqual(box_offsets.tolist(), [0, 1, 3, 4, 6, 7])
+
     def test_compute_bboxes_from_scoremaps_nan(self):
         # array has shape array[y][x]
         scoremap = np.full([3, 3], np.nan)
@@ -142,14 +166,20 @@ def set_metadata(dataset_name, split):
 
 
 def load_evaluator(Evaluator, dataset_name, split, cam_curve_interval,
-                   mask_root=None):
+                   mask_root=None, iou_threshold_list=(0.5,),
+                   record_correctness=False, exact_pxap=False,
+                   top1_localization=False):
     metadata = set_metadata(dataset_name, split)
     threshold_list = list(np.arange(0, 1, cam_curve_interval))
     evaluator = Evaluator(metadata=metadata,
                           dataset_name=dataset_name,
                           split=split,
                           threshold_list=threshold_list,
-                          mask_root=mask_root)
+                          mask_root=mask_root,
+                          iou_threshold_list=iou_threshold_list,
+                          record_correctness=record_correctness,
+                          exact_pxap=exact_pxap,
+                          top1_localization=top1_localization)
     return evaluator
 
 
@@ -253,6 +283,137 @@ class BoxEvaluatorTest(unittest.TestCase):
                     test_sizes, self._SIZE_VERIFICATION[dataset_name][split])
                 self._check_box_sizes(image_ids, evaluator)
 
+    def _accumulate_blob_scoremaps(self, evaluators):
+        metadata = set_metadata(dataset_name='CUB', split='val')
+        image_ids = get_image_ids(metadata)[:20]
+        y, x = np.mgrid[:224, :224]
+        for image_index, image_id in enumerate(image_ids):
+            center = 40 + 7 * image_index
+            scoremap = np.exp(-((x - center) ** 2 + (y - 112) ** 2) / 3000.)
+            scoremap = (scoremap - scoremap.min()) / np.ptp(scoremap)
+            for evaluator in evaluators:
+                evaluator.accumulate(scoremap, image_id)
+
+    def _accumulate_noise_scoremaps(self, evaluators):
+        metadata = set_metadata(dataset_name='CUB', split='val')
+        image_ids = get_image_ids(metadata)[:60]
+        rng = np.random.RandomState(0)
+        for image_id in image_ids:
+            scoremap = cv2.GaussianBlur(rng.rand(224, 224), (0, 0), 12)
+            scoremap = (scoremap - scoremap.min()) / np.ptp(scoremap)
+            for evaluator in evaluators:
+                evaluator.accumulate(scoremap, image_id)
+
+    def test_box_evaluator_coarser_interval(self):
+        evaluators = [load_evaluator(BoxEvaluator,
+                                     dataset_name='CUB',
+                                     split='val',
+                                     cam_curve_interval=cam_curve_interval)
+                      for cam_curve_interval in (0.01, 0.05)]
+        self._accumulate_blob_scoremaps(evaluators)
+        self.assertEqual(evaluators[0].compute(cam_curve_interval=0.05),
+                         evaluators[1].compute())
+        self.assertRaises(ValueError, evaluators[1].compute,
+                          cam_curve_interval=0.01)
+
+    def test_box_evaluator_records_correctness(self):
+        evaluator = load_evaluator(BoxEvaluator,
+                                   dataset_name='CUB',
+                                   split='val',
+                                   cam_curve_interval=0.01,
+                                   iou_threshold_list=(0.3, 0.5),
+                                   record_correctness=True)
+        self._accumulate_blob_scoremaps([evaluator])
+        bitset = evaluator.get_correctness_bitset()
+        self.assertEqual(bitset.num_images, 20)
+        np.testing.assert_allclose(bitset.max_box_acc(),
+                                   evaluator.compute().max_box_acc)
+
+    def test_box_evaluator_multiple_iou_thresholds(self):
+        iou_threshold_lists = ((0.3, 0.5, 0.7), (0.3,), (0.5,), (0.7,))
+        evaluators = [load_evaluator(BoxEvaluator,
+                                     dataset_name='CUB',
+                                     split='val',
+                                     cam_curve_interval=0.01,
+                                     iou_threshold_list=iou_threshold_list)
+                      for iou_threshold_list in iou_threshold_lists]
+        self._accumulate_blob_scoremaps(evaluators)
+        results = evaluators[0].compute()
+        max_box_acc = [evaluator.compute().performance
+                       for evaluator in evaluators[1:]]
+        self.assertEqual(results.max_box_acc, max_box_acc)
+        self.assertAlmostEqual(results.performance, np.mean(max_box_acc))
+        self.assertGreaterEqual(max_box_acc[0], max_box_acc[2])
+
+    def test_box_evaluator_top1_localization(self):
+        evaluator = load_evaluator(BoxEvaluator,
+                                   dataset_name='CUB',
+                                   split='val',
+                                   cam_curve_interval=0.01,
+                                   top1_localization=True)
+        metadata = set_metadata(dataset_name='CUB', split='val')
+        image_ids = get_image_ids(metadata)[:20]
+        y, x = np.mgrid[:224, :224]
+        for image_index, image_id in enumerate(image_ids):
+            gt_box = evaluator.gt_bboxes[image_id][0]
+            center_x = (gt_box[0] + gt_box[2]) / 2.
+            center_y = (gt_box[1] + gt_box[3]) / 2.
+            scoremap = np.exp(-((x - center_x) ** 2 + (y - center_y) ** 2) /
+                              3000.)
+            scoremap = (scoremap - scoremap.min()) / np.ptp(scoremap)
+            # Every other class prediction is wrong, with a constant map.
+            top1_correct = image_index % 2 == 0
+            evaluator.accumulate(
+                scoremap, image_id,
+                top1_scoremap=None if top1_correct else np.zeros((224, 224)),
+                top1_correct=top1_correct)
+        results = evaluator.compute()
+        self.assertEqual(results.classification, 50.)
+        self.assertGreater(results.max_box_acc[0], 50.)
+        self.assertLessEqual(results.top1_loc[0], 50.)
+        self.assertGreaterEqual(results.gt_unknown_loc[0],
+                                results.top1_loc[0])
+        self.assertRaises(ValueError, evaluator.accumulate, scoremap,
+                          image_ids[0])
+
+    def test_adaptive_box_evaluator_bounds(self):
+        evaluators = [load_evaluator(Evaluator,
+                                     dataset_name='CUB',
+                                     split='val',
+                                     cam_curve_interval=0.01,
+                                     iou_threshold_list=(0.3, 0.5))
+                      for Evaluator in (BoxEvaluator, AdaptiveBoxEvaluator)]
+        self._accumulate_blob_scoremaps(evaluators)
+        exhaustive = evaluators[0].compute()
+        adaptive = evaluators[1].compute()
+        self.assertLessEqual(adaptive.num_evaluated_thresholds, 100)
+        for lower, value, upper in zip(adaptive.max_box_acc,
+                                       exhaustive.max_box_acc,
+                                       adaptive.max_box_acc_upper_bound):
+            self.assertLessEqual(lower, value)
+            self.assertLessEqual(value, upper)
+        self.assertRaises(ValueError, load_evaluator, AdaptiveBoxEvaluator,
+                          dataset_name='CUB', split='val',
+                          cam_curve_interval=0.01, record_correctness=True)
+
+    def test_adaptive_box_evaluator_noise_scoremaps(self):
+        # The IoU bound of the search is loose on these maps, which are
+        # covered with foreground at most thresholds.
+        evaluators = [load_evaluator(Evaluator,
+                                     dataset_name='CUB',
+                                     split='val',
+                                     cam_curve_interval=0.01,
+                                     iou_threshold_list=(0.3, 0.5, 0.7))
+                      for Evaluator in (BoxEvaluator, AdaptiveBoxEvaluator)]
+        self._accumulate_noise_scoremaps(evaluators)
+        exhaustive = evaluators[0].compute()
+        adaptive = evaluators[1].compute()
+        self.assertEqual(adaptive.max_box_acc, exhaustive.max_box_acc)
+        for value, upper in zip(exhaustive.max_box_acc,
+                                adaptive.max_box_acc_upper_bound):
+            self.assertLessEqual(value, upper)
+            self.assertLess(upper, 100)
+
 
 class MaskEvaluatorTest(unittest.TestCase):
     _DATASET_NAME = 'OpenImages'
@@ -318,7 +479,7 @@ class MaskEvaluatorTest(unittest.TestCase):
             mask_root=self._MASK_ROOT)
         scoremap = self._get_constant_scoremap(image_id, value)
         evaluator.accumulate(scoremap, image_id)
-        auc = evaluator.compute()
+        auc = evaluator.compute().pxap
         return auc
 
     def test_mask_evaluator_masks_perfect_scoremap(self):
@@ -333,9 +494,117 @@ class MaskEvaluatorTest(unittest.TestCase):
                 scoremap = self._get_perfect_scoremap(
                     image_id, ignore_score=ignore_score)
                 evaluator.accumulate(scoremap, image_id)
-                auc = evaluator.compute()
+                auc = evaluator.compute().pxap
                 self.assertEqual(auc, 100.0)
 
+    def _load_mask_evaluator(self, visit_order=None, prefetch=True):
+        evaluator = load_evaluator(
+            MaskEvaluator,
+            dataset_name=self._DATASET_NAME,
+            split=self._SPLIT,
+            cam_curve_interval=self._CAM_CURVE_INTERVAL,
+            mask_root=self._MASK_ROOT)
+        if not prefetch:
+            evaluator._MASK_PREFETCH_WINDOW = 0
+        evaluator.reset(visit_order)
+        return evaluator
+
+    def _accumulate_perfect_scoremaps(self, evaluator, image_ids):
+        for image_id in image_ids:
+            scoremap = self._get_perfect_scoremap(image_id, ignore_score=0.5)
+            evaluator.accumulate(scoremap, image_id)
+
+    def test_mask_evaluator_prefetch_order(self):
+        # Test masks exist for these images only: strict subsets of the
+        # metadata order, visited in metadata order, reversed, or strided.
+        image_ids = list(self._TEST_IMAGE_IDS[::-1] +
+                         self._TEST_CONSTANT_GT_IMAGE_IDS)
+        for visit_order in (image_ids, image_ids[::-1], image_ids[1::2]):
+            reference = self._load_mask_evaluator(prefetch=False)
+            self._accumulate_perfect_scoremaps(reference, visit_order)
+            self.assertEqual(len(reference.pending_masks), 0)
+
+            for given_order in (visit_order, None):
+                evaluator = self._load_mask_evaluator(given_order)
+                self._accumulate_perfect_scoremaps(evaluator,
+                                                   visit_order[:1])
+                if given_order is not None:
+                    # The masks of the rest of the visit order are in
+                    # flight, and served from there.
+                    self.assertEqual(list(evaluator.pending_masks),
+                                     visit_order[1:])
+                self._accumulate_perfect_scoremaps(evaluator,
+                                                   visit_order[1:])
+                for image_id in visit_order:
+                    for runs, reference_runs in zip(
+                            evaluator.mask_runs[image_id],
+                            reference.mask_runs[image_id]):
+                        np.testing.assert_array_equal(runs, reference_runs)
+                np.testing.assert_array_equal(
+                    evaluator.gt_true_score_hist,
+                    reference.gt_true_score_hist)
+                np.testing.assert_array_equal(
+                    evaluator.gt_false_score_hist,
+                    reference.gt_false_score_hist)
+
+    def test_mask_evaluator_coarser_interval(self):
+        evaluators = [load_evaluator(MaskEvaluator,
+                                     dataset_name=self._DATASET_NAME,
+                                     split=self._SPLIT,
+                                     cam_curve_interval=cam_curve_interval,
+                                     mask_root=self._MASK_ROOT)
+                      for cam_curve_interval in (0.01, 0.05)]
+        rng = np.random.RandomState(0)
+        for image_id in self._TEST_IMAGE_IDS:
+            scoremap = self._get_perfect_scoremap(image_id, ignore_score=0.)
+            scoremap = 0.6 * scoremap + 0.4 * rng.rand(*scoremap.shape)
+            for evaluator in evaluators:
+                evaluator.accumulate(scoremap, image_id)
+        self.assertAlmostEqual(
+            evaluators[0].compute(cam_curve_interval=0.05).pxap,
+            evaluators[1].compute().pxap)
+
+    def test_mask_evaluator_pxiou_and_curves(self):
+        evaluator = load_evaluator(MaskEvaluator,
+                                   dataset_name=self._DATASET_NAME,
+                                   split=self._SPLIT,
+                                   cam_curve_interval=self._CAM_CURVE_INTERVAL,
+                                   mask_root=self._MASK_ROOT)
+        for image_id in self._TEST_IMAGE_IDS:
+            evaluator.accumulate(
+                self._get_perfect_scoremap(image_id, ignore_score=0.),
+                image_id)
+        results = evaluator.compute()
+        self.assertEqual(results.pxiou, 100.)
+        self.assertEqual(results.pxiou_threshold, 1.)
+        self.assertEqual(len(results.thresholds), 102)
+        self.assertEqual(results.recall[-1], 1.)
+
+        curve_root = tempfile.mkdtemp()
+        curve_path = os.path.join(curve_root, 'curves.npz')
+        save_pr_curves(curve_path, results)
+        with np.load(curve_path) as curves:
+            np.testing.assert_array_equal(curves['iou'], results.iou)
+            self.assertEqual(curves['pxap'], results.pxap)
+        shutil.rmtree(curve_root)
+
+    def test_mask_evaluator_exact_pxap(self):
+        evaluator = load_evaluator(MaskEvaluator,
+                                   dataset_name=self._DATASET_NAME,
+                                   split=self._SPLIT,
+                                   cam_curve_interval=0.125,
+                                   mask_root=self._MASK_ROOT,
+                                   exact_pxap=True)
+        rng = np.random.RandomState(0)
+        for image_id in self._TEST_IMAGE_IDS:
+            scoremap = self._get_perfect_scoremap(image_id, ignore_score=0.)
+            scoremap = 0.5 * scoremap + 0.5 * rng.rand(*scoremap.shape)
+            # Scores on the threshold grid: binning loses nothing.
+            evaluator.accumulate(np.round(scoremap * 8) / 8, image_id)
+        results = evaluator.compute()
+        self.assertAlmostEqual(results.pxap, results.binned_pxap)
+        self.assertLess(results.pxap, 100.)
+
     def test_mask_evaluator_masks_zero_scoremap_mask0(self):
         image_id = self._TEST_IMAGE_IDS[0]
         value = 0.0
@@ -0,0 +1,179 @@
+"""
+Copyright (c) 2020-present XXX XXX
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+
+import os
+import tempfile
+
+import numpy as np
+
+_POSITIVE = 'positive'
+_NEGATIVE = 'negative'
+
+
+class SortedScoreRuns(object):
+    """
+    Scores of GT positive and negative pixels, spilled to disk as sorted
+    runs of at most run_size scores each.
+
+    Memory holds one run being filled; compute_exact_pxap() merges the runs
+    chunk by chunk, so both accumulation and the final merge work in bounded
+    memory regardless of the number of pixels. Scores are kept at their
+    input precision, so the result does not depend on any threshold grid.
+    """
+    _RUN_NAME_TEMPLATE = '{}_{:05d}.npy'
+
+    def __init__(self, run_size=2 ** 23, run_root=None):
+        self.run_size = run_size
+        self.run_directory = tempfile.TemporaryDirectory(
+            prefix='pxap_runs_', dir=run_root)
+        self.run_paths = {_POSITIVE: [], _NEGATIVE: []}
+        self.buffers = {_POSITIVE: [], _NEGATIVE: []}
+        self.buffer_sizes = {_POSITIVE: 0, _NEGATIVE: 0}
+
+    def add(self, positive_scores, negative_scores):
+        for label, scores in ((_POSITIVE, positive_scores),
+                              (_NEGATIVE, negative_scores)):
+            if not scores.size:
+                continue
+            self.buffers[label].append(scores)
+            self.buffer_sizes[label] += scores.size
+            if self.buffer_sizes[label] >= self.run_size:
+                self._spill(label)
+
+    def _spill(self, label):
+        if not self.buffer_sizes[label]:
+            return
+        run = np.concatenate(self.buffers[label])
+        run.sort()
+        run_path = os.path.join(
+            self.run_directory.name,
+            self._RUN_NAME_TEMPLATE.format(label,
+                                           len(self.run_paths[label])))
+        np.save(run_path, run)
+        self.run_paths[label].append(run_path)
+        self.buffers[label] = []
+        self.buffer_sizes[label] = 0
+
+    def load_runs(self, label):
+        """
+        Spills what is buffered and returns the sorted runs of label
+        ('positive' or 'negative') as read-only memory maps.
+        """
+        self._spill(label)
+        return [np.load(run_path, mmap_mode='r')
+                for run_path in self.run_paths[label]]
+
+    def cleanup(self):
+        self.run_directory.cleanup()
+
+
+def _merge_step(runs, starts, chunk_size):
+    """
+    Returns the score bound b of the next merge step and, per run, the end of
+    the scores below b and of the scores equal to b. Every run holding
+    scores below b has them within chunk_size of its start, so each step
+    reads at most chunk_size scores per run; ties at b are only counted.
+    """
+    bound = np.inf
+    for run, start in zip(runs, starts):
+        chunk_end = start + chunk_size
+        if chunk_end < len(run):
+            bound = min(bound, run[chunk_end - 1])
+
+    below_ends = []
+    equal_ends = []
+    for run, start in zip(runs, starts):
+        if bound == np.inf:
+            below_ends.append(len(run))
+            equal_ends.append(len(run))
+            continue
+        chunk = run[start:start + chunk_size]
+        below_end = start + np.searchsorted(chunk, bound, side='left')
+        below_ends.append(below_end)
+        equal_ends.append(below_end + np.searchsorted(
+            run[below_end:], bound, side='right'))
+    return bound, below_ends, equal_ends
+
+
+def compute_exact_pxap(sorted_score_runs, chunk_size=2 ** 16):
+    """
+    Pixel average precision over every distinct score, i.e. the limit of the
+    binned PxAP of MaskEvaluator as cam_curve_interval goes to zero:
+
+        PxAP = 1 / P * sum over positive pixels i of tp(s_i) / (tp(s_i) +
+        fp(s_i)),
+
+    where tp(s) and fp(s) count the positive and negative pixels scoring at
+    least s, and P is the number of positive pixels.
+
+    The runs are merged in ascending score order, at most chunk_size scores
+    per run at a time; only counts are carried between steps.
+
+    Args:
+        sorted_score_runs: SortedScoreRuns.
+        chunk_size: int.
+    Returns:
+        pxap: float, in percent.
+    """
+    positive_runs = sorted_score_runs.load_runs(_POSITIVE)
+    negative_runs = sorted_score_runs.load_runs(_NEGATIVE)
+    num_positives = sum(len(run) for run in positive_runs)
+    num_negatives = sum(len(run) for run in negative_runs)
+    if num_positives == 0:
+        raise RuntimeError("No positive ground truth in the eval set.")
+
+    runs = positive_runs + negative_runs
+    num_positive_runs = len(positive_runs)
+    starts = [0] * len(runs)
+    positives_below = 0
+    negatives_below = 0
+    precision_sum = 0.
+
+    while any(start < len(run) for run, start in zip(runs, starts)):
+        bound, below_ends, equal_ends = _merge_step(runs, starts, chunk_size)
+        chunks = [np.asarray(run[start:below_end]) for run, start, below_end
+                  in zip(runs, starts, below_ends)]
+        positive_chunk = np.sort(np.concatenate(
+            chunks[:num_positive_runs] + [np.empty(0)]))
+        negative_chunk = np.sort(np.concatenate(
+            chunks[num_positive_runs:] + [np.empty(0)]))
+
+        tp = num_positives - positives_below - np.searchsorted(
+            positive_chunk, positive_chunk, side='left')
+        fp = num_negatives - negatives_below - np.searchsorted(
+            negative_chunk, positive_chunk, side='left')
+        precision_sum += (tp / (tp + fp).astype(np.float)).sum()
+        positives_below += len(positive_chunk)
+        negatives_below += len(negative_chunk)
+
+        ties = [equal_end - below_end for below_end, equal_end
+                in zip(below_ends, equal_ends)]
+        positive_ties = sum(ties[:num_positive_runs])
+        if positive_ties:
+            tp = num_positives - positives_below
+            fp = num_negatives - negatives_below
+            precision_sum += positive_ties * tp / float(tp + fp)
+        positives_below += positive_ties
+        negatives_below += sum(ties[num_positive_runs:])
+        starts = equal_ends
+
+    return precision_sum / num_positives * 100
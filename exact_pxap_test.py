@@ -0,0 +1,80 @@
+"""
+Copyright (c) 2020-present XXX XXX
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+
+import numpy as np
+import unittest
+
+from exact_pxap import compute_exact_pxap
+from exact_pxap import SortedScoreRuns
+
+
+def _brute_force_pxap(positive_scores, negative_scores):
+    positive_scores = np.sort(positive_scores)
+    negative_scores = np.sort(negative_scores)
+    tp = len(positive_scores) - np.searchsorted(
+        positive_scores, positive_scores, side='left')
+    fp = len(negative_scores) - np.searchsorted(
+        negative_scores, positive_scores, side='left')
+    return (tp / (tp + fp).astype(np.float)).mean() * 100
+
+
+class ExactPxAPTest(unittest.TestCase):
+    def _check(self, positive_scores, negative_scores, run_size, chunk_size):
+        runs = SortedScoreRuns(run_size=run_size)
+        for start in range(0, max(len(positive_scores),
+                                  len(negative_scores)), 37):
+            runs.add(positive_scores[start:start + 37],
+                     negative_scores[start:start + 37])
+        self.assertGreater(len(runs.run_paths['negative']), 1)
+        self.assertAlmostEqual(
+            compute_exact_pxap(runs, chunk_size=chunk_size),
+            _brute_force_pxap(positive_scores, negative_scores))
+        runs.cleanup()
+
+    def test_distinct_scores(self):
+        rng = np.random.RandomState(0)
+        self._check(rng.rand(1000) ** .5, rng.rand(3000),
+                    run_size=200, chunk_size=16)
+
+    def test_tied_scores(self):
+        # Long ties span several chunks and runs.
+        rng = np.random.RandomState(1)
+        self._check(np.round(rng.rand(1000) ** .5 * 4) / 4,
+                    np.round(rng.rand(3000) * 4) / 4,
+                    run_size=150, chunk_size=8)
+
+    def test_perfect_and_constant_scores(self):
+        self._check(np.ones(100), np.zeros(300), run_size=64, chunk_size=4)
+        self._check(np.full(100, .5), np.full(300, .5), run_size=64,
+                    chunk_size=4)
+        self.assertAlmostEqual(_brute_force_pxap(np.full(100, .5),
+                                                 np.full(300, .5)), 25.)
+
+    def test_no_positive(self):
+        runs = SortedScoreRuns()
+        runs.add(np.empty(0), np.zeros(10))
+        self.assertRaises(RuntimeError, compute_exact_pxap, runs)
+        runs.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
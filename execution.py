@@ -0,0 +1,139 @@
+"""
+Copyright (c) 2020-present XXX XXX
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+
+import copy
+import time
+
+import torch
+
+from device import get_memory_format
+import wsol
+
+__all__ = ['time_train_step', 'time_cam_forward', 'select_execution_modes']
+
+
+def _synchronize(device):
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+
+
+def _time_call(function, device, num_iterations):
+    """
+    Returns:
+        seconds: float. Median time of a call of function, after one warm-up
+            call (which includes any compilation).
+    """
+    function()
+    _synchronize(device)
+    times = []
+    for _ in range(num_iterations):
+        start = time.time()
+        function()
+        _synchronize(device)
+        times.append(time.time() - start)
+    return sorted(times)[len(times) // 2]
+
+
+def time_train_step(model, images, labels, get_loss, num_iterations=3):
+    """
+    Args:
+        get_loss: function from (output_dict, labels) to the scalar loss.
+    Returns:
+        seconds: float. Median time of a training forward and backward pass
+            (without the optimizer update, so that the weights are kept; the
+            BatchNorm statistics of model are updated).
+    """
+    def step():
+        loss = get_loss(model(images, labels), labels)
+        loss.backward()
+        model.zero_grad(set_to_none=True)
+
+    model.train()
+    return _time_call(step, images.device, num_iterations)
+
+
+def time_cam_forward(model, images, labels, num_iterations=3):
+    """
+    Returns:
+        seconds: float. Median time of a CAM forward pass of the copy of
+            model with the BatchNorms folded, as computed by CAMComputer.
+    """
+    folded_model = wsol.fold_batchnorm(model)
+
+    def forward():
+        with torch.no_grad():
+            folded_model(images, labels, return_cam=True)
+
+    return _time_call(forward, images.device, num_iterations)
+
+
+def _time_mode(model, architecture, architecture_type, images, labels,
+               get_loss, channels_last, compile_model, num_iterations):
+    model = copy.deepcopy(model).to(
+        memory_format=get_memory_format(channels_last))
+    images = images.contiguous(memory_format=get_memory_format(channels_last))
+    if compile_model:
+        wsol.compile_model(model, architecture, architecture_type)
+    return (time_train_step(model, images, labels, get_loss, num_iterations),
+            time_cam_forward(model, images, labels, num_iterations))
+
+
+def select_execution_modes(model, architecture, architecture_type, images,
+                           labels, get_loss, channels_last=False,
+                           compile_model=False, num_iterations=3):
+    """
+    Times a training step and a CAM forward pass on one batch in eager NCHW
+    mode, then with each requested mode added in turn (channels-last, then
+    compilation), and keeps a mode only if it lowers the summed time. The
+    timings run on copies of model.
+
+    Returns:
+        channels_last: bool. Whether to run in channels-last layout.
+        compile_model: bool. Whether to compile the forward
+            (wsol.compile_model).
+        timings: list of ((channels_last, compile_model),
+            (train_step_seconds, cam_forward_seconds)), in timing order.
+    """
+    timings = []
+
+    def time_mode(mode_channels_last, mode_compile_model):
+        mode_timings = _time_mode(
+            model, architecture, architecture_type, images, labels, get_loss,
+            channels_last=mode_channels_last, compile_model=mode_compile_model,
+            num_iterations=num_iterations)
+        timings.append(((mode_channels_last, mode_compile_model),
+                        mode_timings))
+        return sum(mode_timings)
+
+    selected_channels_last = False
+    selected_compile_model = False
+    best_time = time_mode(False, False)
+    if channels_last:
+        mode_time = time_mode(True, False)
+        if mode_time < best_time:
+            selected_channels_last, best_time = True, mode_time
+    if compile_model:
+        mode_time = time_mode(selected_channels_last, True)
+        if mode_time < best_time:
+            selected_compile_model, best_time = True, mode_time
+
+    return selected_channels_last, selected_compile_model, timings
@@ -0,0 +1,238 @@
+"""
+Copyright (c) 2020-present XXX XXX
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+
+import argparse
+import os
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from checkpoint import build_model
+from checkpoint import load_state_dict
+from config import get_architecture_type
+from config import str2bool
+from device import get_device
+from device import to_device
+from util import t2n
+
+_EXPORT_FORMATS = ('torchscript', 'onnx')
+_INPUT_NAMES = ['images', 'labels']
+_OUTPUT_NAMES = ['logits', 'cams', 'top1_cams']
+_NUM_CLASSES_MAPPING = {
+    "CUB": 200,
+    "ILSVRC": 1000,
+    "OpenImages": 100,
+}
+
+
+class CAMGraph(nn.Module):
+    """
+    The inference path of a wsol model with a fixed signature, so that it can
+    be traced: images and class ids to the logits, the CAMs of the given
+    classes and the CAMs of the predicted classes. Labels are always fed;
+    the labels=None fallbacks and return_cam switches of the eager forward
+    are resolved at export time.
+    """
+
+    def __init__(self, model):
+        super(CAMGraph, self).__init__()
+        self.model = model
+
+    def forward(self, images, labels):
+        outputs = self.model(images, labels, return_cam=True,
+                             return_top1_cam=True)
+        return outputs['logits'], outputs['cams'], outputs['top1_cams']
+
+
+def _example_inputs(num_classes, batch_size, crop_size, device):
+    images = torch.randn(batch_size, 3, crop_size, crop_size, device=device)
+    labels = torch.randint(num_classes, (batch_size,), device=device)
+    return images, labels
+
+
+def export_torchscript(model, export_path, example_inputs):
+    """
+    Traces the CAMGraph of model and freezes it: parameters become constants
+    and the eval-mode BatchNorms are folded into the convolutions.
+    """
+    with torch.no_grad():
+        graph = torch.jit.trace(CAMGraph(model).eval(), example_inputs)
+    graph = torch.jit.freeze(graph)
+    torch.jit.save(graph, export_path)
+
+
+def export_onnx(model, export_path, example_inputs):
+    dynamic_axes = {name: {0: 'batch_size'}
+                    for name in _INPUT_NAMES + _OUTPUT_NAMES}
+    with torch.no_grad():
+        torch.onnx.export(CAMGraph(model).eval(), example_inputs,
+                          export_path, input_names=_INPUT_NAMES,
+                          output_names=_OUTPUT_NAMES,
+                          dynamic_axes=dynamic_axes, dynamo=False)
+
+
+def export_model(model, export_path, export_format, num_classes,
+                 batch_size=2, crop_size=224):
+    """
+    Args:
+        model: wsol model, on the device the export runs on.
+        export_path: string. Output file.
+        export_format: string. 'torchscript' or 'onnx'.
+        num_classes: int.
+        batch_size, crop_size: int. Shape of the example inputs. The batch
+            dimension of the exported graph is dynamic; the crop size is
+            fixed for ONNX.
+    """
+    if export_format not in _EXPORT_FORMATS:
+        raise ValueError("export_format must be one of {}."
+                         .format(_EXPORT_FORMATS))
+    model.eval()
+    device = next(model.parameters()).device
+    example_inputs = _example_inputs(num_classes, batch_size, crop_size,
+                                     device)
+    {'torchscript': export_torchscript,
+     'onnx': export_onnx}[export_format](model, export_path, example_inputs)
+
+
+class ExportedModel(object):
+    """
+    Runs an exported CAMGraph behind the call signature of the eager wsol
+    models, so it can be passed to CAMComputer (or used for classification)
+    in place of them.
+    """
+
+    def eval(self):
+        return self
+
+    def _run(self, images, labels):
+        """
+        Returns:
+            logits, cams, top1_cams: torch.Tensor on the device of images.
+        """
+        raise NotImplementedError
+
+    def __call__(self, images, labels=None, return_cam=False,
+                 return_top1_cam=False, return_logits=False):
+        if labels is None:
+            if return_cam:
+                raise ValueError("CAMs of an exported model need labels.")
+            labels = torch.zeros(images.size(0), dtype=torch.long)
+        logits, cams, top1_cams = self._run(images, labels)
+        if not return_cam:
+            return {'logits': logits}
+        if return_top1_cam:
+            return {'cams': cams, 'top1_cams': top1_cams, 'logits': logits}
+        if return_logits:
+            return {'cams': cams, 'logits': logits}
+        return cams
+
+
+class TorchScriptModel(ExportedModel):
+    def __init__(self, export_path, device):
+        self.device = torch.device(device)
+        graph = torch.jit.load(export_path, map_location=self.device)
+        # Device-specific rewrites (e.g. oneDNN convolutions on CPU) are
+        # applied at load time; the optimized graph cannot be saved.
+        self.graph = torch.jit.optimize_for_inference(graph)
+
+    def _run(self, images, labels):
+        with torch.no_grad():
+            return self.graph(to_device(images, self.device),
+                              to_device(labels, self.device))
+
+
+class OnnxModel(ExportedModel):
+    def __init__(self, export_path, device):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("Running ONNX exports requires onnxruntime.")
+        self.device = torch.device(device)
+        providers = (['CUDAExecutionProvider'] if self.device.type == 'cuda'
+                     else []) + ['CPUExecutionProvider']
+        self.session = onnxruntime.InferenceSession(export_path,
+                                                    providers=providers)
+
+    def _run(self, images, labels):
+        outputs = self.session.run(
+            _OUTPUT_NAMES, {'images': t2n(images).astype(np.float32),
+                            'labels': t2n(labels).astype(np.int64)})
+        return tuple(torch.from_numpy(output).to(self.device)
+                     for output in outputs)
+
+
+def load_exported_model(export_path, device='cuda'):
+    """
+    Returns:
+        model: ExportedModel. TorchScriptModel or OnnxModel, by extension.
+    """
+    if os.path.splitext(export_path)[1] == '.onnx':
+        return OnnxModel(export_path, device)
+    return TorchScriptModel(export_path, device)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Exports a wsol model to a frozen CAM graph.")
+    parser.add_argument('--architecture', type=str, default='resnet50')
+    parser.add_argument('--wsol_method', type=str, default='cam')
+    parser.add_argument('--dataset_name', type=str, default='CUB',
+                        choices=list(_NUM_CLASSES_MAPPING))
+    parser.add_argument('--checkpoint_path', type=str, default=None,
+                        help="Checkpoint saved by main.py; random weights "
+                             "if not given.")
+    parser.add_argument('--export_path', type=str, required=True)
+    parser.add_argument('--export_format', type=str, default='torchscript',
+                        choices=_EXPORT_FORMATS)
+    parser.add_argument('--large_feature_map', type=str2bool, nargs='?',
+                        const=True, default=False)
+    parser.add_argument('--acol_threshold', type=float, default=0.7)
+    parser.add_argument('--adl_drop_rate', type=float, default=0.75)
+    parser.add_argument('--adl_threshold', type=float, default=0.9)
+    parser.add_argument('--device', type=str, default='cuda')
+    parser.add_argument('--crop_size', type=int, default=224)
+    args = parser.parse_args()
+
+    device = get_device(args.device)
+    num_classes = _NUM_CLASSES_MAPPING[args.dataset_name]
+    state_dict = (load_state_dict(args.checkpoint_path)
+                  if args.checkpoint_path is not None else None)
+    model = build_model(
+        args.architecture,
+        state_dict=state_dict,
+        dataset_name=args.dataset_name,
+        architecture_type=get_architecture_type(args.wsol_method),
+        pretrained=False,
+        num_classes=num_classes,
+        large_feature_map=args.large_feature_map,
+        adl_drop_rate=args.adl_drop_rate,
+        adl_drop_threshold=args.adl_threshold,
+        acol_drop_threshold=args.acol_threshold)
+    model = model.to(device)
+    export_model(model, args.export_path, args.export_format,
+                 num_classes=num_classes, crop_size=args.crop_size)
+    print("Exported {} to {}.".format(args.architecture, args.export_path))
+
+
+if __name__ == '__main__':
+    main()
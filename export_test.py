@@ -0,0 +1,72 @@
+"""
+Copyright (c) 2020-present XXX XXX
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import torch
+
+from export import export_model
+from export import load_exported_model
+import wsol
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        self.export_root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.export_root)
+
+    def test_torchscript_matches_eager(self):
+        torch.manual_seed(0)
+        model = wsol.vgg16(dataset_name='CUB', architecture_type='acol',
+                           pretrained=False, num_classes=10,
+                           large_feature_map=False, acol_drop_threshold=0.7)
+        export_path = os.path.join(self.export_root, 'vgg16_acol.pt')
+        export_model(model, export_path, 'torchscript', num_classes=10,
+                     batch_size=2, crop_size=64)
+        exported = load_exported_model(export_path, device='cpu')
+
+        images = torch.randn(3, 3, 64, 64)
+        labels = torch.tensor([1, 4, 9])
+        with torch.no_grad():
+            expected = model(images, labels, return_cam=True,
+                             return_top1_cam=True)
+            logits = model(images)['logits']
+        outputs = exported(images, labels, return_cam=True,
+                           return_top1_cam=True)
+        for key in ('cams', 'top1_cams', 'logits'):
+            self.assertTrue(torch.allclose(outputs[key], expected[key],
+                                           rtol=1e-4, atol=1e-5))
+        self.assertTrue(torch.allclose(
+            exported(images, labels, return_cam=True), expected['cams'],
+            rtol=1e-4, atol=1e-5))
+        self.assertTrue(torch.allclose(exported(images)['logits'], logits,
+                                       rtol=1e-4, atol=1e-5))
+        self.assertRaises(ValueError, exported, images, return_cam=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+"""
+Copyright (c) 2020-present XXX XXX
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+
+import os
+
+import numpy as np
+import torch
+
+from device import get_memory_format
+from device import to_device
+from wsol.method import AcolBase
+
+_FEATURE_FILE = 'features.npy'
+_INDEX_FILE = 'index.npz'
+_IMAGE_ID_FILE = 'image_ids.txt'
+
+
+def _get_head_type(model):
+    """
+    Returns:
+        head_type: string. 'acol' (two label-dependent branches on the
+            cached feature), 'weighted' (CAMs weighted by fc, as in
+            get_weighted_cams) or 'channel' (the cached map is class-wise,
+            as in get_channel_cams).
+    """
+    if isinstance(model, AcolBase):
+        return 'acol'
+    if isinstance(getattr(model, 'fc', None), torch.nn.Linear):
+        return 'weighted'
+    return 'channel'
+
+
+def _get_head_input_module(model):
+    """
+    The module whose input is cached: the ACoL classifiers read the
+    backbone feature; all other heads pool the map their CAMs are read
+    from.
+    """
+    if _get_head_type(model) == 'acol':
+        return model.classifier_A
+    return model.avgpool
+
+
+class FeatureCache(object):
+    """
+    Computes once the feature maps that the CAM head of a trained model
+    reads, over every image of a loader, and stores them as float16 in a
+    memory-mapped file under cache_root. The logits and the CAMs of any
+    classes then only run the head on the cached maps.
+
+    The cache holds one model's features: after the weights change, use a
+    new cache_root (an existing one is reopened as is).
+    """
+
+    def __init__(self, model, loader, cache_root, device='cuda',
+                 channels_last=False):
+        self.model = model.eval()
+        self.device = torch.device(device)
+        self.head_type = _get_head_type(model)
+        if not os.path.isfile(os.path.join(cache_root, _FEATURE_FILE)):
+            self._build(loader, cache_root, get_memory_format(channels_last))
+
+        self.features = np.load(os.path.join(cache_root, _FEATURE_FILE),
+                                mmap_mode='r')
+        index = np.load(os.path.join(cache_root, _INDEX_FILE))
+        self.targets = index['targets']
+        self.image_size = tuple(index['image_size'].tolist())
+        with open(os.path.join(cache_root, _IMAGE_ID_FILE)) as f:
+            self.image_ids = f.read().splitlines()
+
+    def __len__(self):
+        return len(self.image_ids)
+
+    def _build(self, loader, cache_root, memory_format):
+        captured = []
+        handle = _get_head_input_module(self.model).register_forward_pre_hook(
+            lambda module, inputs: captured.append(inputs[0]))
+        if not os.path.isdir(cache_root):
+            os.makedirs(cache_root)
+        temp_path = os.path.join(cache_root, _FEATURE_FILE + '.tmp')
+
+        features = None
+        image_size = None
+        targets = []
+        image_ids = []
+        with torch.no_grad():
+            for images, batch_targets, batch_image_ids in loader:
+                image_size = images.shape[2:]
+                images = to_device(images, self.device).contiguous(
+                    memory_format=memory_format)
+                del captured[:]
+                self.model(images)
+                batch_features = captured[0].half().cpu().numpy()
+                if features is None:
+                    features = np.lib.format.open_memmap(
+                        temp_path, mode='w+', dtype=np.float16,
+                        shape=((len(loader.dataset),) +
+                               batch_features.shape[1:]))
+                start = len(image_ids)
+                features[start:start + len(batch_features)] = batch_features
+                targets.extend(batch_targets.tolist())
+                image_ids.extend(batch_image_ids)
+        handle.remove()
+        features.flush()
+        del features
+
+        np.savez(os.path.join(cache_root, _INDEX_FILE),
+                 targets=np.array(targets), image_size=np.array(image_size))
+        with open(os.path.join(cache_root, _IMAGE_ID_FILE), 'w') as f:
+            f.write('\n'.join(image_ids) + '\n')
+        os.replace(temp_path, os.path.join(cache_root, _FEATURE_FILE))
+
+    def _load(self, start, stop):
+        features = torch.from_numpy(np.ascontiguousarray(
+            self.features[start:stop]))
+        return to_device(features, self.device).float()
+
+    def _get_logits(self, features):
+        if self.head_type == 'weighted':
+            return self.model.fc(features.mean(dim=(2, 3)))
+        if self.head_type == 'channel':
+            return features.mean(dim=(2, 3))
+        return self.model._branch(feature=features,
+                                  classifier=self.model.classifier_A)[1]
+
+    def _get_cams(self, features, class_ids):
+        if self.head_type == 'weighted':
+            weights = self.model.fc.weight[class_ids]
+            return torch.einsum('nkc,nchw->nkhw', weights,
+                                features) / features.shape[1]
+        batch_indices = torch.arange(features.shape[0],
+                                     device=features.device).view(-1, 1)
+        if self.head_type == 'channel':
+            return features[batch_indices, class_ids]
+        cams = []
+        for labels in class_ids.t():
+            logits_dict = self.model._acol_logits(
+                feature=features, labels=labels,
+                drop_threshold=self.model.drop_threshold)
+            cam_map = self.model._acol_cam_map(logits_dict)
+            cams.append(cam_map[batch_indices[:, 0], labels])
+        return torch.stack(cams, dim=1)
+
+    def get_logits(self, start, stop):
+        """
+        Returns:
+            logits: torch.Tensor(shape=(stop - start, num_classes)) of the
+                cached images start:stop, in loader order.
+        """
+        with torch.no_grad():
+            return self._get_logits(self._load(start, stop))
+
+    def get_cams(self, start, stop, class_ids=None):
+        """
+        Args:
+            start, stop: int. Range of cached images, in loader order.
+            class_ids: torch.LongTensor(shape=(stop - start, K)), or None
+                for the GT classes (K = 1).
+        Returns:
+            cams: torch.Tensor(shape=(stop - start, K, H, W)). cams[:, k]
+                equal (up to float16 rounding of the features) the output of
+                model(images, class_ids[:, k], return_cam=True).
+        """
+        if class_ids is None:
+            class_ids = torch.from_numpy(self.targets[start:stop]).view(-1, 1)
+        class_ids = to_device(class_ids.long(), self.device)
+        with torch.no_grad():
+            return self._get_cams(self._load(start, stop), class_ids)
@@ -0,0 +1,95 @@
+"""
+Copyright (c) 2020-present XXX XXX
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import shutil
+import tempfile
+import unittest
+
+import torch
+from torch.utils.data import DataLoader
+from torch.utils.data import Dataset
+
+from feature_cache import FeatureCache
+import wsol
+
+
+class _RandomImageDataset(Dataset):
+    def __init__(self, num_images, crop_size):
+        generator = torch.Generator().manual_seed(0)
+        self.images = torch.randn(num_images, 3, crop_size, crop_size,
+                                  generator=generator)
+
+    def __len__(self):
+        return len(self.images)
+
+    def __getitem__(self, index):
+        return self.images[index], index % 3, '{}.jpg'.format(index)
+
+
+class FeatureCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_root = tempfile.mkdtemp()
+        self.dataset = _RandomImageDataset(num_images=5, crop_size=64)
+        self.loader = DataLoader(self.dataset, batch_size=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_root)
+
+    def _check_cams(self, architecture, architecture_type):
+        torch.manual_seed(0)
+        model = getattr(wsol, architecture)(
+            architecture_type=architecture_type, dataset_name='CUB',
+            pretrained=False, num_classes=3, large_feature_map=False,
+            acol_drop_threshold=0.7).eval()
+        cache = FeatureCache(model, self.loader, self.cache_root,
+                             device='cpu')
+        self.assertEqual(cache.image_ids[-1], '4.jpg')
+        self.assertEqual(cache.image_size, (64, 64))
+
+        class_ids = torch.tensor([[0, 2], [1, 1], [2, 0], [0, 1], [1, 2]])
+        cams = cache.get_cams(1, 4, class_ids[1:4])
+        images = self.dataset.images[1:4]
+        with torch.no_grad():
+            logits = model(images)['logits']
+            for k in range(class_ids.shape[1]):
+                expected = model(images, class_ids[1:4, k], return_cam=True)
+                self.assertTrue(torch.allclose(
+                    cams[:, k], expected,
+                    atol=1e-2 * expected.abs().max().item()))
+        self.assertTrue(torch.allclose(cache.get_logits(1, 4), logits,
+                                       atol=1e-2 * logits.abs().max().item()))
+        self.assertTrue(torch.equal(cache.get_cams(0, 5),
+                                    FeatureCache(model, self.loader,
+                                                 self.cache_root,
+                                                 device='cpu').get_cams(0, 5)))
+
+    def test_weighted_cams(self):
+        self._check_cams('resnet50', 'cam')
+
+    def test_channel_cams(self):
+        self._check_cams('inception_v3', 'cam')
+
+    def test_acol_cams(self):
+        self._check_cams('vgg16', 'acol')
+
+
+if __name__ == '__main__':
+    unittest.main()
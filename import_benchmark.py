@@ -0,0 +1,79 @@
+"""
+Copyright (c) 2020-present XXX XXX
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+
+import argparse
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+_MODULE_NAMES = ('evaluation', 'main', 'inference', 'export', 'wsol')
+_TIMER_TEMPLATE = """
+import time
+{preload}
+start = time.perf_counter()
+{statement}
+print(time.perf_counter() - start)
+"""
+
+
+def time_import(statement, preload='', num_runs=5):
+    """
+    Returns:
+        seconds: float. Median wall time of statement over num_runs fresh
+            interpreters, after preload (excluded from the timing).
+    """
+    code = _TIMER_TEMPLATE.format(preload=preload, statement=statement)
+    root = os.path.dirname(os.path.abspath(__file__))
+    timings = [float(subprocess.check_output([sys.executable, '-c', code],
+                                             cwd=root))
+               for _ in range(num_runs)]
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Import time of the entry points, in fresh "
+                    "interpreters.")
+    parser.add_argument('--modules', type=str, nargs='+',
+                        default=list(_MODULE_NAMES))
+    parser.add_argument('--architecture', type=str, default='resnet50')
+    parser.add_argument('--num_runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print("{:<40} {:>10}".format('statement', 'ms'))
+    for module_name in args.modules:
+        statement = 'import {}'.format(module_name)
+        print("{:<40} {:>10.1f}".format(
+            statement, 1000 * time_import(statement,
+                                          num_runs=args.num_runs)))
+
+    statement = 'import wsol; wsol.{}'.format(args.architecture)
+    print("{:<40} {:>10.1f}".format(
+        statement + ' (torch loaded)',
+        1000 * time_import(statement, preload='import torch',
+                           num_runs=args.num_runs)))
+
+
+if __name__ == '__main__':
+    main()
@@ -21,11 +21,20 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import cv2
 import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
 
+from device import get_memory_format
+from device import to_device
+from evaluation import AdaptiveBoxEvaluator
 from evaluation import BoxEvaluator
 from evaluation import MaskEvaluator
 from evaluation import configure_metadata
 from util import t2n
+from wsol import fold_batchnorm
+from wsol import get_conv_bn_names
+from wsol import refresh_folded_batchnorm
 
 _IMAGENET_MEAN = [0.485, .456, .406]
 _IMAGENET_STDDEV = [.229, .224, .225]
@@ -49,35 +58,238 @@ def normalize_scoremap(cam):
     return cam
 
 
+def _fuse_maps(maps):
+    """
+    Mean of a list of torch.Tensor(shape=(N, H_i, W_i)), each resized
+    (bilinear) to the largest H_i x W_i.
+    """
+    size = max((tuple(m.shape[1:]) for m in maps),
+               key=lambda shape: shape[0] * shape[1])
+    return torch.stack([
+        m if tuple(m.shape[1:]) == size else
+        F.interpolate(m.unsqueeze(1), size=size, mode='bilinear',
+                      align_corners=False)[:, 0]
+        for m in maps]).mean(0)
+
+
+def _compute_view_cams(model, images, labels, tta_flip, tta_scales,
+                       return_logits=False):
+    """
+    Returns:
+        cams: list of torch.Tensor(shape=(N, H_i, W_i)), the CAMs of labels
+            for each view, in the canonical frame (unflipped).
+        logits: list of torch.Tensor(shape=(N, num_classes)) for each view,
+            with return_logits; empty otherwise.
+    """
+    num_images = images.shape[0]
+    cams = []
+    logits = []
+    for scale in tta_scales:
+        views = images
+        if scale != 1.0:
+            views = F.interpolate(images, scale_factor=scale,
+                                  mode='bilinear', align_corners=False)
+        if tta_flip:
+            views = torch.cat([views, views.flip(3)])
+        view_labels = labels.repeat(views.shape[0] // num_images)
+        if return_logits:
+            outputs = model(views, view_labels, return_cam=True,
+                            return_logits=True)
+            view_cams = outputs['cams']
+            logits.extend(outputs['logits'].split(num_images))
+        else:
+            view_cams = model(views, view_labels, return_cam=True)
+        view_cams = list(view_cams.split(num_images))
+        if tta_flip:
+            view_cams[1] = view_cams[1].flip(2)
+        cams.extend(view_cams)
+    return cams, logits
+
+
+def compute_tta_cams(model, images, labels, tta_flip=False,
+                     tta_scales=(1.0,), return_top1_cam=False):
+    """
+    CAMs fused over test-time augmented views of images: the images resized
+    by each factor of tta_scales and, with tta_flip, their horizontal flips.
+    The views of a scale go through one stacked forward; their CAMs are
+    mapped back to the canonical frame (unflipped, resized to the largest
+    CAM) and averaged before any normalization.
+
+    With return_top1_cam, the logits are averaged over the views, and the
+    top-1 CAMs are the fused CAMs of the class the averaged logits predict
+    (computed again, for the images where it is not the label, since the
+    views may predict different classes).
+
+    Returns:
+        as model(images, labels, return_cam=True,
+                 return_top1_cam=return_top1_cam).
+    """
+    if not tta_flip and tuple(tta_scales) == (1.0,):
+        return model(images, labels, return_cam=True,
+                     return_top1_cam=return_top1_cam)
+
+    cams, logits = _compute_view_cams(model, images, labels, tta_flip,
+                                      tta_scales,
+                                      return_logits=return_top1_cam)
+    cams = _fuse_maps(cams)
+    if not return_top1_cam:
+        return cams
+
+    logits = torch.stack(logits).mean(0)
+    top1_labels = logits.argmax(dim=1)
+    top1_cams = cams.clone()
+    wrong = (top1_labels != labels.to(top1_labels.device)).nonzero()[:, 0]
+    if len(wrong):
+        wrong_cams, _ = _compute_view_cams(
+            model, images[wrong.to(images.device)], top1_labels[wrong],
+            tta_flip, tta_scales)
+        top1_cams[wrong.to(top1_cams.device)] = _fuse_maps(wrong_cams)
+    return {'cams': cams, 'top1_cams': top1_cams, 'logits': logits}
+
+
 class CAMComputer(object):
+    """
+    Computes the CAMs of a model over a loader and evaluates them.
+
+    The evaluator (and the annotations it holds) is built once; each call to
+    compute_and_evaluate_cams() resets its statistics, so a CAMComputer can be
+    kept for the whole training run and called once per epoch.
+
+    With top1_localization, one forward pass gives the CAMs of the GT and the
+    predicted classes along with the logits, so top-1 localization, GT-known
+    localization and classification accuracy are reported together.
+
+    The CAMs are computed by a copy of the model with the BatchNorms folded
+    into the convolutions (wsol.fold_batchnorm). The copy is made on the
+    first call and refreshed in place to the current weights of the model on
+    the next ones (wsol.refresh_folded_batchnorm); a model without BatchNorm
+    (VGG) is used as is.
+
+    With a feature_cache (feature_cache.FeatureCache of the same model and
+    loader), the CAMs are read from the cached feature maps through the
+    head only, and the loader is not iterated; for evaluating a trained
+    model repeatedly.
+
+    With tta_flip or tta_scales, the CAMs (and logits) are fused over the
+    test-time augmented views of each batch (compute_tta_cams).
+    """
+
     def __init__(self, model, loader, metadata_root, mask_root,
-                 dataset_name, split, cam_curve_interval=.001):
+                 dataset_name, split, cam_curve_interval=.001,
+                 iou_threshold_list=(0.5,), multi_contour_eval=False,
+                 adaptive_threshold_search=False, record_correctness=False,
+                 top1_localization=False, device='cuda', channels_last=False,
+                 feature_cache=None, tta_flip=False, tta_scales=(1.0,)):
+        if feature_cache is not None and (tta_flip or
+                                          tuple(tta_scales) != (1.0,)):
+            raise ValueError("The feature cache holds the maps of the "
+                             "unaugmented images; it cannot be used with "
+                             "test-time augmentation.")
         self.model = model
         self.model.eval()
+        self.folded_model = None
         self.loader = loader
+        self.device = torch.device(device)
+        self.memory_format = get_memory_format(channels_last)
+        self.top1_localization = top1_localization
+        self.feature_cache = feature_cache
+        self.tta_flip = tta_flip
+        self.tta_scales = tuple(tta_scales)
 
         metadata = configure_metadata(metadata_root)
         threshold_list = list(np.arange(0, 1, cam_curve_interval))
 
+        box_evaluator = (AdaptiveBoxEvaluator if adaptive_threshold_search
+                         else BoxEvaluator)
         self.evaluator = {"OpenImages": MaskEvaluator,
-                          "CUB": BoxEvaluator,
-                          "ILSVRC": BoxEvaluator
-                          }[dataset_name](metadata=metadata,
-                                          dataset_name=dataset_name,
-                                          split=split,
-                                          threshold_list=threshold_list,
-                                          mask_root=mask_root)
+                          "CUB": box_evaluator,
+                          "ILSVRC": box_evaluator
+                          }[dataset_name](
+            metadata=metadata,
+            dataset_name=dataset_name,
+            split=split,
+            threshold_list=threshold_list,
+            mask_root=mask_root,
+            iou_threshold_list=iou_threshold_list,
+            multi_contour_eval=multi_contour_eval,
+            record_correctness=record_correctness,
+            top1_localization=top1_localization)
 
     def compute_and_evaluate_cams(self):
         print("Computing and evaluating cams.")
+        self.model.eval()
+        if self.feature_cache is not None:
+            self.evaluator.reset(self.feature_cache.image_ids)
+            self._accumulate_cached()
+            return self.evaluator.compute()
+        self.evaluator.reset(self.loader.dataset.image_ids)
+        model = self._get_folded_model()
 
         for images, targets, image_ids in self.loader:
             image_size = images.shape[2:]
-            images = images.cuda()
-            cams = t2n(self.model(images, targets, return_cam=True))
+            images = to_device(images, self.device).contiguous(
+                memory_format=self.memory_format)
+            if self.top1_localization:
+                self._accumulate_top1(model, images, targets, image_ids,
+                                      image_size)
+                continue
+            cams = t2n(compute_tta_cams(model, images, targets,
+                                        self.tta_flip, self.tta_scales))
             for cam, image_id in zip(cams, image_ids):
-                cam_resized = cv2.resize(cam, image_size,
-                                         interpolation=cv2.INTER_CUBIC)
-                cam_normalized = normalize_scoremap(cam_resized)
-                self.evaluator.accumulate(cam_normalized, image_id)
+                self.evaluator.accumulate(
+                    self._get_scoremap(cam, image_size), image_id)
         return self.evaluator.compute()
+
+    def _get_folded_model(self):
+        if (not isinstance(self.model, nn.Module) or
+                not get_conv_bn_names(self.model)):
+            return self.model
+        if self.folded_model is None:
+            self.folded_model = fold_batchnorm(self.model)
+        else:
+            refresh_folded_batchnorm(self.folded_model, self.model)
+        return self.folded_model
+
+    def _accumulate_top1(self, model, images, targets, image_ids,
+                         image_size):
+        outputs = compute_tta_cams(model, images, targets, self.tta_flip,
+                                   self.tta_scales, return_top1_cam=True)
+        cams = t2n(outputs['cams'])
+        top1_cams = t2n(outputs['top1_cams'])
+        top1_correct = (outputs['logits'].argmax(dim=1).cpu() ==
+                        targets.cpu()).tolist()
+        for cam, top1_cam, correct, image_id in zip(
+                cams, top1_cams, top1_correct, image_ids):
+            self.evaluator.accumulate(
+                self._get_scoremap(cam, image_size), image_id,
+                top1_scoremap=(None if correct else
+                               self._get_scoremap(top1_cam, image_size)),
+                top1_correct=correct)
+
+    def _accumulate_cached(self):
+        cache = self.feature_cache
+        for start in range(0, len(cache), self.loader.batch_size):
+            stop = min(start + self.loader.batch_size, len(cache))
+            targets = torch.from_numpy(cache.targets[start:stop])
+            class_ids = targets.view(-1, 1)
+            if self.top1_localization:
+                top1_classes = cache.get_logits(start, stop).argmax(dim=1)
+                class_ids = torch.stack([targets, top1_classes.cpu()], dim=1)
+            cams = t2n(cache.get_cams(start, stop, class_ids))
+            for index, image_id in enumerate(cache.image_ids[start:stop]):
+                scoremap = self._get_scoremap(cams[index, 0], cache.image_size)
+                if not self.top1_localization:
+                    self.evaluator.accumulate(scoremap, image_id)
+                    continue
+                correct = bool(class_ids[index, 0] == class_ids[index, 1])
+                self.evaluator.accumulate(
+                    scoremap, image_id,
+                    top1_scoremap=(None if correct else self._get_scoremap(
+                        cams[index, 1], cache.image_size)),
+                    top1_correct=correct)
+
+    @staticmethod
+    def _get_scoremap(cam, image_size):
+        cam_resized = cv2.resize(cam, image_size,
+                                 interpolation=cv2.INTER_CUBIC)
+        return normalize_scoremap(cam_resized)
@@ -0,0 +1,133 @@
+"""
+Copyright (c) 2020-present XXX XXX
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import unittest
+
+import torch
+import torch.nn as nn
+
+from inference import compute_tta_cams
+import wsol
+from wsol.cam import get_channel_cams
+
+
+class _RampModel(nn.Module):
+    """
+    Class-wise maps are the image channels; the logits weight them by a
+    left-to-right ramp, so a horizontal flip can change the prediction.
+    """
+
+    def forward(self, x, labels=None, return_cam=False,
+                return_top1_cam=False, return_logits=False):
+        ramp = torch.linspace(0, 1, x.shape[3])
+        logits = (x * ramp).mean(dim=(2, 3))
+        if return_cam:
+            return get_channel_cams(x, labels, logits, return_top1_cam,
+                                    return_logits)
+        return {'logits': logits}
+
+
+class ComputeTTACamsTest(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.model = wsol.resnet50(
+            architecture_type='cam', dataset_name='CUB', pretrained=False,
+            num_classes=5, large_feature_map=False).eval()
+        self.images = torch.randn(2, 3, 64, 64)
+        self.labels = torch.tensor([1, 4])
+
+    def test_single_view(self):
+        with torch.no_grad():
+            self.assertTrue(torch.equal(
+                compute_tta_cams(self.model, self.images, self.labels),
+                self.model(self.images, self.labels, return_cam=True)))
+
+    def test_flip_invariant(self):
+        with torch.no_grad():
+            cams = compute_tta_cams(self.model, self.images, self.labels,
+                                    tta_flip=True)
+            flipped_cams = compute_tta_cams(
+                self.model, self.images.flip(3), self.labels, tta_flip=True)
+        self.assertTrue(torch.allclose(cams, flipped_cams.flip(2),
+                                       atol=1e-6))
+
+    def test_scales(self):
+        with torch.no_grad():
+            outputs = compute_tta_cams(
+                self.model, self.images, self.labels, tta_flip=True,
+                tta_scales=(0.5, 1.0, 2.0), return_top1_cam=True)
+            logits = self.model(self.images)['logits']
+        self.assertEqual(outputs['cams'].shape, (2, 8, 8))
+        self.assertEqual(outputs['top1_cams'].shape, (2, 8, 8))
+        self.assertEqual(outputs['logits'].shape, logits.shape)
+
+    def test_top1_cams_of_fused_prediction(self):
+        # Class 0 is bright on the right half: the image predicts class 0,
+        # its flip class 1, and the averaged logits class 1.
+        images = torch.zeros(1, 2, 8, 8)
+        images[:, 0, :, 4:] = 1
+        images[:, 1] = 0.6
+        labels = torch.tensor([0])
+        model = _RampModel()
+        view_predictions = [model(view)['logits'].argmax(dim=1).item()
+                            for view in (images, images.flip(3))]
+        self.assertEqual(view_predictions, [0, 1])
+
+        outputs = compute_tta_cams(model, images, labels, tta_flip=True,
+                                   return_top1_cam=True)
+        self.assertEqual(outputs['logits'].argmax(dim=1).tolist(), [1])
+        self.assertTrue(torch.equal(
+            outputs['cams'],
+            compute_tta_cams(model, images, labels, tta_flip=True)))
+        self.assertTrue(torch.equal(
+            outputs['top1_cams'],
+            compute_tta_cams(model, images, torch.tensor([1]),
+                             tta_flip=True)))
+
+    def test_acol_top1_without_view_top1_cams(self):
+        model = wsol.resnet50(
+            architecture_type='acol', dataset_name='CUB', pretrained=False,
+            num_classes=5, large_feature_map=False,
+            acol_drop_threshold=0.7).eval()
+        erased_branch = model._erased_branch
+        erased_labels = []
+
+        def counting_erased_branch(feature, feat_map_a, labels,
+                                   drop_threshold):
+            erased_labels.append(labels)
+            return erased_branch(feature, feat_map_a, labels, drop_threshold)
+
+        model._erased_branch = counting_erased_branch
+        tta_scales = (1.0, 1.5)
+        with torch.no_grad():
+            outputs = compute_tta_cams(model, self.images, self.labels,
+                                       tta_flip=True, tta_scales=tta_scales,
+                                       return_top1_cam=True)
+        num_wrong = int((outputs['logits'].argmax(dim=1) !=
+                         self.labels).sum())
+        # One erasure per stacked forward of the views; the top-1 CAMs add
+        # one per forward of the mispredicted images, and none per view.
+        self.assertEqual(len(erased_labels),
+                         len(tta_scales) * (1 + (num_wrong > 0)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -22,12 +22,19 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 import numpy as np
 import os
 import random
+import time
 import torch
 import torch.nn as nn
 import torch.optim
 
 from config import get_configs
+from data_loaders import BatchTrainTransform
 from data_loaders import get_data_loader
+from device import get_device
+from device import get_memory_format
+from device import prepare_model
+from device import to_device
+from device import use_pinned_memory
 from inference import CAMComputer
 from util import string_contains_any
 import wsol
@@ -42,12 +49,23 @@ def set_random_seed(seed):
     torch.manual_seed(seed)
 
 
+def binomial_standard_error(accuracy, num_images, population_size):
+    """
+    Standard error (in percent) of an accuracy measured on num_images drawn
+    without replacement from population_size images.
+    """
+    ratio = accuracy / 100.
+    correction = (population_size - num_images) / max(population_size - 1, 1)
+    return 100. * np.sqrt(ratio * (1 - ratio) / num_images * correction)
+
+
 class PerformanceMeter(object):
     def __init__(self, higher_is_better=True):
         self.higher_is_better = higher_is_better
         self.best_value = -np.inf if self.higher_is_better else np.inf
         self.best_epoch = 0
         self.current_value = 0.
+        self.current_standard_error = None
 
     def _check_best(self, new_value):
         if self.higher_is_better:
@@ -55,11 +73,18 @@ class PerformanceMeter(object):
         else:
             return new_value <= self.best_value
 
-    def update(self, new_value, epoch):
+    def update(self, new_value, epoch, standard_error=None, is_best=None):
+        """
+        is_best overrides the comparison against best_value, for callers that
+        decide on more than the values themselves.
+        """
         self.current_value = new_value
+        self.current_standard_error = standard_error
         if epoch < 0:
             raise ValueError("Epoch must be non-negative.")
-        if self._check_best(new_value):
+        if is_best is None:
+            is_best = self._check_best(new_value)
+        if is_best:
             self.best_value = new_value
             self.best_epoch = epoch
 
@@ -93,8 +118,10 @@ class Trainer(object):
             for split in self._SPLITS
         }
         self.reporter = self.args.reporter
+        self.device = get_device(self.args.device, self.args.num_threads)
+        self.memory_format = get_memory_format(self.args.channels_last)
         self.model = self._set_model()
-        self.cross_entropy_loss = nn.CrossEntropyLoss().cuda()
+        self.cross_entropy_loss = nn.CrossEntropyLoss().to(self.device)
         self.optimizer = self._set_optimizer()
         self.loaders = get_data_loader(
             data_roots=self.args.data_paths,
@@ -104,25 +131,95 @@ class Trainer(object):
             resize_size=self.args.resize_size,
             crop_size=self.args.crop_size,
             proxy_training_set=self.args.proxy_training_set,
-            num_val_sample_per_class=self.args.num_val_sample_per_class)
+            num_val_sample_per_class=self.args.num_val_sample_per_class,
+            batch_train_transform=self.args.batch_train_transform,
+            fast_val_sample_per_class=self.args.fast_val_sample_per_class,
+            pin_memory=use_pinned_memory(self.device))
+        self.batch_train_transform = (
+            BatchTrainTransform(self.args.crop_size)
+            if self.args.batch_train_transform else None)
+        self.cam_computers = {}
+        self.fast_val_best_bitset = None
+        self.full_val_localization = {}
+        if self.args.channels_last or self.args.compile_model:
+            self._select_execution_modes()
 
     def _set_model(self):
+        from checkpoint import build_model
+        from checkpoint import load_state_dict
+
         num_classes = self._NUM_CLASSES_MAPPING[self.args.dataset_name]
         print("Loading model {}".format(self.args.architecture))
-        model = wsol.__dict__[self.args.architecture](
+        # A checkpoint to evaluate is assigned to a model built on the meta
+        # device (checkpoint.build_model), skipping the initializations.
+        state_dict = None
+        if self.args.checkpoint_path is not None:
+            state_dict = load_state_dict(self.args.checkpoint_path)
+        model = build_model(
+            self.args.architecture,
+            state_dict=state_dict,
             dataset_name=self.args.dataset_name,
             architecture_type=self.args.architecture_type,
             pretrained=self.args.pretrained,
             num_classes=num_classes,
             large_feature_map=self.args.large_feature_map,
             pretrained_path=self.args.pretrained_path,
+            weight_store_root=self.args.weight_store_root,
             adl_drop_rate=self.args.adl_drop_rate,
             adl_drop_threshold=self.args.adl_threshold,
             acol_drop_threshold=self.args.acol_threshold)
-        model = model.cuda()
+        model = prepare_model(model, self.device, self.args.channels_last)
         print(model)
         return model
 
+    def _select_execution_modes(self):
+        """
+        Keeps the requested channels-last and compilation modes only if they
+        speed up a training step and a CAM pass on the first train batch
+        (execution.select_execution_modes). The RNG state is restored, so
+        that training draws the same batches and augmentations.
+        """
+        from execution import select_execution_modes
+
+        model = self.model.to(memory_format=torch.contiguous_format)
+
+        def get_loss(output_dict, target):
+            if self.args.wsol_method in ('acol', 'spg'):
+                return wsol.method.__dict__[self.args.wsol_method].get_loss(
+                    output_dict, target,
+                    spg_thresholds=self.args.spg_thresholds)
+            return self.cross_entropy_loss(output_dict['logits'], target)
+
+        cuda_devices = [self.device] if self.device.type == 'cuda' else []
+        with torch.random.fork_rng(devices=cuda_devices):
+            images, target, _ = next(iter(self.loaders['train']))
+            images = to_device(images, self.device)
+            target = to_device(target, self.device)
+            if self.batch_train_transform is not None:
+                images = self.batch_train_transform(images)
+            channels_last, compile_model, timings = select_execution_modes(
+                model, self.args.architecture, self.args.architecture_type,
+                images, target, get_loss,
+                channels_last=self.args.channels_last,
+                compile_model=self.args.compile_model)
+        for (mode_channels_last, mode_compile_model), times in timings:
+            print("channels_last {}, compile_model {}: train step {:.1f} ms, "
+                  "CAM pass {:.1f} ms".format(
+                      mode_channels_last, mode_compile_model,
+                      times[0] * 1000, times[1] * 1000))
+        if channels_last != self.args.channels_last:
+            print("channels_last disabled: no speedup.")
+        if compile_model != self.args.compile_model:
+            print("compile_model disabled: no speedup.")
+
+        self.args.channels_last = channels_last
+        self.args.compile_model = compile_model
+        self.memory_format = get_memory_format(channels_last)
+        self.model = model.to(memory_format=self.memory_format)
+        if compile_model:
+            wsol.compile_model(self.model, self.args.architecture,
+                               self.args.architecture_type)
+
     def _set_optimizer(self):
         param_features = []
         param_classifiers = []
@@ -193,8 +290,11 @@ class Trainer(object):
         num_images = 0
 
         for batch_idx, (images, target, _) in enumerate(loader):
-            images = images.cuda()
-            target = target.cuda()
+            images = to_device(images, self.device)
+            target = to_device(target, self.device)
+            if self.batch_train_transform is not None:
+                images = self.batch_train_transform(images)
+            images = images.contiguous(memory_format=self.memory_format)
 
             if batch_idx % 10 == 0:
                 print("  iteration {} / {}"
@@ -235,8 +335,9 @@ class Trainer(object):
         num_images = 0
 
         for i, (images, targets, image_ids) in enumerate(loader):
-            images = images.cuda()
-            targets = targets.cuda()
+            images = to_device(images, self.device).contiguous(
+                memory_format=self.memory_format)
+            targets = to_device(targets, self.device)
             output_dict = self.model(images)
             pred = output_dict['logits'].argmax(dim=1)
 
@@ -246,26 +347,134 @@ class Trainer(object):
         classification_acc = num_correct / float(num_images) * 100
         return classification_acc
 
+    def _get_cam_computer(self, split, fast=False):
+        if (split, fast) not in self.cam_computers:
+            self.cam_computers[split, fast] = CAMComputer(
+                model=self.model,
+                loader=self.loaders['val_fast' if fast else split],
+                metadata_root=os.path.join(self.args.metadata_root, split),
+                mask_root=self.args.mask_root,
+                dataset_name=self.args.dataset_name,
+                split=split,
+                cam_curve_interval=self.args.cam_curve_interval,
+                iou_threshold_list=self.args.iou_threshold_list,
+                multi_contour_eval=self.args.multi_contour_eval,
+                adaptive_threshold_search=(
+                    self.args.adaptive_threshold_search and
+                    split == 'val' and not fast),
+                record_correctness=fast,
+                top1_localization=self.args.top1_localization,
+                device=self.device,
+                channels_last=self.args.channels_last,
+                tta_flip=self.args.tta_flip,
+                tta_scales=self.args.tta_scales)
+        return self.cam_computers[split, fast]
+
+    def _compute_full_val_localization(self):
+        cam_computer = self._get_cam_computer('val')
+        return cam_computer.compute_and_evaluate_cams().performance
+
+    def _is_fast_val_best(self, epoch, bitset):
+        """
+        Compares the subset correctness of this epoch with that of the best
+        epoch so far (same images, so the comparison is paired). The subset
+        decides when the fast_val_escalation_z confidence interval of the
+        difference shows that picking either epoch costs at most
+        fast_val_tolerance points. Otherwise this epoch is evaluated on the
+        whole val split (the only full-split pass) and compared with the
+        cached full-split number of the best epoch; a best epoch picked on
+        the subset alone has none, and the subset point estimate decides.
+        """
+        from bootstrap import paired_bootstrap_test
+
+        if self.fast_val_best_bitset is None:
+            return True
+        comparison = paired_bootstrap_test(bitset, self.fast_val_best_bitset)
+        margin = self.args.fast_val_escalation_z * comparison.standard_error
+        if comparison.difference - margin > -self.args.fast_val_tolerance:
+            return True
+        if comparison.difference + margin < self.args.fast_val_tolerance:
+            return False
+
+        best_epoch = (self.eval_performance_meters['val']['localization']
+                      .best_epoch)
+        print("Subset difference to epoch {} is {:.2f} +- {:.2f}; "
+              "evaluating on the whole val split.".format(
+                  best_epoch, comparison.difference,
+                  comparison.standard_error))
+        self.full_val_localization[epoch] = (
+            self._compute_full_val_localization())
+        if best_epoch not in self.full_val_localization:
+            print("Whole val split localization: epoch {} {:.2f}; epoch {} "
+                  "was picked on the subset.".format(
+                      epoch, self.full_val_localization[epoch], best_epoch))
+            return comparison.difference >= 0
+        print("Whole val split localization: epoch {} {:.2f}, "
+              "epoch {} {:.2f}".format(
+                  epoch, self.full_val_localization[epoch],
+                  best_epoch, self.full_val_localization[best_epoch]))
+        return (self.full_val_localization[epoch] >=
+                self.full_val_localization[best_epoch])
+
+    def _evaluate_fast(self, epoch):
+        from bootstrap import bootstrap_max_box_acc
+
+        fast_val_dataset = self.loaders['val_fast'].dataset
+        print("Evaluate epoch {}, split val (fixed subset of {} / {} images)"
+              .format(epoch, len(fast_val_dataset),
+                      fast_val_dataset.population_size))
+        self.model.eval()
+        meters = self.eval_performance_meters['val']
+
+        accuracy, _ = self._compute_accuracy_and_cams('val', fast=True)
+        meters['classification'].update(
+            accuracy, epoch,
+            standard_error=binomial_standard_error(
+                accuracy, len(fast_val_dataset),
+                fast_val_dataset.population_size))
+
+        cam_computer = self._get_cam_computer('val', fast=True)
+        bitset = cam_computer.evaluator.get_correctness_bitset()
+        localization = bootstrap_max_box_acc(bitset)
+        is_best = self._is_fast_val_best(epoch, bitset)
+        if is_best:
+            self.fast_val_best_bitset = bitset
+        meters['localization'].update(
+            localization.performance, epoch,
+            standard_error=localization.standard_error, is_best=is_best)
+
+        for metric in self._EVAL_METRICS:
+            print("Split val (subset), metric {}: {:.2f} +- {:.2f}".format(
+                metric, meters[metric].current_value,
+                meters[metric].current_standard_error))
+        self._print_performances()
+
+    def _compute_accuracy_and_cams(self, split, fast=False):
+        """
+        With top1_localization, the classification accuracy comes out of the
+        CAM pass; otherwise it takes a pass of its own.
+        """
+        cam_computer = self._get_cam_computer(split, fast)
+        if self.args.top1_localization:
+            cam_results = cam_computer.compute_and_evaluate_cams()
+            return cam_results.classification, cam_results
+        accuracy = self._compute_accuracy(
+            loader=self.loaders['val_fast' if fast else split])
+        return accuracy, cam_computer.compute_and_evaluate_cams()
+
     def evaluate(self, epoch, split):
+        if split == 'val' and self.args.fast_val_sample_per_class:
+            self._evaluate_fast(epoch)
+            return
+
         print("Evaluate epoch {}, split {}".format(epoch, split))
         self.model.eval()
 
-        accuracy = self._compute_accuracy(loader=self.loaders[split])
+        accuracy, cam_results = self._compute_accuracy_and_cams(split)
         self.eval_performance_meters[split]['classification'].update(
             accuracy, epoch)
-
-        cam_computer = CAMComputer(
-            model=self.model,
-            loader=self.loaders[split],
-            metadata_root=os.path.join(self.args.metadata_root, split),
-            mask_root=self.args.mask_root,
-            dataset_name=self.args.dataset_name,
-            split=split,
-            cam_curve_interval=self.args.cam_curve_interval)
-        cam_performance = cam_computer.compute_and_evaluate_cams()
-
         self.eval_performance_meters[split]['localization'].update(
-            cam_performance, epoch)
+            cam_results.performance, epoch)
 
         self._print_performances()
 
@@ -306,6 +515,65 @@ class Trainer(object):
                 key='{split}/{metric}_best'
                     .format(split=split, metric=metric),
                 val=self.eval_performance_meters[split][metric].best_value)
+            standard_error = (self.eval_performance_meters[split][metric]
+                              .current_standard_error)
+            if standard_error is not None:
+                reporter_instance.add(
+                    key='{split}/{metric}_standard_error'
+                        .format(split=split, metric=metric),
+                    val=standard_error)
+        reporter_instance.write()
+
+    def _get_calibration_images(self):
+        for i, (images, _, _) in enumerate(self.loaders['train']):
+            if i == self.args.num_calibration_batches:
+                break
+            images = to_device(images, self.device)
+            if self.batch_train_transform is not None:
+                images = self.batch_train_transform(images)
+            yield images
+
+    def evaluate_int8(self, epoch, split):
+        """
+        Quantizes the backbone to int8 (calibrated on train batches) and
+        evaluates the fp32 and int8 models on split, timing each full pass
+        (forward, CAMs and scoring).
+        """
+        from quantize import quantize_backbone
+
+        print("Quantize to int8 and evaluate split {}".format(split))
+        self.model.eval()
+        model_fp32 = self.model
+        model_int8 = quantize_backbone(
+            model_fp32, self.args.architecture,
+            self._get_calibration_images())
+
+        results = {}
+        for precision, model in (('fp32', model_fp32), ('int8', model_int8)):
+            self.model = model
+            self.cam_computers.pop((split, False), None)
+            self._get_cam_computer(split)
+            start = time.time()
+            accuracy, cam_results = self._compute_accuracy_and_cams(split)
+            results[precision] = (accuracy, cam_results.performance,
+                                  time.time() - start)
+        self.model = model_fp32
+        self.cam_computers.pop((split, False), None)
+
+        speedup = results['fp32'][2] / results['int8'][2]
+        for precision in ('fp32', 'int8'):
+            print("{}: classification {:.2f}, localization {:.2f}, "
+                  "{:.1f}s".format(precision, *results[precision]))
+        print("int8 speedup {:.2f}x".format(speedup))
+
+        reporter_instance = self.reporter(self.args.reporter_log_root, epoch)
+        for metric, value in (('classification', results['int8'][0]),
+                              ('localization', results['int8'][1]),
+                              ('speedup', speedup)):
+            reporter_instance.add(
+                key='{split}/int8_{metric}'.format(split=split,
+                                                   metric=metric),
+                val=value)
         reporter_instance.write()
 
     def adjust_learning_rate(self, epoch):
@@ -314,14 +582,16 @@ class Trainer(object):
                 param_group['lr'] *= 0.1
 
     def load_checkpoint(self, checkpoint_type):
+        from checkpoint import load_state_dict
+
         if checkpoint_type not in ('best', 'last'):
             raise ValueError("checkpoint_type must be either best or last.")
         checkpoint_path = os.path.join(
             self.args.log_folder,
             self._CHECKPOINT_NAME_TEMPLATE.format(checkpoint_type))
         if os.path.isfile(checkpoint_path):
-            checkpoint = torch.load(checkpoint_path)
-            self.model.load_state_dict(checkpoint['state_dict'], strict=True)
+            self.model.load_state_dict(load_state_dict(checkpoint_path),
+                                       strict=True)
             print("Check {} loaded.".format(checkpoint_path))
         else:
             raise IOError("No checkpoint {}.".format(checkpoint_path))
@@ -330,6 +600,15 @@ class Trainer(object):
 def main():
     trainer = Trainer()
 
+    if trainer.args.checkpoint_path is not None:
+        print("Evaluation of {} on test set ...".format(
+            trainer.args.checkpoint_path))
+        trainer.evaluate(0, split='test')
+        trainer.report(0, split='test')
+        if trainer.args.quantize_int8:
+            trainer.evaluate_int8(0, split='test')
+        return
+
     for epoch in range(trainer.args.epochs):
         print("===========================================================")
         print("Start epoch {} ...".format(epoch))
@@ -356,6 +635,9 @@ def main():
     trainer.evaluate(trainer.args.epochs, split='test')
     trainer.report(trainer.args.epochs, split='test')
 
+    if trainer.args.quantize_int8:
+        trainer.evaluate_int8(trainer.args.epochs, split='test')
+
 
 if __name__ == '__main__':
     main()
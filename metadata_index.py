@@ -0,0 +1,398 @@
+"""
+Copyright (c) 2020-present XXX XXX
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import json
+import munch
+import numpy as np
+import os
+
+_INDEX_FILE_NAME = 'metadata_index.npz'
+_INDEX_VERSION = 1
+_SOURCE_KEYS = ('image_ids', 'image_ids_proxy', 'class_labels', 'image_sizes',
+                'localization')
+_METADATA_INDICES = {}
+
+
+def mch(**kwargs):
+    return munch.Munch(dict(**kwargs))
+
+
+def configure_metadata(metadata_root):
+    metadata = mch()
+    metadata.image_ids = os.path.join(metadata_root, 'image_ids.txt')
+    metadata.image_ids_proxy = os.path.join(metadata_root,
+                                            'image_ids_proxy.txt')
+    metadata.class_labels = os.path.join(metadata_root, 'class_labels.txt')
+    metadata.image_sizes = os.path.join(metadata_root, 'image_sizes.txt')
+    metadata.localization = os.path.join(metadata_root, 'localization.txt')
+    return metadata
+
+
+def _encode_strings(strings):
+    return np.frombuffer('\n'.join(strings).encode('utf-8'), dtype=np.uint8)
+
+
+def _decode_strings(array, num_strings):
+    if num_strings == 0:
+        return []
+    return array.tobytes().decode('utf-8').split('\n')
+
+
+def _read_lines(file_path):
+    with open(file_path) as f:
+        return f.read().splitlines()
+
+
+def _source_signature(metadata):
+    signature = {}
+    for key in _SOURCE_KEYS:
+        if os.path.isfile(metadata[key]):
+            stat = os.stat(metadata[key])
+            signature[key] = [stat.st_size, stat.st_mtime_ns]
+        else:
+            signature[key] = None
+    return json.dumps(signature, sort_keys=True)
+
+
+class MetadataIndex(object):
+    """
+    Compact, integer-indexed form of the metadata text files of one split.
+
+    Every image_id appearing in any of the files gets an integer index, in
+    the order of image_ids.txt first. The per-image tables are numpy arrays
+    aligned with those indices:
+
+    class_labels: (num_images,) int32, -1 if the image is not labelled.
+    image_sizes: (num_images, 2) int32 (width, height), -1 if unknown.
+    boxes: (num_boxes, 4) int32 (x0, y0, x1, y1), in CSR form with
+        box_offsets (num_images + 1,) such that the boxes of image i are
+        boxes[box_offsets[i]:box_offsets[i + 1]].
+    mask_paths, ignore_paths: mask path table in CSR form with mask_offsets,
+        and one ignore path per image ('' if none).
+
+    A table is None when its source file does not exist. Indices are compiled
+    once from the text files, stored next to them as metadata_index.npz and
+    memoized process-wide (see get_metadata_index).
+    """
+
+    def __init__(self, metadata, signature, arrays):
+        self.metadata = metadata
+        self.signature = signature
+        self.image_ids = _decode_strings(arrays['image_ids'],
+                                         int(arrays['num_images']))
+        self.listed_indices = arrays.get('listed_indices')
+        self.proxy_indices = arrays.get('proxy_indices')
+        self.class_labels = arrays.get('class_labels')
+        self.image_sizes = arrays.get('image_sizes')
+        self.box_offsets = arrays.get('box_offsets')
+        self.boxes = arrays.get('boxes')
+        self.mask_offsets = arrays.get('mask_offsets')
+        if self.mask_offsets is not None:
+            self.mask_paths = _decode_strings(arrays['mask_paths'],
+                                              int(self.mask_offsets[-1]))
+            self.ignore_paths = _decode_strings(arrays['ignore_paths'],
+                                                len(self.image_ids))
+        else:
+            self.mask_paths = None
+            self.ignore_paths = None
+        self._indices = None
+
+    @property
+    def num_images(self):
+        return len(self.image_ids)
+
+    def index_of(self, image_id):
+        if self._indices is None:
+            self._indices = {image_id: index for index, image_id
+                             in enumerate(self.image_ids)}
+        return self._indices[image_id]
+
+    def indices_of(self, image_ids):
+        return np.array([self.index_of(image_id) for image_id in image_ids],
+                        dtype=np.int64)
+
+    def boxes_of(self, index):
+        return self.boxes[self.box_offsets[index]:self.box_offsets[index + 1]]
+
+    def mask_paths_of(self, index):
+        return self.mask_paths[self.mask_offsets[index]:
+                               self.mask_offsets[index + 1]]
+
+    def check_table(self, table, key):
+        if table is None:
+            raise IOError("Metadata file {} does not exist."
+                          .format(self.metadata[key]))
+
+    @classmethod
+    def compile(cls, metadata, signature):
+        image_ids = []
+        indices = {}
+
+        def _index(image_id):
+            if image_id not in indices:
+                indices[image_id] = len(image_ids)
+                image_ids.append(image_id)
+            return indices[image_id]
+
+        def _exists(key):
+            return os.path.isfile(metadata[key])
+
+        arrays = {}
+        if _exists('image_ids'):
+            arrays['listed_indices'] = np.array(
+                [_index(line) for line in _read_lines(metadata.image_ids)],
+                dtype=np.int32)
+        if _exists('image_ids_proxy'):
+            arrays['proxy_indices'] = np.array(
+                [_index(line)
+                 for line in _read_lines(metadata.image_ids_proxy)],
+                dtype=np.int32)
+
+        label_rows = []
+        if _exists('class_labels'):
+            for line in _read_lines(metadata.class_labels):
+                image_id, class_label_string = line.split(',')
+                label_rows.append((_index(image_id), int(class_label_string)))
+
+        size_rows = []
+        if _exists('image_sizes'):
+            for line in _read_lines(metadata.image_sizes):
+                image_id, ws, hs = line.split(',')
+                size_rows.append((_index(image_id), int(ws), int(hs)))
+
+        box_rows = []
+        mask_rows = []
+        if _exists('localization'):
+            for line in _read_lines(metadata.localization):
+                fields = line.split(',')
+                if len(fields) == 5:
+                    image_id, x0s, y0s, x1s, y1s = fields
+                    box_rows.append((_index(image_id), int(x0s), int(y0s),
+                                     int(x1s), int(y1s)))
+                else:
+                    image_id, mask_path, ignore_path = fields
+                    mask_rows.append((_index(image_id), mask_path,
+                                      ignore_path))
+
+        num_images = len(image_ids)
+        arrays['num_images'] = np.array(num_images)
+        arrays['image_ids'] = _encode_strings(image_ids)
+
+        if _exists('class_labels'):
+            class_labels = np.full(num_images, -1, dtype=np.int32)
+            for index, class_label in label_rows:
+                class_labels[index] = class_label
+            arrays['class_labels'] = class_labels
+
+        if _exists('image_sizes'):
+            image_sizes = np.full((num_images, 2), -1, dtype=np.int32)
+            for index, width, height in size_rows:
+                image_sizes[index] = width, height
+            arrays['image_sizes'] = image_sizes
+
+        # An empty localization file yields both (empty) tables.
+        if _exists('localization') and not mask_rows:
+            box_table = np.array(box_rows, dtype=np.int32).reshape(-1, 5)
+            order = np.argsort(box_table[:, 0], kind='stable')
+            arrays['boxes'] = box_table[order, 1:]
+            arrays['box_offsets'] = np.concatenate([[0], np.cumsum(
+                np.bincount(box_table[:, 0], minlength=num_images))])
+
+        if _exists('localization') and not box_rows:
+            image_indices = np.array([row[0] for row in mask_rows],
+                                     dtype=np.int64)
+            order = np.argsort(image_indices, kind='stable')
+            ignore_paths = [''] * num_images
+            seen = set()
+            for index, _, ignore_path in mask_rows:
+                if index in seen:
+                    assert (len(ignore_path) == 0)
+                else:
+                    seen.add(index)
+                    ignore_paths[index] = ignore_path
+            arrays['mask_paths'] = _encode_strings(
+                [mask_rows[row][1] for row in order])
+            arrays['mask_offsets'] = np.concatenate([[0], np.cumsum(
+                np.bincount(image_indices, minlength=num_images))])
+            arrays['ignore_paths'] = _encode_strings(ignore_paths)
+
+        return cls(metadata, signature, arrays)
+
+    def save(self, file_path):
+        arrays = dict(version=np.array(_INDEX_VERSION),
+                      signature=np.array(self.signature),
+                      num_images=np.array(self.num_images),
+                      image_ids=_encode_strings(self.image_ids))
+        for key in ('listed_indices', 'proxy_indices', 'class_labels',
+                    'image_sizes', 'box_offsets', 'boxes', 'mask_offsets'):
+            if getattr(self, key) is not None:
+                arrays[key] = getattr(self, key)
+        if self.mask_offsets is not None:
+            arrays['mask_paths'] = _encode_strings(self.mask_paths)
+            arrays['ignore_paths'] = _encode_strings(self.ignore_paths)
+
+        temp_path = file_path + '.{}.tmp'.format(os.getpid())
+        with open(temp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temp_path, file_path)
+
+    @classmethod
+    def load(cls, metadata, file_path, signature):
+        """
+        Returns None if the stored index is stale or unreadable.
+        """
+        try:
+            with np.load(file_path, allow_pickle=False) as stored:
+                if (int(stored['version']) != _INDEX_VERSION or
+                        str(stored['signature']) != signature):
+                    return None
+                arrays = {key: stored[key] for key in stored.files}
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+        return cls(metadata, signature, arrays)
+
+
+def get_metadata_index(metadata):
+    """
+    Returns the MetadataIndex of the split described by metadata.
+
+    The index is memoized per process. It is recompiled from the text files
+    whenever their sizes or modification times change; otherwise it is read
+    from the metadata_index.npz file next to them, which is (re)written
+    whenever the directory is writable.
+    """
+    index_file = os.path.join(os.path.dirname(metadata.image_ids),
+                              _INDEX_FILE_NAME)
+    key = os.path.abspath(index_file)
+    signature = _source_signature(metadata)
+
+    index = _METADATA_INDICES.get(key)
+    if index is not None and index.signature == signature:
+        return index
+
+    index = MetadataIndex.load(metadata, index_file, signature)
+    if index is None:
+        index = MetadataIndex.compile(metadata, signature)
+        try:
+            index.save(index_file)
+        except (IOError, OSError):
+            pass
+    _METADATA_INDICES[key] = index
+    return index
+
+
+def get_image_ids(metadata, proxy=False):
+    """
+    image_ids.txt has the structure
+
+    <path>
+    path/to/image1.jpg
+    path/to/image2.jpg
+    path/to/image3.jpg
+    ...
+    """
+    index = get_metadata_index(metadata)
+    suffix = '_proxy' if proxy else ''
+    indices = getattr(index, ('proxy' if proxy else 'listed') + '_indices')
+    index.check_table(indices, 'image_ids' + suffix)
+    return [index.image_ids[i] for i in indices.tolist()]
+
+
+def get_class_labels(metadata):
+    """
+    image_ids.txt has the structure
+
+    <path>,<integer_class_label>
+    path/to/image1.jpg,0
+    path/to/image2.jpg,1
+    path/to/image3.jpg,1
+    ...
+    """
+    index = get_metadata_index(metadata)
+    index.check_table(index.class_labels, 'class_labels')
+    labelled = np.where(index.class_labels >= 0)[0]
+    return dict(zip([index.image_ids[i] for i in labelled.tolist()],
+                    index.class_labels[labelled].tolist()))
+
+
+def get_bounding_boxes(metadata):
+    """
+    localization.txt (for bounding box) has the structure
+
+    <path>,<x0>,<y0>,<x1>,<y1>
+    path/to/image1.jpg,156,163,318,230
+    path/to/image1.jpg,23,12,101,259
+    path/to/image2.jpg,143,142,394,248
+    path/to/image3.jpg,28,94,485,303
+    ...
+
+    One image may contain multiple boxes (multiple boxes for the same path).
+    """
+    index = get_metadata_index(metadata)
+    index.check_table(index.box_offsets, 'localization')
+    boxes = [tuple(box) for box in index.boxes.tolist()]
+    offsets = index.box_offsets.tolist()
+    return {index.image_ids[i]: boxes[offsets[i]:offsets[i + 1]]
+            for i in range(index.num_images) if offsets[i] < offsets[i + 1]}
+
+
+def get_mask_paths(metadata):
+    """
+    localization.txt (for masks) has the structure
+
+    <path>,<link_to_mask_file>,<link_to_ignore_mask_file>
+    path/to/image1.jpg,path/to/mask1a.png,path/to/ignore1.png
+    path/to/image1.jpg,path/to/mask1b.png,
+    path/to/image2.jpg,path/to/mask2a.png,path/to/ignore2.png
+    path/to/image3.jpg,path/to/mask3a.png,path/to/ignore3.png
+    ...
+
+    One image may contain multiple masks (multiple mask paths for same image).
+    One image contains only one ignore mask.
+    """
+    index = get_metadata_index(metadata)
+    index.check_table(index.mask_offsets, 'localization')
+    offsets = index.mask_offsets.tolist()
+    mask_paths = {}
+    ignore_paths = {}
+    for i in range(index.num_images):
+        if offsets[i] < offsets[i + 1]:
+            image_id = index.image_ids[i]
+            mask_paths[image_id] = index.mask_paths[offsets[i]:offsets[i + 1]]
+            ignore_paths[image_id] = index.ignore_paths[i]
+    return mask_paths, ignore_paths
+
+
+def get_image_sizes(metadata):
+    """
+    image_sizes.txt has the structure
+
+    <path>,<w>,<h>
+    path/to/image1.jpg,500,300
+    path/to/image2.jpg,1000,600
+    path/to/image3.jpg,500,300
+    ...
+    """
+    index = get_metadata_index(metadata)
+    index.check_table(index.image_sizes, 'image_sizes')
+    known = np.where(index.image_sizes[:, 0] >= 0)[0]
+    return dict(zip([index.image_ids[i] for i in known.tolist()],
+                    map(tuple, index.image_sizes[known].tolist())))
@@ -0,0 +1,88 @@
+"""
+Copyright (c) 2020-present XXX XXX
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from metadata_index import configure_metadata
+from metadata_index import get_bounding_boxes
+from metadata_index import get_class_labels
+from metadata_index import get_image_ids
+from metadata_index import get_image_sizes
+from metadata_index import get_mask_paths
+from metadata_index import get_metadata_index
+
+
+def _write_lines(file_path, lines):
+    with open(file_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+class MetadataIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.metadata_root = tempfile.mkdtemp()
+        self.metadata = configure_metadata(self.metadata_root)
+        _write_lines(self.metadata.image_ids, ['a.jpg', 'b.jpg'])
+        _write_lines(self.metadata.class_labels, ['a.jpg,3', 'b.jpg,1'])
+        _write_lines(self.metadata.image_sizes, ['a.jpg,500,300',
+                                                 'b.jpg,20,10'])
+        _write_lines(self.metadata.localization, ['b.jpg,1,2,3,4',
+                                                  'a.jpg,5,6,7,8',
+                                                  'b.jpg,0,0,9,9'])
+
+    def tearDown(self):
+        shutil.rmtree(self.metadata_root)
+
+    def test_readers(self):
+        self.assertEqual(get_image_ids(self.metadata), ['a.jpg', 'b.jpg'])
+        self.assertEqual(get_class_labels(self.metadata),
+                         {'a.jpg': 3, 'b.jpg': 1})
+        self.assertEqual(get_image_sizes(self.metadata),
+                         {'a.jpg': (500, 300), 'b.jpg': (20, 10)})
+        self.assertEqual(get_bounding_boxes(self.metadata),
+                         {'a.jpg': [(5, 6, 7, 8)],
+                          'b.jpg': [(1, 2, 3, 4), (0, 0, 9, 9)]})
+        self.assertRaises(IOError, get_image_ids, self.metadata, proxy=True)
+
+    def test_memoized_and_stored(self):
+        index = get_metadata_index(self.metadata)
+        self.assertIs(get_metadata_index(self.metadata), index)
+        self.assertTrue(os.path.isfile(
+            os.path.join(self.metadata_root, 'metadata_index.npz')))
+
+    def test_rebuilt_on_change(self):
+        get_metadata_index(self.metadata)
+        _write_lines(self.metadata.localization,
+                     ['a.jpg,m_a.png,ignore_a.png',
+                      'a.jpg,m_a2.png,',
+                      'b.jpg,m_b.png,ignore_b.png'])
+        mask_paths, ignore_paths = get_mask_paths(self.metadata)
+        self.assertEqual(mask_paths, {'a.jpg': ['m_a.png', 'm_a2.png'],
+                                      'b.jpg': ['m_b.png']})
+        self.assertEqual(ignore_paths, {'a.jpg': 'ignore_a.png',
+                                        'b.jpg': 'ignore_b.png'})
+        self.assertRaises(IOError, get_bounding_boxes, self.metadata)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+Copyright (c) 2020-present XXX XXX
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+
+import copy
+
+import torch
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import convert_fx
+from torch.ao.quantization.quantize_fx import prepare_fx
+
+from wsol import BACKBONE_MODULE_NAMES
+
+__all__ = ['quantize_backbone']
+
+# The backbone stages (wsol.BACKBONE_MODULE_NAMES) are quantized to int8. The
+# stem of ResNet (conv1, bn1) and the CAM heads (fc, conv6, classifier_A/B,
+# SPG_*4, SPG_B/C) stay in fp32: the CAMs are computed from fp32 head weights
+# on the dequantized feature maps.
+
+
+def get_quantized_engine():
+    engines = torch.backends.quantized.supported_engines
+    for engine in ('x86', 'fbgemm', 'qnnpack'):
+        if engine in engines:
+            return engine
+    raise RuntimeError("No quantized engine available.")
+
+
+def _get_example_inputs(model, module_names, images):
+    example_inputs = {}
+
+    def hook(name):
+        def save_input(module, inputs):
+            example_inputs.setdefault(name, inputs)
+        return save_input
+
+    handles = [getattr(model, name).register_forward_pre_hook(hook(name))
+               for name in module_names]
+    with torch.no_grad():
+        model(images)
+    for handle in handles:
+        handle.remove()
+    return example_inputs
+
+
+def quantize_backbone(model, architecture, calibration_images):
+    """
+    Post-training static int8 quantization of the backbone stages: each
+    stage is traced with torch.fx, its Conv-BN-ReLU blocks fused, and its
+    activation ranges calibrated over calibration_images. Quantized kernels
+    run on CPU only.
+
+    Args:
+        model: wsol model (any architecture_type).
+        architecture: string. Key of wsol.BACKBONE_MODULE_NAMES.
+        calibration_images: iterable of torch.Tensor(shape=(N, 3, H, W)),
+            normalized like the evaluation inputs.
+    Returns:
+        model_int8: a quantized copy of model, on CPU, in eval mode.
+    """
+    engine = get_quantized_engine()
+    torch.backends.quantized.engine = engine
+    qconfig_mapping = get_default_qconfig_mapping(engine)
+
+    model = copy.deepcopy(model).cpu().eval()
+    children = dict(model.named_children())
+    module_names = [name for name in BACKBONE_MODULE_NAMES[architecture]
+                    if name in children]
+
+    num_batches = 0
+    with torch.no_grad():
+        for images in calibration_images:
+            images = images.cpu()
+            if num_batches == 0:
+                example_inputs = _get_example_inputs(model, module_names,
+                                                     images)
+                for name in module_names:
+                    setattr(model, name, prepare_fx(
+                        children[name], qconfig_mapping,
+                        example_inputs[name]))
+            model(images)
+            num_batches += 1
+    if num_batches == 0:
+        raise ValueError("No calibration images.")
+
+    for name in module_names:
+        setattr(model, name, convert_fx(getattr(model, name)))
+    return model
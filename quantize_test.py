@@ -0,0 +1,57 @@
+"""
+Copyright (c) 2020-present XXX XXX
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+
+import unittest
+
+import torch
+
+from quantize import quantize_backbone
+import wsol
+
+
+class QuantizeTest(unittest.TestCase):
+    def test_quantize_backbone(self):
+        torch.manual_seed(0)
+        model = wsol.vgg16(dataset_name='CUB', architecture_type='cam',
+                           pretrained=False, num_classes=10,
+                           large_feature_map=False).eval()
+        calibration_images = [torch.randn(4, 3, 64, 64) for _ in range(2)]
+        model_int8 = quantize_backbone(model, 'vgg16', calibration_images)
+
+        self.assertIsInstance(model.features, torch.nn.Sequential)
+        self.assertIsInstance(model_int8.fc, torch.nn.Linear)
+        self.assertFalse(any(isinstance(module, torch.nn.Conv2d)
+                             for module in model_int8.features.modules()))
+
+        images = torch.randn(3, 3, 64, 64)
+        labels = torch.tensor([1, 4, 9])
+        with torch.no_grad():
+            cams = model(images, labels, return_cam=True)
+            cams_int8 = model_int8(images, labels, return_cam=True)
+        self.assertEqual(cams_int8.shape, cams.shape)
+        correlation = torch.corrcoef(
+            torch.stack([cams.flatten(), cams_int8.flatten()]))[0, 1]
+        self.assertGreater(correlation.item(), 0.95)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,32 @@
-from .vgg import vgg16
-from .resnet import resnet50
-from .inception import inception_v3
+import importlib
+
 from .util import remove_layer
 from .util import replace_layer
+from .util import get_conv_bn_names
+from .util import fold_batchnorm
+from .util import refresh_folded_batchnorm
+from .util import compile_model
+from .util import BACKBONE_MODULE_NAMES
+
+# Architecture constructors, resolved on first access (PEP 562) so that only
+# the requested architecture module is imported.
+_ARCHITECTURE_MODULES = {
+    'vgg16': 'vgg',
+    'resnet50': 'resnet',
+    'inception_v3': 'inception',
+}
+
+
+def __getattr__(name):
+    if name not in _ARCHITECTURE_MODULES:
+        raise AttributeError("module {} has no attribute {}"
+                             .format(__name__, name))
+    module = importlib.import_module('.' + _ARCHITECTURE_MODULES[name],
+                                     __name__)
+    constructor = getattr(module, name)
+    globals()[name] = constructor
+    return constructor
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_ARCHITECTURE_MODULES))
@@ -0,0 +1,87 @@
+"""
+Copyright (c) 2020-present XXX XXX
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+
+import torch
+
+__all__ = ['get_channel_cams', 'get_weighted_cams']
+
+
+def _get_cam_labels(labels, logits, return_top1_cam):
+    """
+    Returns:
+        cam_labels: torch.LongTensor(shape=(N, K)). The GT labels, followed
+            by the predicted ones if return_top1_cam.
+    """
+    labels = labels.to(logits.device).view(-1, 1)
+    if not return_top1_cam:
+        return labels
+    return torch.cat([labels, logits.argmax(dim=1, keepdim=True)], dim=1)
+
+
+def _get_cam_outputs(cams, logits, return_top1_cam, return_logits):
+    if return_top1_cam:
+        return {'cams': cams[:, 0], 'top1_cams': cams[:, 1],
+                'logits': logits}
+    if return_logits:
+        return {'cams': cams[:, 0], 'logits': logits}
+    return cams[:, 0]
+
+
+def get_weighted_cams(feature_map, classifier_weight, labels, logits,
+                      return_top1_cam=False, return_logits=False):
+    """
+    CAMs as the channel mean of feature_map weighted by the classifier
+    weights of each class (VGG and ResNet CAM and ADL).
+
+    Args:
+        feature_map: torch.Tensor(shape=(N, C, H, W)), detached.
+        classifier_weight: torch.Tensor(shape=(num_classes, C)).
+        labels: torch.LongTensor(shape=(N,)). GT labels.
+        logits: torch.Tensor(shape=(N, num_classes)).
+        return_top1_cam: bool. Also return the CAMs of the predicted classes,
+            computed from the same feature_map.
+        return_logits: bool. Also return the logits (implied by
+            return_top1_cam).
+    Returns:
+        cams: torch.Tensor(shape=(N, H, W)), or, with return_top1_cam, a dict
+            with 'cams', 'top1_cams' and 'logits' ('cams' and 'logits' with
+            return_logits only).
+    """
+    cam_labels = _get_cam_labels(labels, logits, return_top1_cam)
+    cam_weights = classifier_weight[cam_labels]
+    cams = (cam_weights.view(*cam_weights.shape, 1, 1) *
+            feature_map.unsqueeze(1)).mean(2, keepdim=False)
+    return _get_cam_outputs(cams, logits, return_top1_cam, return_logits)
+
+
+def get_channel_cams(feature_map, labels, logits, return_top1_cam=False,
+                     return_logits=False):
+    """
+    CAMs as the class channels of a class-wise feature_map (Inception, ACoL,
+    SPG).
+    Arguments and outputs as in get_weighted_cams.
+    """
+    cam_labels = _get_cam_labels(labels, logits, return_top1_cam)
+    batch_indices = torch.arange(feature_map.shape[0],
+                                 device=feature_map.device).view(-1, 1)
+    cams = feature_map[batch_indices, cam_labels]
+    return _get_cam_outputs(cams, logits, return_top1_cam, return_logits)
@@ -9,12 +9,13 @@ import torch.nn as nn
 import torch.nn.functional as F
 from torch.utils.model_zoo import load_url
 
+from .cam import get_channel_cams
 from .method import AcolBase
 from .method import ADL
-from .method import normalize_tensor
 from .method import spg
 from .util import initialize_weights
 from .util import remove_layer
+from .weight_store import load_converted_state_dict
 
 __all__ = ['inception_v3']
 
@@ -167,9 +168,8 @@ class InceptionCam(nn.Module):
 
         initialize_weights(self.modules(), init_mode='xavier')
 
-    def forward(self, x, labels=None, return_cam=False):
-        batch_size = x.shape[0]
-
+    def forward(self, x, labels=None, return_cam=False,
+                return_top1_cam=False, return_logits=False):
         x = self.Conv2d_1a_3x3(x)
         x = self.Conv2d_2a_3x3(x)
         x = self.Conv2d_2b_3x3(x)
@@ -201,9 +201,8 @@ class InceptionCam(nn.Module):
         logits = logits.view(logits.shape[0:2])
 
         if return_cam:
-            feature_map = feat_map.clone().detach()
-            cams = feature_map[range(batch_size), labels]
-            return cams
+            return get_channel_cams(feat_map.clone().detach(), labels, logits,
+                                    return_top1_cam, return_logits)
 
         return {'logits': logits}
 
@@ -255,9 +254,8 @@ class InceptionAcol(AcolBase):
 
         initialize_weights(self.modules(), init_mode='xavier')
 
-    def forward(self, x, labels=None, return_cam=False):
-        batch_size = x.shape[0]
-
+    def forward(self, x, labels=None, return_cam=False,
+                return_top1_cam=False, return_logits=False):
         x = self.Conv2d_1a_3x3(x)
         x = self.Conv2d_2a_3x3(x)
         x = self.Conv2d_2b_3x3(x)
@@ -282,13 +280,8 @@ class InceptionAcol(AcolBase):
                                         drop_threshold=self.drop_threshold)
 
         if return_cam:
-            normalized_a = normalize_tensor(
-                logits_dict['feat_map_a'].clone().detach())
-            normalized_b = normalize_tensor(
-                logits_dict['feat_map_b'].clone().detach())
-            feature_maps = torch.max(normalized_a, normalized_b)
-            cams = feature_maps[range(batch_size), labels]
-            return cams
+            return self._acol_cams(feature, logits_dict, labels,
+                                   return_top1_cam, return_logits)
 
         return logits_dict
 
@@ -348,9 +341,8 @@ class InceptionSpg(nn.Module):
 
         initialize_weights(self.modules(), init_mode='xavier')
 
-    def forward(self, x, labels=None, return_cam=False):
-        batch_size = x.shape[0]
-
+    def forward(self, x, labels=None, return_cam=False,
+                return_top1_cam=False, return_logits=False):
         x = self.Conv2d_1a_3x3(x)
         x = self.Conv2d_2a_3x3(x)
         x = self.Conv2d_2b_3x3(x)
@@ -395,9 +387,8 @@ class InceptionSpg(nn.Module):
             logits_b1=logits_b1, logits_b2=logits_b2)
 
         if return_cam:
-            feature_map = feat_map.clone().detach()
-            cams = feature_map[range(batch_size), labels]
-            return cams
+            return get_channel_cams(feat_map.clone().detach(), labels, logits,
+                                    return_top1_cam, return_logits)
 
         return {'attention': attention, 'fused_attention': fused_attention,
                 'logits': logits, 'logits_b1': logits_b1,
@@ -447,9 +438,8 @@ class InceptionAdl(nn.Module):
 
         initialize_weights(self.modules(), init_mode='xavier')
 
-    def forward(self, x, labels=None, return_cam=False):
-        batch_size = x.shape[0]
-
+    def forward(self, x, labels=None, return_cam=False,
+                return_top1_cam=False, return_logits=False):
         x = self.Conv2d_1a_3x3(x)
         x = self.Conv2d_2a_3x3(x)
         x = self.Conv2d_2b_3x3(x)
@@ -481,35 +471,43 @@ class InceptionAdl(nn.Module):
         logits = logits.view(x.shape[0:2])
 
         if return_cam:
-            feature_map = x.clone().detach()
-            cams = feature_map[range(batch_size), labels]
-            return cams
+            return get_channel_cams(x.clone().detach(), labels, logits,
+                                    return_top1_cam, return_logits)
 
         return {'logits': logits}
 
 
-def load_pretrained_model(model, path=None):
-    if path:
-        state_dict = torch.load(
-            os.path.join(path, 'inception_v3.pth'))
-    else:
-        state_dict = load_url(model_urls['inception_v3_google'],
-                              progress=True)
-
-    remove_layer(state_dict, 'Mixed_7')
-    remove_layer(state_dict, 'AuxLogits')
-    remove_layer(state_dict, 'fc.')
-
+def load_pretrained_model(model, architecture_type, path=None,
+                          store_root=None, large_feature_map=False):
+    def convert():
+        if path:
+            state_dict = torch.load(
+                os.path.join(path, 'inception_v3.pth'))
+        else:
+            state_dict = load_url(model_urls['inception_v3_google'],
+                                  progress=True)
+
+        remove_layer(state_dict, 'Mixed_7')
+        remove_layer(state_dict, 'AuxLogits')
+        remove_layer(state_dict, 'fc.')
+        return state_dict
+
+    state_dict = load_converted_state_dict(
+        convert, store_root, 'inception_v3', architecture_type,
+        large_feature_map)
     model.load_state_dict(state_dict, strict=False)
     return model
 
 
 def inception_v3(architecture_type, pretrained=False, pretrained_path=None,
-                 **kwargs):
+                 weight_store_root=None, **kwargs):
     model = {'cam': InceptionCam,
              'acol': InceptionAcol,
              'spg': InceptionSpg,
              'adl': InceptionAdl}[architecture_type](**kwargs)
     if pretrained:
-        model = load_pretrained_model(model, pretrained_path)
+        model = load_pretrained_model(
+            model, architecture_type, path=pretrained_path,
+            store_root=weight_store_root,
+            large_feature_map=kwargs['large_feature_map'])
     return model
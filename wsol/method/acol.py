@@ -6,7 +6,9 @@ Original repository:
 import torch
 import torch.nn as nn
 
+from ..cam import get_channel_cams
 from .util import get_attention
+from .util import normalize_tensor
 
 __all__ = ['AcolBase']
 
@@ -16,13 +18,53 @@ class AcolBase(nn.Module):
         feat_map_a, logits = self._branch(feature=feature,
                                           classifier=self.classifier_A)
         labels = logits.argmax(dim=1).long() if labels is None else labels
+        feat_map_b, logit_b = self._erased_branch(
+            feature=feature, feat_map_a=feat_map_a, labels=labels,
+            drop_threshold=drop_threshold)
+        return {'logits': logits, 'logit_b': logit_b,
+                'feat_map_a': feat_map_a, 'feat_map_b': feat_map_b}
+
+    def _erased_branch(self, feature, feat_map_a, labels, drop_threshold):
         attention = get_attention(feature=feat_map_a, label=labels)
         erased_feature = _erase_attention(
             feature=feature, attention=attention, drop_threshold=drop_threshold)
-        feat_map_b, logit_b = self._branch(feature=erased_feature,
-                                           classifier=self.classifier_B)
-        return {'logits': logits, 'logit_b': logit_b,
-                'feat_map_a': feat_map_a, 'feat_map_b': feat_map_b}
+        return self._branch(feature=erased_feature,
+                            classifier=self.classifier_B)
+
+    def _acol_cams(self, feature, logits_dict, labels, return_top1_cam,
+                   return_logits):
+        """
+        CAMs of labels, as get_channel_cams. Branch B sees the feature erased
+        by the attention of the class its CAM is read for, so the top-1 CAMs
+        come from branch B run again on the feature erased for the predicted
+        classes (not for labels).
+        """
+        logits = logits_dict['logits']
+        cams = get_channel_cams(self._acol_cam_map(logits_dict), labels,
+                                logits)
+        if not return_top1_cam:
+            if return_logits:
+                return {'cams': cams, 'logits': logits}
+            return cams
+        top1_labels = logits.argmax(dim=1)
+        top1_feat_map_b, _ = self._erased_branch(
+            feature=feature, feat_map_a=logits_dict['feat_map_a'],
+            labels=top1_labels, drop_threshold=self.drop_threshold)
+        top1_cam_map = self._acol_cam_map(
+            dict(logits_dict, feat_map_b=top1_feat_map_b))
+        top1_cams = get_channel_cams(top1_cam_map, top1_labels, logits)
+        return {'cams': cams, 'top1_cams': top1_cams, 'logits': logits}
+
+    def _acol_cam_map(self, logits_dict):
+        """
+        Class-wise map the ACoL CAMs are read from: the maximum of the
+        normalized maps of both branches.
+        """
+        normalized_a = normalize_tensor(
+            logits_dict['feat_map_a'].detach().clone())
+        normalized_b = normalize_tensor(
+            logits_dict['feat_map_b'].detach().clone())
+        return torch.max(normalized_a, normalized_b)
 
     def _branch(self, feature, classifier):
         feat_map = classifier(feature)
@@ -32,10 +74,8 @@ class AcolBase(nn.Module):
 
 
 def _erase_attention(feature, attention, drop_threshold):
-    b, _, h, w = attention.size()
     pos = torch.ge(attention, drop_threshold)
-    mask = attention.new_ones((b, 1, h, w))
-    mask[pos.data] = 0.
+    mask = (~pos).type_as(attention)
     erased_feature = feature * mask
     return erased_feature
 
@@ -11,7 +11,7 @@ __all__ = ['cutmix']
 
 def cutmix(x, target, beta):
     lam = np.random.beta(beta, beta)
-    rand_index = torch.randperm(x.size()[0]).cuda()
+    rand_index = torch.randperm(x.size()[0], device=x.device)
 
     target_a = target.clone().detach()
     target_b = target[rand_index].clone().detach()
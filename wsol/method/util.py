@@ -35,8 +35,8 @@ def normalize_tensor(x):
 
 def get_attention(feature, label):
     feat_map = feature.detach().clone()
-    attention = feat_map.requires_grad_(True)[
-                range(feat_map.size(0)), label, :, :]
+    batch_indices = torch.arange(feat_map.size(0), device=feat_map.device)
+    attention = feat_map.requires_grad_(True)[batch_indices, label, :, :]
     attention = attention.unsqueeze(1)
     attention = normalize_tensor(attention)
     return attention
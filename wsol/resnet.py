@@ -8,13 +8,15 @@ import torch
 import torch.nn as nn
 from torch.utils.model_zoo import load_url
 
+from .cam import get_channel_cams
+from .cam import get_weighted_cams
 from .method import AcolBase
 from .method import ADL
 from .method import spg
-from .method.util import normalize_tensor
 from .util import remove_layer
 from .util import replace_layer
 from .util import initialize_weights
+from .weight_store import load_converted_state_dict
 
 __all__ = ['resnet50']
 
@@ -89,7 +91,8 @@ class ResNetCam(nn.Module):
 
         initialize_weights(self.modules(), init_mode='xavier')
 
-    def forward(self, x, labels=None, return_cam=False):
+    def forward(self, x, labels=None, return_cam=False,
+                return_top1_cam=False, return_logits=False):
         x = self.conv1(x)
         x = self.bn1(x)
         x = self.relu(x)
@@ -105,11 +108,9 @@ class ResNetCam(nn.Module):
         logits = self.fc(pre_logit)
 
         if return_cam:
-            feature_map = x.detach().clone()
-            cam_weights = self.fc.weight[labels]
-            cams = (cam_weights.view(*feature_map.shape[:2], 1, 1) *
-                    feature_map).mean(1, keepdim=False)
-            return cams
+            return get_weighted_cams(x.detach().clone(), self.fc.weight,
+                                     labels, logits, return_top1_cam,
+                                     return_logits)
         return {'logits': logits}
 
     def _make_layer(self, block, planes, blocks, stride):
@@ -168,9 +169,8 @@ class ResNetAcol(AcolBase):
         self.avgpool = nn.AdaptiveAvgPool2d((1, 1))
         initialize_weights(self.modules(), init_mode='he')
 
-    def forward(self, x, labels=None, return_cam=False):
-        batch_size = x.shape[0]
-
+    def forward(self, x, labels=None, return_cam=False,
+                return_top1_cam=False, return_logits=False):
         x = self.conv1(x)
         x = self.bn1(x)
         x = self.relu(x)
@@ -185,13 +185,8 @@ class ResNetAcol(AcolBase):
                                         drop_threshold=self.drop_threshold)
 
         if return_cam:
-            normalized_a = normalize_tensor(
-                logits_dict['feat_map_a'].detach().clone())
-            normalized_b = normalize_tensor(
-                logits_dict['feat_map_b'].detach().clone())
-            feature_map = torch.max(normalized_a, normalized_b)
-            cams = feature_map[range(batch_size), labels]
-            return cams
+            return self._acol_cams(feature, logits_dict, labels,
+                                   return_top1_cam, return_logits)
 
         return logits_dict
 
@@ -290,9 +285,8 @@ class ResNetSpg(nn.Module):
 
         return layers
 
-    def forward(self, x, labels=None, return_cam=False):
-        batch_size = x.shape[0]
-
+    def forward(self, x, labels=None, return_cam=False,
+                return_top1_cam=False, return_logits=False):
         x = self.conv1(x)
         x = self.bn1(x)
         x = self.relu(x)
@@ -323,9 +317,8 @@ class ResNetSpg(nn.Module):
             logits_b1=logits_b1, logits_b2=logits_b2)
 
         if return_cam:
-            feature_map = feat_map.clone().detach()
-            cams = feature_map[range(batch_size), labels]
-            return cams
+            return get_channel_cams(feat_map.clone().detach(), labels, logits,
+                                    return_top1_cam, return_logits)
         return {'attention': attention, 'fused_attention': fused_attention,
                 'logits': logits, 'logits_b1': logits_b1,
                 'logits_b2': logits_b2, 'logits_c': logits_c}
@@ -366,7 +359,8 @@ class ResNetAdl(nn.Module):
 
         initialize_weights(self.modules(), init_mode='xavier')
 
-    def forward(self, x, labels=None, return_cam=False):
+    def forward(self, x, labels=None, return_cam=False,
+                return_top1_cam=False, return_logits=False):
         x = self.conv1(x)
         x = self.bn1(x)
         x = self.relu(x)
@@ -382,11 +376,9 @@ class ResNetAdl(nn.Module):
         logits = self.fc(pre_logit)
 
         if return_cam:
-            feature_map = x.detach().clone()
-            cam_weights = self.fc.weight[labels]
-            cams = (cam_weights.view(*feature_map.shape[:2], 1, 1) *
-                    feature_map).mean(1, keepdim=False)
-            return cams
+            return get_weighted_cams(x.detach().clone(), self.fc.weight,
+                                     labels, logits, return_top1_cam,
+                                     return_logits)
 
         return {'logits': logits}
 
@@ -450,18 +442,25 @@ def batch_replace_layer(state_dict):
     return state_dict
 
 
-def load_pretrained_model(model, wsol_method, path=None, **kwargs):
+def load_pretrained_model(model, wsol_method, path=None, store_root=None,
+                          **kwargs):
     strict_rule = True
 
-    if path:
-        state_dict = torch.load(os.path.join(path, 'resnet50.pth'))
-    else:
-        state_dict = load_url(model_urls['resnet50'], progress=True)
+    def convert():
+        if path:
+            state_dict = torch.load(os.path.join(path, 'resnet50.pth'))
+        else:
+            state_dict = load_url(model_urls['resnet50'], progress=True)
+
+        if wsol_method == 'adl':
+            state_dict = align_layer(state_dict)
+        elif wsol_method == 'spg':
+            state_dict = batch_replace_layer(state_dict)
+        return state_dict
 
-    if wsol_method == 'adl':
-        state_dict = align_layer(state_dict)
-    elif wsol_method == 'spg':
-        state_dict = batch_replace_layer(state_dict)
+    state_dict = load_converted_state_dict(
+        convert, store_root, 'resnet50', wsol_method,
+        kwargs['large_feature_map'])
 
     if kwargs['dataset_name'] != 'ILSVRC' or wsol_method in ('acol', 'spg'):
         state_dict = remove_layer(state_dict, 'fc')
@@ -472,7 +471,7 @@ def load_pretrained_model(model, wsol_method, path=None, **kwargs):
 
 
 def resnet50(architecture_type, pretrained=False, pretrained_path=None,
-             **kwargs):
+             weight_store_root=None, **kwargs):
     model = {'cam': ResNetCam,
              'acol': ResNetAcol,
              'spg': ResNetSpg,
@@ -480,5 +479,6 @@ def resnet50(architecture_type, pretrained=False, pretrained_path=None,
                                                   **kwargs)
     if pretrained:
         model = load_pretrained_model(model, architecture_type,
-                                      path=pretrained_path, **kwargs)
+                                      path=pretrained_path,
+                                      store_root=weight_store_root, **kwargs)
     return model
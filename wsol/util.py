@@ -19,9 +19,32 @@ IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
+import copy
+
+import torch
 import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+from torch.nn.utils.fusion import fuse_conv_bn_weights
+
+__all__ = ['remove_layer', 'replace_layer', 'initialize_weights',
+           'get_conv_bn_names', 'fold_batchnorm', 'refresh_folded_batchnorm',
+           'compile_model', 'BACKBONE_MODULE_NAMES']
 
-__all__ = ['remove_layer', 'replace_layer', 'initialize_weights']
+# Children of each architecture forming its feature extractor, in forward
+# order (those absent from a given method are skipped).
+BACKBONE_MODULE_NAMES = {
+    'vgg16': ['features'],
+    'resnet50': ['layer1', 'layer2', 'layer3', 'SPG_A1', 'SPG_A2', 'layer4'],
+    'inception_v3': ['Conv2d_1a_3x3', 'Conv2d_2a_3x3', 'Conv2d_2b_3x3',
+                     'Conv2d_3b_1x1', 'Conv2d_4a_3x3', 'Mixed_5b', 'Mixed_5c',
+                     'Mixed_5d', 'Mixed_6a', 'Mixed_6b', 'Mixed_6c',
+                     'Mixed_6d', 'Mixed_6e'],
+}
+
+# Methods whose forward cannot be captured as one graph: the class maps
+# indexed by label in get_attention are detached and made leaves again.
+_GRAPH_BREAKING_TYPES = ('acol', 'spg')
+_GRAPHS_PER_MODULE = 8
 
 
 def remove_layer(state_dict, keyword):
@@ -43,6 +66,9 @@ def replace_layer(state_dict, keyword1, keyword2):
 
 def initialize_weights(modules, init_mode):
     for m in modules:
+        if getattr(m, 'weight', None) is not None and m.weight.is_meta:
+            # Built on the meta device for loading (checkpoint.build_model).
+            continue
         if isinstance(m, nn.Conv2d):
             if init_mode == 'he':
                 nn.init.kaiming_normal_(m.weight, mode='fan_out',
@@ -58,4 +84,116 @@ def initialize_weights(modules, init_mode):
             nn.init.constant_(m.bias, 0)
         elif isinstance(m, nn.Linear):
             nn.init.normal_(m.weight, 0, 0.01)
-            nn.init.constant_(m.bias, 0)
\ No newline at end of file
+            nn.init.constant_(m.bias, 0)
+
+
+def _get_conv_bn_pairs(module):
+    """
+    Returns:
+        pairs: list of (conv_name, bn_name) children of module where the
+            BatchNorm2d is applied right after the Conv2d: consecutive
+            layers of a Sequential, conv/bn and convN/bnN otherwise.
+    """
+    children = list(module.named_children())
+    if isinstance(module, nn.Sequential):
+        return [(conv_name, bn_name) for (conv_name, conv), (bn_name, bn)
+                in zip(children, children[1:])
+                if isinstance(conv, nn.Conv2d) and
+                isinstance(bn, nn.BatchNorm2d)]
+    named_children = dict(children)
+    return [(name, 'bn' + name[len('conv'):]) for name, child in children
+            if name.startswith('conv') and isinstance(child, nn.Conv2d) and
+            isinstance(named_children.get('bn' + name[len('conv'):]),
+                       nn.BatchNorm2d)]
+
+
+def get_conv_bn_names(model):
+    """
+    Returns:
+        names: list of (conv_name, bn_name). Qualified names in model of the
+            Conv2d and BatchNorm2d pairs folded by fold_batchnorm; empty for
+            a model without BatchNorm (VGG).
+    """
+    names = []
+    for module_name, module in model.named_modules():
+        prefix = module_name + '.' if module_name else ''
+        names.extend((prefix + conv_name, prefix + bn_name)
+                     for conv_name, bn_name in _get_conv_bn_pairs(module))
+    return names
+
+
+def fold_batchnorm(model):
+    """
+    Returns an eval-mode copy of model where every BatchNorm2d is folded into
+    the weights of the convolution before it and replaced by an identity.
+    Logits and CAMs match those of model.eval() up to float rounding. The
+    modules compiled by compile_model are compiled in the copy as well.
+    """
+    model = copy.deepcopy(model).eval()
+    for module in list(model.modules()):
+        for conv_name, bn_name in _get_conv_bn_pairs(module):
+            setattr(module, conv_name, fuse_conv_bn_eval(
+                getattr(module, conv_name), getattr(module, bn_name)))
+            setattr(module, bn_name, nn.Identity())
+    _compile_modules(model, getattr(model, 'compiled_module_names', []))
+    return model
+
+
+def refresh_folded_batchnorm(folded_model, model):
+    """
+    Updates folded_model, a fold_batchnorm copy of model, in place to the
+    current weights of model (e.g. after a training epoch), without a new
+    copy; the modules compiled in folded_model are kept.
+    """
+    modules = dict(model.named_modules())
+    folded_modules = dict(folded_model.named_modules())
+    folded_module_names = set()
+    with torch.no_grad():
+        for conv_name, bn_name in get_conv_bn_names(model):
+            conv = modules[conv_name]
+            bn = modules[bn_name]
+            weight, bias = fuse_conv_bn_weights(
+                conv.weight, conv.bias, bn.running_mean, bn.running_var,
+                bn.eps, bn.weight, bn.bias)
+            folded_modules[conv_name].weight.copy_(weight)
+            folded_modules[conv_name].bias.copy_(bias)
+            folded_module_names.update((conv_name, bn_name))
+        folded_state_dict = folded_model.state_dict()
+        for key, value in model.state_dict().items():
+            if key.rpartition('.')[0] not in folded_module_names:
+                folded_state_dict[key].copy_(value)
+
+
+def _compile_modules(model, module_names):
+    if not module_names:
+        return
+    import torch._dynamo
+    # The modules compiled by nn.Module.compile share one entry in the dynamo
+    # cache: their graphs are kept static (different modules would otherwise
+    # be taken for one input of dynamic shape), and each of them is allowed
+    # the default number of graphs (training, evaluation, BatchNorm-folded
+    # evaluation, ...).
+    torch._dynamo.config.recompile_limit = max(
+        torch._dynamo.config.recompile_limit,
+        _GRAPHS_PER_MODULE * len(module_names))
+    modules = dict(model.named_modules())
+    for name in module_names:
+        modules[name].compile(dynamic=False)
+    model.compiled_module_names = list(module_names)
+
+
+def compile_model(model, architecture, architecture_type):
+    """
+    Compiles the forward of model in place (nn.Module.compile, so parameters
+    and state_dict keys are unchanged) and returns it. For ACoL and SPG,
+    whose forwards break the graph, only the backbone stages
+    (BACKBONE_MODULE_NAMES) are compiled and the heads run eagerly.
+    """
+    if architecture_type not in _GRAPH_BREAKING_TYPES:
+        _compile_modules(model, [''])
+        return model
+    children = dict(model.named_children())
+    _compile_modules(model, [name for name
+                             in BACKBONE_MODULE_NAMES[architecture]
+                             if name in children])
+    return model
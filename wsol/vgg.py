@@ -9,13 +9,15 @@ import torch.nn as nn
 import torch.nn.functional as F
 from torch.utils.model_zoo import load_url
 
+from .cam import get_channel_cams
+from .cam import get_weighted_cams
 from .method import AcolBase
 from .method import ADL
 from .method import spg
-from .method.util import normalize_tensor
 from .util import remove_layer
 from .util import replace_layer
 from .util import initialize_weights
+from .weight_store import load_converted_state_dict
 
 __all__ = ['vgg16']
 
@@ -60,7 +62,8 @@ class VggCam(nn.Module):
         self.fc = nn.Linear(1024, num_classes)
         initialize_weights(self.modules(), init_mode='he')
 
-    def forward(self, x, labels=None, return_cam=False):
+    def forward(self, x, labels=None, return_cam=False,
+                return_top1_cam=False, return_logits=False):
         x = self.features(x)
         x = self.conv6(x)
         x = self.relu(x)
@@ -69,11 +72,9 @@ class VggCam(nn.Module):
         logits = self.fc(pre_logit)
 
         if return_cam:
-            feature_map = x.detach().clone()
-            cam_weights = self.fc.weight[labels]
-            cams = (cam_weights.view(*feature_map.shape[:2], 1, 1) *
-                    feature_map).mean(1, keepdim=False)
-            return cams
+            return get_weighted_cams(x.detach().clone(), self.fc.weight,
+                                     labels, logits, return_top1_cam,
+                                     return_logits)
         return {'logits': logits}
 
 
@@ -102,22 +103,16 @@ class VggAcol(AcolBase):
 
         initialize_weights(self.modules(), init_mode='xavier')
 
-    def forward(self, x, labels=None, return_cam=False):
-        batch_size = x.shape[0]
-
+    def forward(self, x, labels=None, return_cam=False,
+                return_top1_cam=False, return_logits=False):
         feature = self.features(x)
         feature = F.avg_pool2d(feature, kernel_size=3, stride=1, padding=1)
         logits_dict = self._acol_logits(feature=feature, labels=labels,
                                         drop_threshold=self.drop_threshold)
 
         if return_cam:
-            normalized_a = normalize_tensor(
-                logits_dict['feat_map_a'].detach().clone())
-            normalized_b = normalize_tensor(
-                logits_dict['feat_map_b'].detach().clone())
-            feature_map = torch.max(normalized_a, normalized_b)
-            cams = feature_map[range(batch_size), labels]
-            return cams
+            return self._acol_cams(feature, logits_dict, labels,
+                                   return_top1_cam, return_logits)
 
         return logits_dict
 
@@ -177,9 +172,8 @@ class VggSpg(nn.Module):
 
         initialize_weights(self.modules(), init_mode='xavier')
 
-    def forward(self, x, labels=None, return_cam=False):
-        batch_size = x.shape[0]
-
+    def forward(self, x, labels=None, return_cam=False,
+                return_top1_cam=False, return_logits=False):
         x = self.features(x)
         x = self.SPG_A_1(x)
         if not self.lfs:
@@ -205,9 +199,8 @@ class VggSpg(nn.Module):
             logits_b1=logits_b1, logits_b2=logits_b2)
 
         if return_cam:
-            feature_map = feat_map.clone().detach()
-            cams = feature_map[range(batch_size), labels]
-            return cams
+            return get_channel_cams(feat_map.clone().detach(), labels, logits,
+                                    return_top1_cam, return_logits)
 
         return {'attention': attention, 'fused_attention': fused_attention,
                 'logits': logits, 'logits_b1': logits_b1,
@@ -249,17 +242,21 @@ def batch_replace_layer(state_dict):
     return state_dict
 
 
-def load_pretrained_model(model, architecture_type, path=None):
-    if path is not None:
-        state_dict = torch.load(os.path.join(path, 'vgg16.pth'))
-    else:
-        state_dict = load_url(model_urls['vgg16'], progress=True)
+def load_pretrained_model(model, architecture_type, path=None,
+                          store_root=None, large_feature_map=False):
+    def convert():
+        if path is not None:
+            state_dict = torch.load(os.path.join(path, 'vgg16.pth'))
+        else:
+            state_dict = load_url(model_urls['vgg16'], progress=True)
 
-    if architecture_type == 'spg':
-        state_dict = batch_replace_layer(state_dict)
-    state_dict = remove_layer(state_dict, 'classifier.')
-    state_dict = adjust_pretrained_model(state_dict, model)
+        if architecture_type == 'spg':
+            state_dict = batch_replace_layer(state_dict)
+        state_dict = remove_layer(state_dict, 'classifier.')
+        return adjust_pretrained_model(state_dict, model)
 
+    state_dict = load_converted_state_dict(
+        convert, store_root, 'vgg16', architecture_type, large_feature_map)
     model.load_state_dict(state_dict, strict=False)
     return model
 
@@ -285,7 +282,7 @@ def make_layers(cfg, **kwargs):
 
 
 def vgg16(architecture_type, pretrained=False, pretrained_path=None,
-          **kwargs):
+          weight_store_root=None, **kwargs):
     config_key = '28x28' if kwargs['large_feature_map'] else '14x14'
     layers = make_layers(configs_dict[architecture_type][config_key], **kwargs)
     model = {'cam': VggCam,
@@ -293,6 +290,8 @@ def vgg16(architecture_type, pretrained=False, pretrained_path=None,
              'spg': VggSpg,
              'adl': VggCam}[architecture_type](layers, **kwargs)
     if pretrained:
-        model = load_pretrained_model(model, architecture_type,
-                                      path=pretrained_path)
+        model = load_pretrained_model(
+            model, architecture_type, path=pretrained_path,
+            store_root=weight_store_root,
+            large_feature_map=kwargs['large_feature_map'])
     return model
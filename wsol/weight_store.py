@@ -0,0 +1,68 @@
+"""
+Copyright (c) 2020-present XXX XXX
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+
+import os
+
+import torch
+
+__all__ = ['load_converted_state_dict']
+
+
+def _get_store_path(store_root, architecture, architecture_type,
+                    large_feature_map):
+    return os.path.join(store_root, '{}_{}_{}.pth'.format(
+        architecture, architecture_type,
+        'large' if large_feature_map else 'small'))
+
+
+def load_converted_state_dict(convert, store_root, architecture,
+                              architecture_type, large_feature_map):
+    """
+    The ImageNet weights of an architecture, converted (renamed, aligned and
+    stripped of the ImageNet heads) for an architecture_type, are stored once
+    under store_root and memory-mapped from there on; a seeded store_root
+    needs neither the network nor the pretrained_path files.
+
+    Args:
+        convert: callable returning the converted state_dict, called only on
+            a store miss (or always if store_root is None).
+        store_root: string or None.
+        architecture, architecture_type: strings.
+        large_feature_map: bool.
+    Returns:
+        state_dict: dict from keys to torch.Tensor on CPU.
+    """
+    if store_root is None:
+        return convert()
+    store_path = _get_store_path(store_root, architecture, architecture_type,
+                                 large_feature_map)
+    if os.path.isfile(store_path):
+        return torch.load(store_path, map_location='cpu', mmap=True,
+                          weights_only=True)
+
+    state_dict = convert()
+    if not os.path.isdir(store_root):
+        os.makedirs(store_root)
+    temp_path = '{}.{}.tmp'.format(store_path, os.getpid())
+    torch.save(state_dict, temp_path)
+    os.replace(temp_path, store_path)
+    return state_dict
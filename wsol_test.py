@@ -0,0 +1,196 @@
+"""
+Copyright (c) 2020-present XXX XXX
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import torch
+import torch.nn as nn
+
+import wsol
+from wsol.weight_store import load_converted_state_dict
+
+
+class FoldBatchnormTest(unittest.TestCase):
+    def test_fold_batchnorm(self):
+        torch.manual_seed(0)
+        model = wsol.resnet50(dataset_name='CUB', architecture_type='cam',
+                              pretrained=False, num_classes=10,
+                              large_feature_map=False)
+        for module in model.modules():
+            if isinstance(module, nn.BatchNorm2d):
+                module.running_mean.uniform_(-.1, .1)
+                module.running_var.uniform_(.5, 1.5)
+                module.weight.data.uniform_(.5, 1.5)
+        model.train()
+        folded = wsol.fold_batchnorm(model)
+
+        self.assertTrue(model.training)
+        self.assertFalse(folded.training)
+        self.assertFalse(any(isinstance(module, nn.BatchNorm2d)
+                             for module in folded.modules()))
+        self.assertTrue(any(isinstance(module, nn.BatchNorm2d)
+                            for module in model.modules()))
+
+        images = torch.randn(2, 3, 64, 64)
+        labels = torch.tensor([1, 7])
+        model.eval()
+        with torch.no_grad():
+            expected = model(images, labels, return_cam=True,
+                             return_top1_cam=True)
+            outputs = folded(images, labels, return_cam=True,
+                             return_top1_cam=True)
+        for key in ('cams', 'top1_cams', 'logits'):
+            self.assertTrue(torch.allclose(outputs[key], expected[key],
+                                           rtol=1e-4, atol=1e-5))
+
+    def test_refresh_folded_batchnorm(self):
+        torch.manual_seed(0)
+        model = wsol.resnet50(dataset_name='CUB', architecture_type='cam',
+                              pretrained=False, num_classes=10,
+                              large_feature_map=False)
+        folded = wsol.fold_batchnorm(model)
+        parameters = list(folded.parameters())
+
+        # Weights and BatchNorm statistics change during training.
+        with torch.no_grad():
+            for parameter in model.parameters():
+                parameter.add_(torch.randn_like(parameter) * .01)
+            for module in model.modules():
+                if isinstance(module, nn.BatchNorm2d):
+                    module.running_mean.uniform_(-.1, .1)
+                    module.running_var.uniform_(.5, 1.5)
+        wsol.refresh_folded_batchnorm(folded, model)
+        self.assertTrue(all(refreshed is parameter for refreshed, parameter
+                            in zip(folded.parameters(), parameters)))
+
+        images = torch.randn(2, 3, 64, 64)
+        labels = torch.tensor([1, 7])
+        model.eval()
+        with torch.no_grad():
+            expected = model(images, labels, return_cam=True)
+            outputs = folded(images, labels, return_cam=True)
+        self.assertTrue(torch.allclose(outputs, expected, rtol=1e-4,
+                                       atol=1e-5))
+
+    def test_no_batchnorm(self):
+        model = wsol.vgg16(dataset_name='CUB', architecture_type='cam',
+                           pretrained=False, num_classes=10,
+                           large_feature_map=False)
+        self.assertEqual(wsol.get_conv_bn_names(model), [])
+
+
+class AcolTop1CamTest(unittest.TestCase):
+    def test_top1_cams_of_predicted_classes(self):
+        images = torch.randn(2, 3, 96, 96,
+                             generator=torch.Generator().manual_seed(0))
+        labels = torch.tensor([1, 7])
+        for architecture in ('vgg16', 'resnet50', 'inception_v3'):
+            torch.manual_seed(0)
+            model = getattr(wsol, architecture)(
+                architecture_type='acol', dataset_name='CUB',
+                pretrained=False, num_classes=10, large_feature_map=False,
+                acol_drop_threshold=0.7).eval()
+            with torch.no_grad():
+                outputs = model(images, labels, return_cam=True,
+                                return_top1_cam=True)
+                predictions = outputs['logits'].argmax(dim=1)
+                self.assertFalse(torch.equal(predictions, labels))
+                self.assertTrue(torch.allclose(
+                    outputs['top1_cams'],
+                    model(images, predictions, return_cam=True),
+                    atol=1e-6))
+                self.assertTrue(torch.equal(
+                    outputs['cams'], model(images, labels, return_cam=True)))
+
+
+class ReturnLogitsTest(unittest.TestCase):
+    def test_cams_with_logits(self):
+        images = torch.randn(2, 3, 64, 64)
+        labels = torch.tensor([1, 7])
+        for architecture_type in ('cam', 'acol', 'spg', 'adl'):
+            torch.manual_seed(0)
+            model = wsol.resnet50(
+                architecture_type=architecture_type, dataset_name='CUB',
+                pretrained=False, num_classes=10, large_feature_map=False,
+                acol_drop_threshold=0.7, adl_drop_rate=0.75,
+                adl_drop_threshold=0.9).eval()
+            with torch.no_grad():
+                outputs = model(images, labels, return_cam=True,
+                                return_logits=True)
+                self.assertEqual(sorted(outputs), ['cams', 'logits'])
+                self.assertTrue(torch.equal(
+                    outputs['cams'],
+                    model(images, labels, return_cam=True)))
+                self.assertTrue(torch.equal(
+                    outputs['logits'], model(images, labels)['logits']))
+
+
+class CompileModelTest(unittest.TestCase):
+    def test_compiled_modules(self):
+        kwargs = dict(dataset_name='CUB', pretrained=False, num_classes=10,
+                      large_feature_map=False, acol_drop_threshold=0.7)
+        model = wsol.compile_model(
+            wsol.resnet50(architecture_type='cam', **kwargs),
+            'resnet50', 'cam')
+        self.assertEqual(model.compiled_module_names, [''])
+        self.assertEqual(list(model.state_dict())[0], 'conv1.weight')
+
+        model = wsol.compile_model(
+            wsol.resnet50(architecture_type='acol', **kwargs),
+            'resnet50', 'acol')
+        backbone = ['layer1', 'layer2', 'layer3', 'layer4']
+        self.assertEqual(model.compiled_module_names, backbone)
+        self.assertEqual(wsol.fold_batchnorm(model).compiled_module_names,
+                         backbone)
+
+
+class WeightStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.store_root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.store_root)
+
+    def test_converted_once(self):
+        calls = []
+
+        def convert():
+            calls.append(None)
+            return {'features.0.weight': torch.arange(6.).view(2, 3)}
+
+        for _ in range(2):
+            state_dict = load_converted_state_dict(
+                convert, self.store_root, 'vgg16', 'cam',
+                large_feature_map=False)
+            self.assertTrue(torch.equal(state_dict['features.0.weight'],
+                                        torch.arange(6.).view(2, 3)))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(os.listdir(self.store_root), ['vgg16_cam_small.pth'])
+        load_converted_state_dict(convert, None, 'vgg16', 'cam', False)
+        self.assertEqual(len(calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()